@@ -10,74 +10,583 @@ Do NOT rely on this for halachic or religious decision-making.
 
 import os
 import json
+import hashlib
 import asyncio
+import signal
 import socket
+import time
 from typing import Optional
 from pathlib import Path
 
 import chainlit as cl
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, APIStatusError
 from dotenv import load_dotenv, set_key
 import httpx
 
+from explorer import hebrew_calendar
+from explorer.mcp import MCPClient, mcp_tool_to_openai
+from explorer.telemetry import Histogram
 from personas import PERSONAS, DEFAULT_PERSONA, get_persona, list_personas
+from explorer import (
+    ToolCache, CACHE_POLICIES, make_cache_key, project_result, cap_result,
+    ContextWindowManager, SingleFlight, TextStore, SearchIndex, RefResolver,
+    load_sefaria_index, dumps_compact, Prefetcher, LinkGraph,
+    TopicStore, BidiFormatter, Telemetry, gauge_lines,
+    PromptCacheStats, prepare_messages, prefix_fingerprint, cached_prompt_tokens, wants_cache_control,
+    open_session_store, FairLimiter, RetryPolicy, UpstreamStatusError, RETRY_STATUSES, call_with_retry,
+    parse_retry_after,
+)
 
 load_dotenv()
 
 # OpenRouter configuration
 OPENROUTER_API_KEY = os.getenv("OPEN_ROUTER_API")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
-
-# Sefaria MCP SSE endpoint
-SEFARIA_MCP_URL = "https://mcp.sefaria.org/sse"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Sefaria MCP SSE endpoint (the REST API below is the fallback)
+SEFARIA_MCP_URL = os.getenv("SEFARIA_MCP_URL", "https://mcp.sefaria.org/sse")
+MCP_ENABLED = os.getenv("MCP_ENABLED", "1").lower() in ("1", "true", "yes")
+MCP_STARTUP_TIMEOUT = float(os.getenv("MCP_STARTUP_TIMEOUT", "5"))
+
+# Sefaria REST API base URL
+SEFARIA_API_URL = os.getenv("SEFARIA_API_URL", "https://www.sefaria.org/api")
+
+# Shared HTTP connection pool settings
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# Tool execution settings
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "30"))
+
+# Tool result shaping: project to the needed fields, then cap the size
+PROJECT_TOOL_RESULTS = os.getenv("PROJECT_TOOL_RESULTS", "1").lower() in ("1", "true", "yes")
+TOOL_RESULT_MAX_BYTES = int(os.getenv("TOOL_RESULT_MAX_BYTES", "12000"))
+
+# Local data stores built from the Sefaria export (unset to always use the API)
+TEXT_STORE_PATH = os.getenv("TEXT_STORE_PATH", "")
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "")
+SEARCH_PREFIXES = os.getenv("SEARCH_PREFIXES", "1").lower() in ("1", "true", "yes")
+REF_INDEX_PATH = os.getenv("REF_INDEX_PATH", "")
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "")
+VECTOR_NPROBE = int(os.getenv("VECTOR_NPROBE", "16"))
+LINK_GRAPH_PATH = os.getenv("LINK_GRAPH_PATH", "")
+TOPIC_STORE_PATH = os.getenv("TOPIC_STORE_PATH", "")
+
+# Speculative prefetch of likely follow-up lookups (needs the tool cache)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1").lower() in ("1", "true", "yes")
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+PREFETCH_SESSION_BUDGET = int(os.getenv("PREFETCH_SESSION_BUDGET", "30"))
+PREFETCH_GLOBAL_BUDGET = int(os.getenv("PREFETCH_GLOBAL_BUDGET", "120"))
+
+# LLM settings
+LLM_MODEL = os.getenv("LLM_MODEL", "anthropic/claude-sonnet-4")
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "4096"))
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1").lower() in ("1", "true", "yes")
+
+# Provider prompt caching: cache_control breakpoints "on", "off" or "auto" (for models that need them)
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "auto").lower()
+
+# Token budget for the message history sent to the model (0 uses the model's default)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "0"))
+
+# Per-turn agent loop budget
+MAX_TOOL_STEPS = int(os.getenv("MAX_TOOL_STEPS", "5"))
+TURN_DEADLINE = float(os.getenv("TURN_DEADLINE", "90"))
+TURN_TOKEN_BUDGET = int(os.getenv("TURN_TOKEN_BUDGET", "100000"))
+
+# Upstream limits per worker process (0 = unlimited): requests per second, burst and requests in flight
+OPENROUTER_RPS = float(os.getenv("OPENROUTER_RPS", "10"))
+OPENROUTER_BURST = float(os.getenv("OPENROUTER_BURST", "20"))
+OPENROUTER_CONCURRENCY = int(os.getenv("OPENROUTER_CONCURRENCY", "20"))
+SEFARIA_RPS = float(os.getenv("SEFARIA_RPS", "20"))
+SEFARIA_BURST = float(os.getenv("SEFARIA_BURST", "40"))
+SEFARIA_CONCURRENCY = int(os.getenv("SEFARIA_CONCURRENCY", "16"))
+
+# Retries of 429 and 502-504 responses with jittered exponential backoff;
+# a Retry-After longer than UPSTREAM_RETRY_MAX_DELAY fails the request instead
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "3"))
+UPSTREAM_RETRY_BASE_DELAY = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.5"))
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "20"))
+
+# Tool result cache settings (set CACHE_DB_PATH to an empty string for memory only)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", str(Path(__file__).parent / ".cache" / "sefaria_tools.sqlite3"))
+
+# Spans and /metrics (TELEMETRY_ENABLED=0 turns instrumentation into no-ops);
+# set OTLP_ENDPOINT (e.g. http://localhost:4318/v1/traces) to export traces
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1").lower() in ("1", "true", "yes")
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", ""))
+
+# Where session state (persona, history) is kept so any worker can resume a session:
+# memory, sqlite:///path/to/sessions.sqlite3 or redis://host:port/db
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+
+# Set by launcher.py for each worker process it starts
+WORKER_ID = os.getenv("WORKER_ID", "0")
+
+# How long a conclusive API key validation result is reused
+KEY_VALIDATION_TTL = float(os.getenv("KEY_VALIDATION_TTL", "3600"))
 
 # Path to .env file
 ENV_FILE = Path(__file__).parent / ".env"
 
 
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Span factory and metrics registry shared by the whole app
+telemetry = Telemetry(TELEMETRY_ENABLED, otlp_endpoint=OTLP_ENDPOINT)
+
+
+def _http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide HTTP client, creating it on first use.
+
+    All Sefaria and OpenRouter REST calls share this client so that DNS,
+    TCP and TLS setup is paid once and connections are kept alive.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED and _http2_available(),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the process-wide HTTP client and release its connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# Persistent MCP session shared by all tool calls (None when disabled)
+mcp_client: Optional[MCPClient] = (
+    MCPClient(SEFARIA_MCP_URL, request_timeout=HTTP_TIMEOUT) if MCP_ENABLED else None
+)
+
+
+# Worker state reported by /healthz; draining is set by SIGUSR1 from the launcher
+worker_state = {"started_at": time.time(), "active_turns": 0, "turns": 0, "draining": False}
+
+
+def start_drain():
+    """Stop taking new turns so in-flight ones can finish before shutdown."""
+    if not worker_state["draining"]:
+        worker_state["draining"] = True
+        print(f"Worker {WORKER_ID} draining ({worker_state['active_turns']} turns in flight)")
+
+
+@cl.on_app_startup
+async def on_app_startup():
+    """Open the shared HTTP connection pool and the MCP session when the server starts."""
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, start_drain)
+    get_http_client()
+    if mcp_client is not None:
+        mcp_client.start()
+        if not await mcp_client.wait_ready(MCP_STARTUP_TIMEOUT):
+            print(f"MCP session to {SEFARIA_MCP_URL} not ready yet, using the REST API until it is")
+
+
+@cl.on_app_shutdown
+async def on_app_shutdown():
+    """Stop prefetching, end the MCP session, close the tool cache, the session store and the shared HTTP connection pool."""
+    if prefetcher is not None:
+        await prefetcher.close()
+    if tool_cache is not None:
+        tool_cache.close()
+    if mcp_client is not None:
+        await mcp_client.close()
+    await session_store.close()
+    await close_http_client()
+
+
+def build_cache_policies() -> dict:
+    """Apply CACHE_TTL_<TOOL> and CACHE_MAX_ITEMS_<TOOL> overrides to the default policies."""
+    policies = {}
+    for tool_name, policy in CACHE_POLICIES.items():
+        policy = dict(policy)
+        suffix = tool_name.upper()
+        if os.getenv(f"CACHE_TTL_{suffix}"):
+            policy["ttl"] = float(os.getenv(f"CACHE_TTL_{suffix}"))
+        if os.getenv(f"CACHE_MAX_ITEMS_{suffix}"):
+            policy["max_items"] = int(os.getenv(f"CACHE_MAX_ITEMS_{suffix}"))
+        policies[tool_name] = policy
+    return policies
+
+
+# Shared tool result cache (None when caching is disabled)
+tool_cache: Optional[ToolCache] = (
+    ToolCache(Path(CACHE_DB_PATH) if CACHE_DB_PATH else None, build_cache_policies())
+    if CACHE_ENABLED else None
+)
+
+
+def register_route(path: str, endpoint, methods: Optional[list] = None):
+    """
+    Register an HTTP route on the Chainlit server.
+
+    The route is moved ahead of Chainlit's catch-all frontend route so that
+    it is actually reachable.
+    """
+    from chainlit.server import app as server_app
+
+    server_app.add_api_route(path, endpoint, methods=methods or ["GET"])
+    server_app.router.routes.insert(0, server_app.router.routes.pop())
+
+
+def open_text_store() -> Optional[TextStore]:
+    """Open the local text store if one has been built at TEXT_STORE_PATH."""
+    if not TEXT_STORE_PATH or not (Path(TEXT_STORE_PATH) / "manifest.json").exists():
+        return None
+    try:
+        return TextStore(Path(TEXT_STORE_PATH))
+    except Exception as e:
+        print(f"Error opening text store: {e}")
+        return None
+
+
+def open_search_index() -> Optional[SearchIndex]:
+    """Open the local search index if one has been built at SEARCH_INDEX_PATH."""
+    if text_store is None or not SEARCH_INDEX_PATH or not (Path(SEARCH_INDEX_PATH) / "manifest.json").exists():
+        return None
+    try:
+        return SearchIndex(Path(SEARCH_INDEX_PATH), text_store, SEARCH_PREFIXES)
+    except Exception as e:
+        print(f"Error opening search index: {e}")
+        return None
+
+
+def open_vector_index():
+    """Open the local semantic vector index (needs numpy) if one has been built at VECTOR_INDEX_PATH."""
+    if text_store is None or not VECTOR_INDEX_PATH or not (Path(VECTOR_INDEX_PATH) / "manifest.json").exists():
+        return None
+    try:
+        from explorer.semantic import VectorIndex
+        return VectorIndex(Path(VECTOR_INDEX_PATH), text_store, nprobe=VECTOR_NPROBE)
+    except ImportError as e:
+        print(f"Semantic search disabled, missing dependency: {e}")
+    except Exception as e:
+        print(f"Error opening vector index: {e}")
+    return None
+
+
+def open_link_graph() -> Optional[LinkGraph]:
+    """Open the local link graph if one has been built at LINK_GRAPH_PATH."""
+    if not LINK_GRAPH_PATH or not (Path(LINK_GRAPH_PATH) / "manifest.json").exists():
+        return None
+    try:
+        return LinkGraph(Path(LINK_GRAPH_PATH))
+    except Exception as e:
+        print(f"Error opening link graph: {e}")
+        return None
+
+
+def open_topic_store() -> Optional[TopicStore]:
+    """Open the local topic store if one has been built at TOPIC_STORE_PATH."""
+    if not TOPIC_STORE_PATH or not Path(TOPIC_STORE_PATH).exists():
+        return None
+    try:
+        return TopicStore(Path(TOPIC_STORE_PATH))
+    except Exception as e:
+        print(f"Error opening topic store: {e}")
+        return None
+
+
+# Local text store serving get_text without the network (None when not built)
+text_store = open_text_store()
+
+# Local Hebrew/Aramaic index serving text_search (None when not built)
+search_index = open_search_index()
+
+# Local vector index serving english_semantic_search (None when not built)
+vector_index = open_vector_index()
+
+# Local link graph serving get_links_between_texts and find_connections (None when not built)
+link_graph = open_link_graph()
+
+# Local topic store serving get_topic_details and topic autocomplete (None when not built)
+topic_store = open_topic_store()
+
+
+def build_ref_resolver() -> RefResolver:
+    """Build the ref resolver from built-in titles, the text store and a saved /api/index file."""
+    resolver = RefResolver(text_store.books if text_store is not None else None)
+    if REF_INDEX_PATH and Path(REF_INDEX_PATH).exists():
+        try:
+            resolver.add_books(load_sefaria_index(Path(REF_INDEX_PATH)))
+        except Exception as e:
+            print(f"Error loading ref index: {e}")
+    return resolver
+
+
+# Resolves aliased and Hebrew refs to canonical Sefaria refs
+ref_resolver = build_ref_resolver()
+
+# Tool arguments that hold a ref and are canonicalized before each call
+REF_ARGUMENTS = {
+    "get_text": ("reference",),
+    "get_links_between_texts": ("reference",),
+    "find_connections": ("source", "target"),
+}
+
+# Local tools whose lookups are CPU-bound (query embedding, matrix scans) and
+# run in a worker thread so they do not stall other sessions' turns
+THREADED_LOCAL_TOOLS = {"english_semantic_search"}
+
+# Coalesces concurrent identical Sefaria lookups into one upstream call
+sefaria_inflight = SingleFlight()
+
+# Time requests spent queued for an upstream slot, for sizing the limits below
+upstream_wait = Histogram("sefaria_upstream_wait_seconds", "Time spent waiting for an upstream request slot")
+
+
+def make_limiter(name: str, rate: float, burst: float, concurrency: int) -> FairLimiter:
+    """Create an upstream limiter that reports its queue wait times."""
+    return FairLimiter(
+        name, rate, burst, concurrency,
+        on_wait=lambda seconds: upstream_wait.observe(seconds, (("upstream", name),)),
+    )
+
+
+# Per-upstream rate limits, shared fairly between sessions
+openrouter_limiter = make_limiter("openrouter", OPENROUTER_RPS, OPENROUTER_BURST, OPENROUTER_CONCURRENCY)
+sefaria_limiter = make_limiter("sefaria", SEFARIA_RPS, SEFARIA_BURST, SEFARIA_CONCURRENCY)
+retry_policy = RetryPolicy(UPSTREAM_RETRIES, UPSTREAM_RETRY_BASE_DELAY, UPSTREAM_RETRY_MAX_DELAY)
+
+
+def session_key() -> str:
+    """Return the current chat session's id for fair queueing ('' outside a session)."""
+    try:
+        return cl.user_session.get("id") or ""
+    except Exception:
+        return ""
+
+
+async def fetch_upstream(tool_name: str, arguments: dict, session: str) -> str:
+    """Fetch a tool result under the Sefaria limiter, retrying throttled requests."""
+    return await call_with_retry(sefaria_limiter, retry_policy, session, lambda: fetch_tool(tool_name, arguments))
+
+
+def is_available(tool_name: str, arguments: dict) -> bool:
+    """Return True if a tool call would be answered without a Sefaria request."""
+    if tool_name == "get_text" and text_store is not None and text_store.resolve(arguments.get("reference", "")):
+        return True
+    if tool_name == "get_links_between_texts" and link_graph is not None and link_graph.lookup(arguments.get("reference", "")):
+        return True
+    return tool_cache is not None and tool_cache.contains(tool_name, arguments)
+
+
+async def prefetch_sefaria(tool_name: str, arguments: dict) -> Optional[str]:
+    """Fetch a predicted lookup into the cache; returns None if it failed."""
+    arguments = canonicalize_arguments(tool_name, arguments)
+    with telemetry.span("tool.prefetch", tool=tool_name):
+        result = await sefaria_inflight.do(
+            make_cache_key(tool_name, arguments),
+            lambda: fetch_upstream(tool_name, arguments, "prefetch"),
+        )
+    return result if tool_cache.contains(tool_name, arguments) else None
+
+
+# Warms the cache with neighbouring segments and top links (None when disabled)
+prefetcher: Optional[Prefetcher] = (
+    Prefetcher(
+        ref_resolver, prefetch_sefaria, is_available,
+        workers=PREFETCH_WORKERS,
+        session_budget=PREFETCH_SESSION_BUDGET,
+        global_budget_per_minute=PREFETCH_GLOBAL_BUDGET,
+    )
+    if PREFETCH_ENABLED and tool_cache is not None else None
+)
+
+
+async def cache_stats_endpoint():
+    """Return tool cache hit/miss counters, request coalescing, prefetch, prompt cache and upstream queue counters."""
+    stats = {"enabled": tool_cache is not None, "coalescing": sefaria_inflight.stats()}
+    if prefetcher is not None:
+        stats["prefetch"] = prefetcher.stats()
+    if tool_cache is not None:
+        stats.update(tool_cache.stats())
+    stats["prompt"] = prompt_cache_stats.stats()
+    stats["upstream"] = {limiter.name: limiter.stats() for limiter in (openrouter_limiter, sefaria_limiter)}
+    return stats
+
+
+register_route("/cache/stats", cache_stats_endpoint)
+
+
+def collect_service_metrics() -> list[str]:
+    """Expose cache, coalescing, prefetch, prompt prefix, upstream queue and MCP session counters as metrics."""
+    lines = []
+    if tool_cache is not None:
+        by_tool = tool_cache.stats()["tools"]
+        lines += gauge_lines("sefaria_cache_lookups_total", "Tool cache lookups by outcome", [
+            ({"tool": tool, "outcome": outcome}, counts[outcome])
+            for tool, counts in by_tool.items() for outcome in ("memory_hits", "disk_hits", "misses")
+        ], kind="counter")
+    coalescing = sefaria_inflight.stats()
+    lines += gauge_lines("sefaria_coalesced_calls_total", "Tool calls served by another in-flight request",
+                         [({}, coalescing["saved_calls"])], kind="counter")
+    if prefetcher is not None:
+        prefetch = prefetcher.stats()
+        lines += gauge_lines("sefaria_prefetch_total", "Speculative prefetch outcomes", [
+            ({"outcome": name}, value) for name, value in prefetch.items() if name not in ("hit_rate", "queued")
+        ], kind="counter")
+        lines += gauge_lines("sefaria_prefetch_queued", "Prefetches waiting to run", [({}, prefetch["queued"])])
+    sessions = session_store.stats()
+    lines += gauge_lines("sefaria_session_store_total", "Session store loads, misses, appended messages and rewrites", [
+        ({"backend": sessions["backend"], "op": op}, sessions[op]) for op in ("loads", "misses", "appended", "rewrites")
+    ], kind="counter")
+    lines += gauge_lines("sefaria_prompt_prefix_changes_total",
+                         "Requests whose tool schema or system prompt differed from the previous one",
+                         [({}, prompt_cache_stats.stats()["prefix_changes"])], kind="counter")
+    limiters = [(limiter.name, limiter.stats()) for limiter in (openrouter_limiter, sefaria_limiter)]
+    lines += gauge_lines("sefaria_upstream_queue_depth", "Requests waiting for an upstream slot",
+                         [({"upstream": name}, stats["queue_depth"]) for name, stats in limiters])
+    lines += gauge_lines("sefaria_upstream_sessions_waiting", "Sessions with requests waiting for an upstream slot",
+                         [({"upstream": name}, stats["sessions_waiting"]) for name, stats in limiters])
+    lines += gauge_lines("sefaria_upstream_in_flight", "Upstream requests in flight",
+                         [({"upstream": name}, stats["active"]) for name, stats in limiters])
+    lines += gauge_lines("sefaria_upstream_events_total", "Upstream requests, 429 throttles and retries", [
+        ({"upstream": name, "event": event}, stats[event])
+        for name, stats in limiters for event in ("requests", "queued", "throttled", "retries")
+    ], kind="counter")
+    lines += upstream_wait.render()
+    if mcp_client is not None:
+        lines += gauge_lines("sefaria_mcp_connected", "Whether the MCP session is up",
+                             [({}, int(mcp_client.connected))])
+    return lines
+
+
+telemetry.add_collector(collect_service_metrics)
+
+
+async def metrics_endpoint():
+    """Serve span latency histograms and service counters in the Prometheus text format."""
+    from fastapi.responses import PlainTextResponse
+
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
+
+register_route("/metrics", metrics_endpoint)
+
+
+async def health_endpoint():
+    """Report this worker's liveness, load and drain state (503 while draining)."""
+    from chainlit.session import ws_sessions_id
+    from fastapi.responses import JSONResponse
+
+    health = {
+        "status": "draining" if worker_state["draining"] else "ok",
+        "worker": WORKER_ID,
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - worker_state["started_at"], 1),
+        "sessions": len(ws_sessions_id),
+        "active_turns": worker_state["active_turns"],
+        "turns": worker_state["turns"],
+        "mcp_connected": mcp_client.connected if mcp_client is not None else None,
+        "session_store": session_store.kind,
+    }
+    return JSONResponse(health, status_code=503 if worker_state["draining"] else 200)
+
+
+register_route("/healthz", health_endpoint)
+
+
 def get_openai_client(api_key: Optional[str] = None) -> AsyncOpenAI:
     """Create an OpenRouter client with the given or default API key."""
     key = api_key or OPENROUTER_API_KEY
     return AsyncOpenAI(
         api_key=key,
         base_url=OPENROUTER_BASE_URL,
+        # Retries go through call_with_retry so they respect the shared limiter
+        max_retries=0,
     )
 
 
-async def validate_api_key(api_key: str) -> tuple[bool, str]:
-    """Validate an OpenRouter API key by making a test request."""
+# Validation results keyed by SHA-256 of the API key: (is_valid, message, checked_at)
+_key_validation_cache: dict[str, tuple[bool, str, float]] = {}
+
+
+def _key_hash(api_key: str) -> str:
+    """Hash an API key so the raw key is never used as a cache key."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def invalidate_api_key(api_key: Optional[str]):
+    """Forget the cached validation result for a key (e.g. after a 401/402)."""
+    if api_key:
+        _key_validation_cache.pop(_key_hash(api_key), None)
+
+
+async def validate_api_key(api_key: str, force: bool = False) -> tuple[Optional[bool], str]:
+    """
+    Validate an OpenRouter API key against the key info endpoint.
+
+    GET /key costs nothing, unlike a test completion. Returns None instead
+    of a verdict when the check itself failed (timeout, network error, 5xx).
+    Conclusive results are cached per key hash for KEY_VALIDATION_TTL
+    seconds unless force is set.
+    """
     if not api_key:
         return False, "No API key provided"
 
     if not api_key.startswith("sk-or-"):
         return False, "Invalid key format (should start with 'sk-or-')"
 
+    key_hash = _key_hash(api_key)
+    cached = _key_validation_cache.get(key_hash)
+    if cached and not force and time.time() - cached[2] < KEY_VALIDATION_TTL:
+        return cached[0], cached[1]
+
     try:
-        async with httpx.AsyncClient(timeout=15.0) as http_client:
-            resp = await http_client.post(
-                f"{OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "anthropic/claude-sonnet-4",
-                    "messages": [{"role": "user", "content": "Hi"}],
-                    "max_tokens": 5
-                }
-            )
-            if resp.status_code == 200:
-                return True, "API key is valid"
-            elif resp.status_code == 401:
-                return False, "Invalid API key (authentication failed)"
-            elif resp.status_code == 402:
-                return False, "API key has no credits remaining"
+        resp = await get_http_client().get(
+            f"{OPENROUTER_BASE_URL}/key",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=15.0,
+        )
+        if resp.status_code == 200:
+            data = resp.json().get("data", {})
+            limit_remaining = data.get("limit_remaining")
+            if limit_remaining is not None and limit_remaining <= 0:
+                result = (False, "API key has no credits remaining")
             else:
-                return False, f"API error: {resp.status_code} - {resp.text[:100]}"
+                result = (True, "API key is valid")
+        elif resp.status_code == 401:
+            result = (False, "Invalid API key (authentication failed)")
+        elif resp.status_code == 402:
+            result = (False, "API key has no credits remaining")
+        else:
+            return None, f"API error: {resp.status_code} - {resp.text[:100]}"
     except httpx.TimeoutException:
-        return False, "Connection timeout - check your internet connection"
+        return None, "Connection timeout - check your internet connection"
     except Exception as e:
-        return False, f"Connection error: {str(e)}"
+        return None, f"Connection error: {str(e)}"
+
+    _key_validation_cache[key_hash] = (result[0], result[1], time.time())
+    return result
 
 
 def save_api_key_to_env(api_key: str) -> bool:
@@ -100,6 +609,62 @@ def save_api_key_to_env(api_key: str) -> bool:
         return False
 
 
+# Keeps each session's message history within the model's context window
+context_manager = ContextWindowManager(LLM_MODEL, HISTORY_TOKEN_BUDGET or None)
+
+# Cached vs. uncached prompt tokens reported by the provider
+prompt_cache_stats = PromptCacheStats()
+
+# Session state shared by every worker (see SESSION_STORE)
+session_store = open_session_store(SESSION_STORE, SESSION_TTL)
+
+
+async def save_session_fields(**fields):
+    """Set user_session fields and persist them for other workers."""
+    for name, value in fields.items():
+        cl.user_session.set(name, value)
+    try:
+        await session_store.update(cl.user_session.get("id"), **fields)
+    except Exception as e:
+        print(f"Error saving session state: {e}")
+
+
+async def restore_session() -> Optional[list]:
+    """
+    Load a session this worker has not seen from the session store.
+
+    Returns the message history (also placed in user_session), or None if
+    the store has no persona-bearing state for this session.
+    """
+    try:
+        stored = await session_store.load(cl.user_session.get("id"))
+    except Exception as e:
+        print(f"Error loading session state: {e}")
+        return None
+    if not stored:
+        return None
+    history = stored.pop("history")
+    for name, value in stored.items():
+        cl.user_session.set(name, value)
+    if not history or "persona" not in stored:
+        return None
+    cl.user_session.set("message_history", history)
+    cl.user_session.set("history_saved", len(history))
+    return history
+
+
+async def save_history(message_history: list[dict], rewritten: bool):
+    """Append the messages added since the last save, or rewrite the history if it was trimmed."""
+    saved = cl.user_session.get("history_saved", 0)
+    try:
+        if rewritten:
+            await session_store.replace(cl.user_session.get("id"), message_history)
+        elif len(message_history) > saved:
+            await session_store.append(cl.user_session.get("id"), message_history[saved:])
+        cl.user_session.set("history_saved", len(message_history))
+    except Exception as e:
+        print(f"Error saving session history: {e}")
+
 # Initialize OpenRouter client (will be recreated if key changes)
 client = get_openai_client()
 
@@ -160,6 +725,10 @@ SEFARIA_TOOLS = [
                     "query": {
                         "type": "string",
                         "description": "The search query to find semantically similar text chunks"
+                    },
+                    "category": {
+                        "type": "string",
+                        "description": "Optional top-level category to search within (e.g. 'Tanakh', 'Talmud', 'Halakhah')"
                     }
                 },
                 "required": ["query"]
@@ -239,80 +808,652 @@ SEFARIA_TOOLS = [
 ]
 
 
-async def call_sefaria_mcp(tool_name: str, arguments: dict) -> str:
+# Served only from the local link graph, so offered only when one is loaded
+FIND_CONNECTIONS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "find_connections",
+        "description": "Finds how two passages are connected through chains of cross-references (shortest paths), or lists passages reachable from one passage within a few links.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "source": {
+                    "type": "string",
+                    "description": "Starting text reference (e.g. 'Genesis 1:1')"
+                },
+                "target": {
+                    "type": "string",
+                    "description": "Optional destination reference (e.g. 'Shabbat 88a'); omit to list nearby passages"
+                },
+                "max_hops": {
+                    "type": "integer",
+                    "description": "Maximum number of links in a path (1-4)",
+                    "default": 3
+                },
+                "link_types": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only follow these link types (e.g. 'commentary', 'quotation', 'reference')"
+                },
+                "categories": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only pass through texts in these categories (e.g. 'Talmud', 'Midrash')"
+                }
+            },
+            "required": ["source"]
+        }
+    }
+}
+
+if link_graph is not None:
+    SEFARIA_TOOLS.append(FIND_CONNECTIONS_TOOL)
+
+# Pagination of get_topic_details, which only the local topic store implements
+TOPIC_PAGE_PARAMETERS = {
+    "page": {
+        "type": "integer",
+        "description": "Page of related topics and references, most relevant first",
+        "default": 1
+    },
+    "page_size": {
+        "type": "integer",
+        "description": "Related topics and references per group on each page",
+        "default": 50
+    }
+}
+
+if topic_store is not None:
+    for tool in SEFARIA_TOOLS:
+        if tool["function"]["name"] == "get_topic_details":
+            tool["function"]["parameters"]["properties"].update(TOPIC_PAGE_PARAMETERS)
+
+# Answered by the built-in Hebrew calendar, so always offered. Readings and
+# dapim come back as refs that can be passed straight to get_text.
+CALENDAR_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "convert_date",
+            "description": "Converts between Gregorian and Hebrew dates and lists the Jewish holidays on that day, with the Torah reading ref for festivals.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "date": {
+                        "type": "string",
+                        "description": "Gregorian date as YYYY-MM-DD (default: today)"
+                    },
+                    "hebrew_date": {
+                        "type": "string",
+                        "description": "Hebrew date to convert instead, e.g. '15 Nisan 5785' or 'ט״ו ניסן תשפ״ה'"
+                    },
+                    "after_sunset": {
+                        "type": "boolean",
+                        "description": "The Gregorian time is after sunset, when the Hebrew day has already advanced",
+                        "default": False
+                    },
+                    "israel": {
+                        "type": "boolean",
+                        "description": "Use the Israel holiday schedule instead of the diaspora one",
+                        "default": False
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_jewish_holidays",
+            "description": "Lists Jewish holidays, fasts, modern Israeli holidays and Rosh Chodesh in a date range or a whole Hebrew year, with Torah and megillah reading refs for festivals.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "start": {
+                        "type": "string",
+                        "description": "First Gregorian date as YYYY-MM-DD (default: today)"
+                    },
+                    "end": {
+                        "type": "string",
+                        "description": "Last Gregorian date as YYYY-MM-DD (default: 30 days after start)"
+                    },
+                    "hebrew_year": {
+                        "type": "integer",
+                        "description": "List a whole Hebrew year instead (e.g. 5786)"
+                    },
+                    "israel": {
+                        "type": "boolean",
+                        "description": "Use the Israel holiday schedule instead of the diaspora one",
+                        "default": False
+                    },
+                    "categories": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(hebrew_calendar.HOLIDAY_CATEGORIES)},
+                        "description": "Only these kinds of days"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_parsha",
+            "description": "Returns the weekly Torah portion (parsha) for the Shabbat on or after a date, or the next Shabbat a named parsha is read, with its Torah ref.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "date": {
+                        "type": "string",
+                        "description": "Gregorian date as YYYY-MM-DD (default: today)"
+                    },
+                    "parsha": {
+                        "type": "string",
+                        "description": "Find when this parsha is next read (e.g. 'Vayera')"
+                    },
+                    "israel": {
+                        "type": "boolean",
+                        "description": "Use the Israel reading schedule instead of the diaspora one",
+                        "default": False
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_daf_yomi",
+            "description": "Returns the Daf Yomi (daily Talmud page) for a date as a Talmud ref.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "date": {
+                        "type": "string",
+                        "description": "Gregorian date as YYYY-MM-DD (default: today)"
+                    },
+                    "days": {
+                        "type": "integer",
+                        "description": "Number of consecutive days to return (1-31)",
+                        "default": 1
+                    }
+                }
+            }
+        }
+    },
+]
+
+SEFARIA_TOOLS.extend(CALENDAR_TOOLS)
+CALENDAR_TOOL_NAMES = {tool["function"]["name"] for tool in CALENDAR_TOOLS}
+
+# Tools answered by this app alone, offered whether or not the server lists them
+LOCAL_TOOL_NAMES = {"find_connections"} | CALENDAR_TOOL_NAMES
+
+# Converted server tool list, with the discovered list it was built from
+_discovered_tools: tuple[Optional[list], list[dict]] = (None, [])
+
+
+def current_tools() -> list[dict]:
     """
-    Call the Sefaria MCP server via SSE.
+    Return the tool definitions to offer the model.
 
-    This is a simplified implementation that makes direct API calls.
-    For production, you'd want proper MCP client handling.
+    When the MCP session has discovered the server's tools, those are used
+    so new or changed server tools need no code change. Parameters that
+    only this app understands (e.g. pagination) are merged in, and local
+    tools are added. Otherwise the built-in SEFARIA_TOOLS are used.
     """
-    base_url = "https://www.sefaria.org/api"
+    global _discovered_tools
+    if mcp_client is None or not mcp_client.tools:
+        return SEFARIA_TOOLS
+    if _discovered_tools[0] is mcp_client.tools:
+        return _discovered_tools[1]
+
+    builtin = {tool["function"]["name"]: tool for tool in SEFARIA_TOOLS}
+    tools = []
+    for server_tool in mcp_client.tools:
+        tool = mcp_tool_to_openai(server_tool)
+        local = builtin.get(server_tool["name"])
+        if local is not None:
+            parameters = tool["function"]["parameters"]
+            properties = parameters.setdefault("properties", {})
+            for name, schema in local["function"]["parameters"].get("properties", {}).items():
+                properties.setdefault(name, schema)
+        tools.append(tool)
+    tools += [tool for name, tool in builtin.items() if name in LOCAL_TOOL_NAMES]
+    _discovered_tools = (mcp_client.tools, tools)
+    return tools
 
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as http_client:
-            if tool_name == "get_text":
-                reference = arguments.get("reference", "")
-                version_language = arguments.get("version_language")
-                url = f"{base_url}/v3/texts/{reference}"
-                if version_language:
-                    url += f"?version={version_language}"
-                response = await http_client.get(url)
-                return response.text
-
-            elif tool_name == "text_search":
-                query = arguments.get("query", "")
-                size = arguments.get("size", 10)
-                url = f"{base_url}/search-wrapper/text/{query}"
-                params = {"size": size}
-                response = await http_client.get(url, params=params)
-                return response.text
-
-            elif tool_name == "english_semantic_search":
-                query = arguments.get("query", "")
-                url = f"{base_url}/search/text/{query}"
-                response = await http_client.get(url)
-                return response.text
-
-            elif tool_name == "get_links_between_texts":
-                reference = arguments.get("reference", "")
-                with_text = arguments.get("with_text", "0")
-                url = f"{base_url}/links/{reference}?with_text={with_text}"
-                response = await http_client.get(url)
-                return response.text
-
-            elif tool_name == "get_topic_details":
-                topic_slug = arguments.get("topic_slug", "")
-                url = f"{base_url}/topics/{topic_slug}"
-                params = {}
-                if arguments.get("with_links"):
-                    params["with_links"] = "1"
-                if arguments.get("with_refs"):
-                    params["with_refs"] = "1"
-                response = await http_client.get(url, params=params)
-                return response.text
-
-            elif tool_name == "clarify_name_argument":
-                name = arguments.get("name", "")
-                limit = arguments.get("limit", 10)
-                url = f"{base_url}/name/{name}?limit={limit}"
-                response = await http_client.get(url)
-                return response.text
 
-            else:
-                return json.dumps({"error": f"Unknown tool: {tool_name}"})
+async def call_sefaria_mcp(tool_name: str, arguments: dict) -> str:
+    """
+    Run a Sefaria tool call.
+
+    Local data and the cache are tried first; otherwise the call goes to
+    the MCP server over the persistent session, or to the REST API.
+    """
+    with telemetry.span("tool.call", tool=tool_name) as span:
+        result = await _call_sefaria_mcp(tool_name, arguments)
+        span.set(response_bytes=len(result.encode("utf-8")))
+        if result.startswith('{"error"'):
+            span.set(error="tool_error")
+        return result
+
+
+async def _call_sefaria_mcp(tool_name: str, arguments: dict) -> str:
+    """Serve a tool call from local data, the cache or upstream (see call_sefaria_mcp)."""
+    # Canonicalize refs so aliases share cache entries and local lookups
+    arguments = canonicalize_arguments(tool_name, arguments)
+
+    # Serve from local data when possible
+    if tool_name in THREADED_LOCAL_TOOLS:
+        local = await asyncio.to_thread(serve_locally, tool_name, arguments)
+    else:
+        local = serve_locally(tool_name, arguments)
+    if local is not None:
+        telemetry.current().set(source="local")
+        return cap_result(local, TOOL_RESULT_MAX_BYTES)
+
+    # Serve from the cache when possible
+    if tool_cache is not None:
+        cached = tool_cache.get(tool_name, arguments)
+        if cached is not None:
+            if prefetcher is not None:
+                prefetcher.record_hit(tool_name, arguments)
+            telemetry.current().set(source="cache")
+            return cap_result(with_local_topics(tool_name, arguments, cached), TOOL_RESULT_MAX_BYTES)
+
+    # Live requests pause prefetching so it never competes for the upstream
+    if prefetcher is not None:
+        prefetcher.live_started()
+    try:
+        # Identical concurrent lookups share one upstream request
+        session = session_key()
+        result = await sefaria_inflight.do(
+            make_cache_key(tool_name, arguments),
+            lambda: fetch_upstream(tool_name, arguments, session),
+        )
+        return cap_result(with_local_topics(tool_name, arguments, result), TOOL_RESULT_MAX_BYTES)
 
     except Exception as e:
         return json.dumps({"error": str(e)})
+    finally:
+        if prefetcher is not None:
+            prefetcher.live_finished()
+
+
+def canonicalize_arguments(tool_name: str, arguments: dict) -> dict:
+    """Replace a tool's ref arguments with their canonical form when they can be resolved locally."""
+    for key in REF_ARGUMENTS.get(tool_name, ()):
+        if not arguments.get(key):
+            continue
+        canonical = ref_resolver.canonical(arguments[key])
+        if canonical is not None and canonical != arguments[key]:
+            arguments = {**arguments, key: canonical}
+    return arguments
+
+
+def add_local_topics(result: dict, name: str, limit: int) -> dict:
+    """Add topics from the local store that complete name to a clarify_name_argument result."""
+    topics = topic_store.complete(name, limit) if topic_store is not None else []
+    if topics:
+        result["topics"] = topics
+        result["completions"] = list(dict.fromkeys(
+            (result.get("completions") or []) + [topic["title"] for topic in topics]
+        ))[:limit]
+    return result
+
+
+def with_local_topics(tool_name: str, arguments: dict, result: str) -> str:
+    """Merge local topic matches into a Name API answer (see add_local_topics)."""
+    if tool_name != "clarify_name_argument" or topic_store is None:
+        return result
+    try:
+        data = json.loads(result)
+    except ValueError:
+        return result
+    if not isinstance(data, dict) or "error" in data:
+        return result
+    return dumps_compact(add_local_topics(data, arguments.get("name", ""), int(arguments.get("limit", 10))))
+
+
+def serve_locally(tool_name: str, arguments: dict) -> Optional[str]:
+    """Answer a tool call from the local data stores, or return None on a miss."""
+    if tool_name == "clarify_name_argument":
+        name, limit = arguments.get("name", ""), int(arguments.get("limit", 10))
+        result = ref_resolver.clarify(name, limit)
+        if result is not None and not result["is_book"]:
+            return dumps_compact(result)
+        if topic_store is None:
+            return None
+        if result is not None:
+            # A bare title can also be a topic (Shabbat, Pesachim), whose slug the
+            # model needs for get_topic_details
+            return dumps_compact(add_local_topics(result, name, limit))
+        # Only an exact title is a confident local answer: a prefix match may be a
+        # person, place or other name the Name API knows, so those are merged into its result
+        slug = topic_store.find_slug(name)
+        if slug is not None:
+            topics = [topic for topic in topic_store.complete(name, limit) if topic["slug"] != slug]
+            topics.insert(0, {"slug": slug, "title": topic_store.title(slug)})
+            return dumps_compact({
+                "is_ref": False,
+                "type": "Topic",
+                "completions": [topic["title"] for topic in topics[:limit]],
+                "topics": topics[:limit],
+                "source": "local",
+            })
+
+    if tool_name == "get_topic_details" and topic_store is not None:
+        result = topic_store.get_topic(
+            arguments.get("topic_slug", ""),
+            bool(arguments.get("with_links")),
+            bool(arguments.get("with_refs")),
+            int(arguments.get("page", 1)),
+            int(arguments.get("page_size", 50)),
+        )
+        if result is not None:
+            return dumps_compact(result)
+
+    if tool_name == "get_text" and text_store is not None:
+        result = text_store.get_text(arguments.get("reference", ""), arguments.get("version_language"))
+        if result is not None:
+            return dumps_compact(result)
+
+    if tool_name == "text_search" and search_index is not None:
+        result = search_index.search(arguments.get("query", ""), int(arguments.get("size", 10)))
+        if result["results"]:
+            return dumps_compact(result)
+
+    if tool_name == "get_links_between_texts" and link_graph is not None and str(arguments.get("with_text", "0")) == "0":
+        result = link_graph.links(arguments.get("reference", ""))
+        if result is not None:
+            return dumps_compact(result)
+
+    if tool_name == "find_connections":
+        if link_graph is None:
+            return json.dumps({"error": "find_connections needs a local link graph (LINK_GRAPH_PATH)"})
+        result = link_graph.find_paths(
+            arguments.get("source", ""),
+            arguments.get("target"),
+            int(arguments.get("max_hops", 3)),
+            arguments.get("link_types"),
+            arguments.get("categories"),
+        )
+        if result is None:
+            result = {"from": arguments.get("source"), "error": "Source ref has no links in the local graph"}
+        return dumps_compact(result)
+
+    if tool_name in CALENDAR_TOOL_NAMES:
+        try:
+            return dumps_compact(serve_calendar(tool_name, arguments))
+        except (TypeError, ValueError) as e:
+            return json.dumps({"error": str(e)})
+
+    if tool_name == "english_semantic_search" and vector_index is not None:
+        result = vector_index.search(arguments.get("query", ""), category=arguments.get("category"))
+        if result["results"]:
+            return dumps_compact(result)
+    return None
+
+
+def serve_calendar(tool_name: str, arguments: dict):
+    """Answer a calendar tool call from the built-in Hebrew calendar."""
+    israel = bool(arguments.get("israel"))
+    if tool_name == "convert_date":
+        return hebrew_calendar.convert_date(
+            arguments.get("date"), arguments.get("hebrew_date"), bool(arguments.get("after_sunset")), israel
+        )
+    if tool_name == "get_jewish_holidays":
+        return hebrew_calendar.holidays(
+            arguments.get("start"), arguments.get("end"), arguments.get("hebrew_year"), israel, arguments.get("categories")
+        )
+    if tool_name == "get_parsha":
+        return hebrew_calendar.parsha(arguments.get("date"), arguments.get("parsha"), israel)
+    return hebrew_calendar.daf_yomi(arguments.get("date"), int(arguments.get("days", 1)))
+
+
+async def fetch_tool(tool_name: str, arguments: dict) -> str:
+    """Fetch one tool result over the MCP session, falling back to the REST API."""
+    if mcp_client is not None and mcp_client.connected:
+        try:
+            text, is_error = await mcp_client.call_tool(tool_name, arguments)
+        except Exception as e:
+            print(f"MCP call {tool_name} failed, falling back to REST: {e}")
+        else:
+            telemetry.current().set(source="mcp")
+            if is_error:
+                return json.dumps({"error": text})
+            result = project_result(tool_name, text) if PROJECT_TOOL_RESULTS else text
+            if tool_cache is not None:
+                tool_cache.set(tool_name, arguments, result)
+            return result
+    return await fetch_sefaria(tool_name, arguments)
+
+
+async def fetch_sefaria(tool_name: str, arguments: dict) -> str:
+    """Fetch one tool result from the Sefaria REST API, project it and cache it."""
+    base_url = SEFARIA_API_URL
+    http_client = get_http_client()
+
+    if tool_name == "get_text":
+        reference = arguments.get("reference", "")
+        version_language = arguments.get("version_language")
+        url = f"{base_url}/v3/texts/{reference}"
+        if version_language:
+            url += f"?version={version_language}"
+        response = await http_client.get(url)
+
+    elif tool_name == "text_search":
+        query = arguments.get("query", "")
+        size = arguments.get("size", 10)
+        url = f"{base_url}/search-wrapper/text/{query}"
+        params = {"size": size}
+        response = await http_client.get(url, params=params)
+
+    elif tool_name == "english_semantic_search":
+        query = arguments.get("query", "")
+        url = f"{base_url}/search/text/{query}"
+        response = await http_client.get(url)
+
+    elif tool_name == "get_links_between_texts":
+        reference = arguments.get("reference", "")
+        with_text = arguments.get("with_text", "0")
+        url = f"{base_url}/links/{reference}?with_text={with_text}"
+        response = await http_client.get(url)
+
+    elif tool_name == "get_topic_details":
+        topic_slug = arguments.get("topic_slug", "")
+        url = f"{base_url}/topics/{topic_slug}"
+        params = {}
+        if arguments.get("with_links"):
+            params["with_links"] = "1"
+        if arguments.get("with_refs"):
+            params["with_refs"] = "1"
+        response = await http_client.get(url, params=params)
+
+    elif tool_name == "clarify_name_argument":
+        name = arguments.get("name", "")
+        limit = arguments.get("limit", 10)
+        url = f"{base_url}/name/{name}?limit={limit}"
+        response = await http_client.get(url)
+
+    else:
+        return json.dumps({"error": f"Unknown tool: {tool_name}"})
+
+    telemetry.current().set(source="rest", status=response.status_code)
+    if response.status_code in RETRY_STATUSES:
+        raise UpstreamStatusError("Sefaria API", response.status_code, parse_retry_after(response.headers.get("retry-after")))
+    result = response.text
+    if PROJECT_TOOL_RESULTS:
+        result = project_result(tool_name, result)
+
+    # Only successful responses are cached, in projected form
+    if tool_cache is not None and response.status_code == 200:
+        tool_cache.set(tool_name, arguments, result)
+    return result
+
+
+async def run_tool_call(tool_name: str, arguments: dict, semaphore: asyncio.Semaphore) -> str:
+    """Run a single tool call under the shared semaphore with its own timeout."""
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(
+                call_sefaria_mcp(tool_name, arguments),
+                timeout=TOOL_CALL_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            return json.dumps({"error": f"Tool call timed out after {TOOL_CALL_TIMEOUT:g}s"})
+        except Exception as e:
+            return json.dumps({"error": str(e)})
+
+
+async def run_tool_calls(calls: list[tuple[str, dict]]) -> list[str]:
+    """
+    Run a turn's tool calls concurrently, at most TOOL_CONCURRENCY at a time.
+
+    Results are returned in the same order as the calls. A failing or slow
+    call yields an error payload instead of blocking the others.
+    """
+    semaphore = asyncio.Semaphore(max(1, TOOL_CONCURRENCY))
+    return await asyncio.gather(
+        *(run_tool_call(tool_name, arguments, semaphore) for tool_name, arguments in calls)
+    )
+
+
+async def stream_completion(response_msg: cl.Message, formatter: BidiFormatter, **request) -> tuple[str, list[dict], int, int]:
+    """
+    Stream a chat completion into response_msg.
+
+    Content deltas are formatted and sent as they arrive. Tool-call deltas
+    are merged by index. Returns the raw content, the tool calls, and the
+    total and cached prompt tokens reported in the final usage chunk.
+    """
+    stream = await client.chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **request
+    )
+
+    content_parts = []
+    tool_calls: dict[int, dict] = {}
+    total_tokens = cached_tokens = 0
+    async for chunk in stream:
+        if chunk.usage:
+            total_tokens = chunk.usage.total_tokens or 0
+            cached_tokens = record_usage(chunk.usage)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            content_parts.append(delta.content)
+            await response_msg.stream_token(formatter.feed(delta.content))
+
+        for tc in delta.tool_calls or []:
+            entry = tool_calls.setdefault(tc.index, {
+                "id": "",
+                "type": "function",
+                "function": {"name": "", "arguments": ""}
+            })
+            if tc.id:
+                entry["id"] = tc.id
+            if tc.function:
+                if tc.function.name:
+                    entry["function"]["name"] += tc.function.name
+                if tc.function.arguments:
+                    entry["function"]["arguments"] += tc.function.arguments
+
+    return "".join(content_parts), [tool_calls[index] for index in sorted(tool_calls)], total_tokens, cached_tokens
+
+
+def record_usage(usage) -> int:
+    """Record a completion's token usage on the current span; returns the cached prompt tokens."""
+    prompt_tokens = usage.prompt_tokens or 0
+    cached_tokens = cached_prompt_tokens(usage)
+    telemetry.current().set(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=usage.completion_tokens or 0,
+        cached_tokens=cached_tokens,
+    )
+    prompt_cache_stats.record(prompt_tokens, cached_tokens)
+    return cached_tokens
 
 
-def format_hebrew_text(text: str) -> str:
+def build_completion_request(message_history: list[dict], allow_tools: bool, persona: Optional[str]) -> dict:
     """
-    Format text with RTL support for Hebrew content.
-    Wraps Hebrew text in appropriate HTML/markdown for RTL display.
+    Build the chat completion request for one step of a turn.
+
+    The tool schema and the persona's system prompt lead every request
+    unchanged, so the provider can serve them from its prompt cache;
+    breakpoints are added for models that need them.
     """
-    if any('\u0590' <= char <= '\u05FF' for char in text):
-        return f'<div dir="rtl" style="text-align: right; font-family: \'David\', \'Noto Sans Hebrew\', serif;">{text}</div>'
-    return text
+    tools = current_tools()
+    prompt_cache_stats.observe_prefix(persona or "default", prefix_fingerprint(tools, message_history))
+    return {
+        "model": LLM_MODEL,
+        "messages": prepare_messages(message_history, wants_cache_control(LLM_MODEL, PROMPT_CACHE)),
+        "tools": tools,
+        "tool_choice": "auto" if allow_tools else "none",
+        "max_tokens": LLM_MAX_TOKENS,
+        # OpenRouter usage accounting, which reports cached prompt tokens
+        "extra_body": {"usage": {"include": True}},
+    }
+
+
+async def run_completion(response_msg: cl.Message, formatter: BidiFormatter, **request) -> tuple[str, list[dict], int, int]:
+    """
+    Run a chat completion, streaming into response_msg when STREAM_RESPONSES is set.
+
+    Returns the raw content, the tool calls as history-ready dicts, the
+    total tokens used and the prompt tokens read from the provider cache.
+    """
+    with telemetry.span("llm.completion", model=request.get("model"), stream=STREAM_RESPONSES) as span:
+        try:
+            result = await _run_completion(response_msg, formatter, **request)
+        except APIStatusError as e:
+            span.set(status=e.status_code)
+            raise
+        span.set(status=200)
+        return result
+
+
+async def _run_completion(response_msg: cl.Message, formatter: BidiFormatter, **request) -> tuple[str, list[dict], int, int]:
+    """Run one completion (see run_completion)."""
+    if formatter.parts:
+        # Separate this completion's text from what was already shown
+        output = formatter.feed("\n\n")
+        if STREAM_RESPONSES:
+            await response_msg.stream_token(output)
+
+    # A streamed completion holds its limiter slot until the stream ends
+    if STREAM_RESPONSES:
+        return await call_with_retry(
+            openrouter_limiter, retry_policy, session_key(),
+            lambda: stream_completion(response_msg, formatter, **request),
+        )
+
+    response = await call_with_retry(
+        openrouter_limiter, retry_policy, session_key(),
+        lambda: client.chat.completions.create(**request),
+    )
+    message = response.choices[0].message
+    content = message.content or ""
+    if content:
+        formatter.feed(content)
+    tool_calls = [
+        {
+            "id": tc.id,
+            "type": "function",
+            "function": {
+                "name": tc.function.name,
+                "arguments": tc.function.arguments
+            }
+        }
+        for tc in message.tool_calls or []
+    ]
+    total_tokens = response.usage.total_tokens if response.usage else 0
+    cached_tokens = record_usage(response.usage) if response.usage else 0
+    return content, tool_calls, total_tokens, cached_tokens
 
 
 def get_disclaimer_banner() -> str:
@@ -337,10 +1478,28 @@ This is a **prototype/testing environment** for exploring the Sefaria MCP integr
 """
 
 
+@cl.on_chat_end
+async def on_chat_end():
+    """Drop the session's pending prefetches."""
+    if prefetcher is not None:
+        prefetcher.cancel_session(cl.user_session.get("id"))
+
+
 @cl.on_chat_start
 async def on_chat_start():
     """Initialize the chat session with API key validation and persona selection."""
 
+    # A reconnect routed to another worker picks up where the session left off
+    message_history = await restore_session()
+    if message_history is not None:
+        persona = get_persona(cl.user_session.get("persona"))
+        await cl.Message(
+            content=f"Resumed your conversation with **{persona['name']}** "
+                    f"({len(message_history) - 1} earlier messages).",
+            author="System"
+        ).send()
+        return
+
     # Check if API key is configured
     api_key = OPENROUTER_API_KEY
 
@@ -349,22 +1508,23 @@ async def on_chat_start():
         await show_api_key_setup("No API key found. Please enter your OpenRouter API key to continue.")
         return
 
-    # Validate the API key
-    status_msg = await cl.Message(content="🔄 Validating API key...").send()
+    # Show persona selection right away and validate the key in the background
+    await show_persona_selection()
+    task = asyncio.create_task(check_api_key_in_background(api_key))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
-    is_valid, message = await validate_api_key(api_key)
 
-    if not is_valid:
-        await status_msg.remove()
-        await show_api_key_setup(f"⚠️ API key validation failed: {message}\n\nPlease enter a valid OpenRouter API key.")
-        return
+# Keeps references to fire-and-forget tasks so they are not garbage collected
+_background_tasks: set[asyncio.Task] = set()
 
-    # API key is valid - show success and proceed to persona selection
-    await status_msg.remove()
-    await cl.Message(content="✅ API key validated successfully!").send()
 
-    # Show persona selection
-    await show_persona_selection()
+async def check_api_key_in_background(api_key: str):
+    """Validate the key while the persona picker is shown; prompt for a new one if it is rejected."""
+    is_valid, message = await validate_api_key(api_key)
+    # An unreachable OpenRouter says nothing about the key: leave the session as it is
+    if is_valid is False:
+        await show_api_key_setup(f"⚠️ API key validation failed: {message}\n\nPlease enter a valid OpenRouter API key.")
 
 
 async def show_api_key_setup(message: str):
@@ -394,7 +1554,7 @@ Enter your API key below, or click the Settings button to configure it.
     await cl.Message(content=setup_message, actions=actions).send()
 
     # Store that we need API key setup
-    cl.user_session.set("needs_api_key", True)
+    await save_session_fields(needs_api_key=True)
 
 
 async def show_persona_selection():
@@ -519,12 +1679,14 @@ async def on_validate_key(action: cl.Action):
     """Re-validate the current API key."""
     status_msg = await cl.Message(content="🔄 Validating API key...").send()
 
-    is_valid, message = await validate_api_key(OPENROUTER_API_KEY)
+    is_valid, message = await validate_api_key(OPENROUTER_API_KEY, force=True)
 
     await status_msg.remove()
 
     if is_valid:
         await cl.Message(content=f"✅ {message}").send()
+    elif is_valid is None:
+        await cl.Message(content=f"⚠️ Could not check the API key: {message}").send()
     else:
         await cl.Message(content=f"❌ {message}").send()
 
@@ -548,6 +1710,9 @@ async def handle_setkey_command(content: str):
 
     await status_msg.remove()
 
+    if is_valid is None:
+        await cl.Message(content=f"⚠️ Could not check the API key, please try again: {message}").send()
+        return
     if not is_valid:
         await cl.Message(content=f"❌ Invalid API key: {message}").send()
         return
@@ -559,7 +1724,7 @@ async def handle_setkey_command(content: str):
         client = get_openai_client(new_key)
 
         # Clear the needs_api_key flag
-        cl.user_session.set("needs_api_key", False)
+        await save_session_fields(needs_api_key=False)
 
         masked_key = f"{new_key[:15]}...{new_key[-4:]}"
         await cl.Message(content=f"✅ API key saved successfully!\n\n**Key:** `{masked_key}`\n\nYou can now select a persona to begin.").send()
@@ -581,13 +1746,16 @@ async def on_persona_select(action: cl.Action):
     client = get_openai_client()
 
     # Store persona in session
-    cl.user_session.set("persona", persona_key)
-    cl.user_session.set("message_history", [
+    message_history = [
         {
             "role": "system",
             "content": persona["system_prompt"]
         }
-    ])
+    ]
+    cl.user_session.set("message_history", message_history)
+    cl.user_session.set("history_saved", 0)
+    await save_session_fields(persona=persona_key)
+    await save_history(message_history, rewritten=True)
 
     # Send confirmation with persona-specific welcome
     persona_welcome = f"""## {persona['name']} is ready!
@@ -631,6 +1799,8 @@ async def on_message(message: cl.Message):
         return
 
     message_history = cl.user_session.get("message_history")
+    if message_history is None:
+        message_history = await restore_session()
 
     # Check if persona was selected
     if message_history is None:
@@ -639,104 +1809,165 @@ async def on_message(message: cl.Message):
         ).send()
         return
 
+    # A draining worker finishes in-flight turns but starts no new ones
+    if worker_state["draining"]:
+        await cl.Message(
+            content="This server is restarting. Your conversation is saved; reconnect to continue.",
+            author="System"
+        ).send()
+        return
+
     message_history.append({"role": "user", "content": message.content})
 
     # Create initial response message
     response_msg = cl.Message(content="")
     await response_msg.send()
 
-    try:
-        # Call OpenRouter with tools
-        response = await client.chat.completions.create(
-            model="anthropic/claude-sonnet-4",
-            messages=message_history,
-            tools=SEFARIA_TOOLS,
-            tool_choice="auto",
-            max_tokens=4096,
-        )
+    # Formats the whole turn's output for RTL as it is produced
+    formatter = BidiFormatter()
+
+    worker_state["active_turns"] += 1
+    worker_state["turns"] += 1
+    with telemetry.span("turn", persona=cl.user_session.get("persona")) as turn_span:
+        started = time.monotonic()
+        steps = 0
+        tokens_used = 0
+        cached_used = 0
+        stop_reason = "answered"
+        rewritten = False
 
-        assistant_message = response.choices[0].message
+        try:
+            while True:
+                # Once the budget is spent, ask for a final answer without more tools
+                elapsed = time.monotonic() - started
+                if steps >= MAX_TOOL_STEPS:
+                    stop_reason = "step limit"
+                elif elapsed >= TURN_DEADLINE:
+                    stop_reason = "deadline"
+                elif tokens_used >= TURN_TOKEN_BUDGET:
+                    stop_reason = "token budget"
+                allow_tools = stop_reason == "answered"
+
+                # Trim old tool results and turns that no longer fit the budget
+                fitted = context_manager.fit(message_history)
+                if len(fitted) != len(message_history) or any(a is not b for a, b in zip(fitted, message_history)):
+                    rewritten = True
+                    message_history[:] = fitted
+
+                # Call OpenRouter with tools
+                content, tool_calls, total_tokens, cached_tokens = await run_completion(
+                    response_msg,
+                    formatter,
+                    **build_completion_request(message_history, allow_tools, cl.user_session.get("persona")),
+                )
+                tokens_used += total_tokens
+                cached_used += cached_tokens
+
+                # No tool calls (or no more allowed) means this is the answer
+                if not tool_calls or not allow_tools:
+                    break
+                steps += 1
+
+                # Parse each tool call and show user what we're doing. Malformed
+                # arguments are answered with an error so every tool call in the
+                # history keeps its tool message
+                calls = []
+                parse_errors: dict[int, str] = {}
+                for index, tool_call in enumerate(tool_calls):
+                    tool_name = tool_call["function"]["name"]
+                    try:
+                        arguments = json.loads(tool_call["function"]["arguments"] or "{}")
+                    except json.JSONDecodeError as e:
+                        parse_errors[index] = json.dumps({"error": f"Invalid JSON arguments for {tool_name}: {e}"})
+                        continue
+                    if not isinstance(arguments, dict):
+                        parse_errors[index] = json.dumps({"error": f"Arguments for {tool_name} must be a JSON object"})
+                        continue
+                    calls.append((tool_name, arguments))
+
+                    await cl.Message(
+                        content=f"Searching Sefaria: {tool_name}\n`{json.dumps(arguments, ensure_ascii=False)}`",
+                        author="System"
+                    ).send()
+
+                # Call the Sefaria API for all tool calls concurrently
+                results = await run_tool_calls(calls)
+
+                # Add the assistant message and its tool results to history together,
+                # so an interrupted round never leaves a tool call without an answer
+                message_history.append({
+                    "role": "assistant",
+                    "content": content,
+                    "tool_calls": tool_calls
+                })
+                answered = iter(results)
+                for index, tool_call in enumerate(tool_calls):
+                    message_history.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call["id"],
+                        "content": parse_errors[index] if index in parse_errors else next(answered)
+                    })
+
+                # Warm the cache with the lookups likely to come next
+                if prefetcher is not None:
+                    for (tool_name, arguments), result in zip(calls, results):
+                        prefetcher.schedule(cl.user_session.get("id"), tool_name, arguments, result)
+
+            # Finalize the displayed message with the formatted content
+            with telemetry.span("format.rtl") as format_span:
+                response_msg.content = formatter.formatted()
+                format_span.set(response_bytes=len(response_msg.content.encode("utf-8")))
+            await response_msg.update()
 
-        # Handle tool calls if any
-        if assistant_message.tool_calls:
-            # Add assistant message with tool calls to history
+            # Add to history
             message_history.append({
                 "role": "assistant",
-                "content": assistant_message.content or "",
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    }
-                    for tc in assistant_message.tool_calls
-                ]
+                "content": content
             })
 
-            # Process each tool call
-            for tool_call in assistant_message.tool_calls:
-                tool_name = tool_call.function.name
-                arguments = json.loads(tool_call.function.arguments)
+            # Update session history
+            cl.user_session.set("message_history", message_history)
+            turn_span.set(steps=steps, tokens=tokens_used, cached=cached_used, stop_reason=stop_reason)
 
-                # Show user what we're doing
+            # Report how much of the turn budget was used
+            if steps:
+                elapsed = time.monotonic() - started
                 await cl.Message(
-                    content=f"Searching Sefaria: {tool_name}\n`{json.dumps(arguments, ensure_ascii=False)}`",
+                    content=f"Completed in {steps} tool round{'s' if steps != 1 else ''}, "
+                            f"{elapsed:.1f}s, {tokens_used} tokens"
+                            f"{f', {cached_used} from prompt cache' if cached_used else ''} ({stop_reason})",
                     author="System"
                 ).send()
 
-                # Call the Sefaria API
-                result = await call_sefaria_mcp(tool_name, arguments)
-
-                # Add tool result to history
-                message_history.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": result
-                })
-
-            # Get final response after tool calls
-            final_response = await client.chat.completions.create(
-                model="anthropic/claude-sonnet-4",
-                messages=message_history,
-                max_tokens=4096,
-            )
-
-            final_content = final_response.choices[0].message.content or ""
-
-            # Format any Hebrew content
-            formatted_content = format_hebrew_text(final_content)
-
-            response_msg.content = formatted_content
+        except APIStatusError as e:
+            turn_span.set(status=e.status_code, error=type(e).__name__)
+            if e.status_code == 429:
+                response_msg.content = (
+                    "OpenRouter is rate limiting requests right now and retries did not get through. "
+                    "Please try again in a minute."
+                )
+                await response_msg.update()
+                return
+            # Auth and credit failures from real traffic invalidate the cached validation
+            if e.status_code in (401, 402):
+                invalidate_api_key(OPENROUTER_API_KEY)
+                response_msg.content = f"Error: {str(e)}"
+                await response_msg.update()
+                await show_api_key_setup("⚠️ Your OpenRouter API key was rejected. Please enter a valid key.")
+                return
+            error_msg = f"Error: {str(e)}"
+            response_msg.content = error_msg
             await response_msg.update()
 
-            # Add to history
-            message_history.append({
-                "role": "assistant",
-                "content": final_content
-            })
-        else:
-            # No tool calls, just respond directly
-            content = assistant_message.content or ""
-            formatted_content = format_hebrew_text(content)
-
-            response_msg.content = formatted_content
+        except Exception as e:
+            turn_span.set(error=type(e).__name__)
+            error_msg = f"Error: {str(e)}"
+            response_msg.content = error_msg
             await response_msg.update()
 
-            message_history.append({
-                "role": "assistant",
-                "content": content
-            })
-
-        # Update session history
-        cl.user_session.set("message_history", message_history)
-
-    except Exception as e:
-        error_msg = f"Error: {str(e)}"
-        response_msg.content = error_msg
-        await response_msg.update()
+        finally:
+            await save_history(message_history, rewritten)
+            worker_state["active_turns"] -= 1
 
 
 def find_available_port(start_port: int = 8000, max_attempts: int = 10) -> int:
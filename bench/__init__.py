@@ -0,0 +1,6 @@
+"""
+Sefaria Explorer Benchmarks
+
+Latency benchmark harness that drives the real on_message pipeline against
+local stand-ins for OpenRouter and the Sefaria API.
+"""
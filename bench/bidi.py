@@ -0,0 +1,75 @@
+"""
+RTL Formatter Microbenchmark
+
+Times explorer.bidi on synthetic mixed English/Hebrew Markdown responses of
+growing size, both in one shot and fed as small streamed deltas. Cost per KB
+should stay flat as the response grows.
+
+Usage:
+    python -m bench.bidi [--sizes 1 4 16 64] [--delta 8] [--repeat 20]
+"""
+
+import argparse
+import time
+
+from explorer.bidi import BidiFormatter, format_bidi
+
+PARAGRAPHS = [
+    "The verse opens the account of creation:\n\n",
+    "בְּרֵאשִׁית בָּרָא אֱלֹהִים אֵת הַשָּׁמַיִם וְאֵת הָאָרֶץ׃\n\n",
+    "Rashi asks why the Torah begins here rather than with the first commandment, \"הַחֹדֶשׁ הַזֶּה לָכֶם\".\n\n",
+    "- **רש\"י**: לא היה צריך להתחיל את התורה אלא מהחדש הזה לכם\n- **Ramban**: the creation account is the root of faith\n\n",
+    "```\nGenesis 1:1\n```\n\n",
+]
+
+
+def make_response(size_kb: int) -> str:
+    """Build a response of about size_kb kilobytes of UTF-8."""
+    parts, size, index = [], 0, 0
+    while size < size_kb * 1024:
+        paragraph = PARAGRAPHS[index % len(PARAGRAPHS)]
+        parts.append(paragraph)
+        size += len(paragraph.encode("utf-8"))
+        index += 1
+    return "".join(parts)
+
+
+def best_time(function, repeat: int) -> float:
+    """Return the fastest of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def stream(text: str, delta: int):
+    """Feed text to a formatter in deltas of `delta` characters."""
+    formatter = BidiFormatter()
+    for index in range(0, len(text), delta):
+        formatter.feed(text[index:index + delta])
+    return formatter.formatted()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark the streaming RTL formatter")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16, 64], help="Response sizes in KB")
+    parser.add_argument("--delta", type=int, default=8, help="Characters per streamed delta")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'one-shot':>12} {'per KB':>10} {'streamed':>12} {'per KB':>10}")
+    for size_kb in args.sizes:
+        text = make_response(size_kb)
+        kb = len(text.encode("utf-8")) / 1024
+        one_shot = best_time(lambda: format_bidi(text), args.repeat)
+        streamed = best_time(lambda: stream(text, args.delta), args.repeat)
+        print(
+            f"{size_kb:>4}KB {one_shot * 1e3:>10.3f}ms {one_shot * 1e6 / kb:>8.1f}us "
+            f"{streamed * 1e3:>10.3f}ms {streamed * 1e6 / kb:>8.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Local Stand-in Servers
+OpenAI-compatible chat endpoint with scripted tool calls, a Sefaria API stub,
+a Sefaria MCP (SSE transport) stub and a Redis-protocol session server
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Optional
+from urllib.parse import unquote
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+
+def rate_limited(retry_after: str = "0.2") -> JSONResponse:
+    """A 429 response as a throttled upstream would send it."""
+    return JSONResponse({"error": {"message": "Rate limit exceeded", "code": 429}},
+                        status_code=429, headers={"Retry-After": retry_after})
+
+
+class FakeOpenRouter:
+    """
+    OpenAI-compatible /chat/completions endpoint driven by scenarios.
+
+    The scenario is chosen by the text of the latest user message. The
+    number of assistant tool-call messages since that message selects the
+    next scripted round; once the rounds run out, the scripted answer is
+    returned, streamed token by token when the request asks for it.
+
+    Prompt caching is simulated: once a request's tool schema and system
+    message have been seen byte for byte, later requests starting with
+    them report that prefix as cached prompt tokens. With rate_limit_every
+    set, every Nth request is answered 429 with a short Retry-After.
+    """
+
+    def __init__(self, scenarios: list[dict], first_token_delay: float = 0.2,
+                 token_delay: float = 0.01, tool_call_delay: float = 0.3, rate_limit_every: int = 0):
+        self.scenarios = {scenario["prompt"]: scenario for scenario in scenarios}
+        self.rate_limit_every = rate_limit_every
+        self.throttled = 0
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tool_call_delay = tool_call_delay
+        self.requests = 0
+        self.request_bytes = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._prefixes: set[str] = set()
+        self.app = FastAPI()
+        self.app.add_api_route("/v1/chat/completions", self.chat_completions, methods=["POST"])
+        self.app.add_api_route("/v1/key", self.key_info, methods=["GET"])
+
+    def reset(self):
+        """Reset request counters (the simulated prompt cache stays warm)."""
+        self.requests = 0
+        self.request_bytes = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.throttled = 0
+
+    def _cached_tokens(self, payload: dict) -> int:
+        """Return the prompt tokens a provider would read from its prefix cache."""
+        messages = payload.get("messages") or []
+        system = messages[0] if messages and messages[0].get("role") == "system" else None
+        prefix = json.dumps([payload.get("tools"), system], ensure_ascii=False)
+        if prefix in self._prefixes:
+            return len(prefix.encode("utf-8")) // 4
+        self._prefixes.add(prefix)
+        return 0
+
+    async def key_info(self):
+        """Mimic OpenRouter's key info endpoint."""
+        return {"data": {"label": "bench", "limit_remaining": None}}
+
+    def _next_step(self, messages: list[dict]) -> dict:
+        """Work out whether the model should call tools or answer."""
+        last_user = max(i for i, message in enumerate(messages) if message["role"] == "user")
+        content = messages[last_user]["content"]
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content)
+        scenario = self.scenarios.get(content, {})
+        rounds_done = sum(
+            1 for message in messages[last_user:]
+            if message["role"] == "assistant" and message.get("tool_calls")
+        )
+        rounds = scenario.get("rounds", [])
+        if rounds_done < len(rounds):
+            return {"tool_calls": [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["arguments"], ensure_ascii=False)}
+                }
+                for call in rounds[rounds_done]
+            ]}
+        return {"content": scenario.get("answer", "I could not find anything for that.")}
+
+    async def chat_completions(self, request: Request):
+        """Return the next scripted step as a completion or an SSE stream."""
+        body = await request.body()
+        self.requests += 1
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            self.throttled += 1
+            return rate_limited()
+        self.request_bytes += len(body)
+        payload = json.loads(body)
+        step = self._next_step(payload["messages"])
+        prompt_tokens = len(body) // 4
+        cached_tokens = self._cached_tokens(payload)
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if not payload.get("stream"):
+            await asyncio.sleep(self.tool_call_delay if "tool_calls" in step else self.first_token_delay)
+            message = {"role": "assistant", "content": step.get("content"), "tool_calls": step.get("tool_calls")}
+            completion_tokens = len((step.get("content") or "").split()) + 20
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if "tool_calls" in step else "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens}
+                }
+            })
+
+        return StreamingResponse(
+            self._stream(completion_id, payload, step, prompt_tokens, cached_tokens), media_type="text/event-stream"
+        )
+
+    async def _stream(self, completion_id: str, payload: dict, step: dict, prompt_tokens: int, cached_tokens: int):
+        """Yield SSE chunks for one scripted step."""
+        def chunk(delta: dict, finish_reason=None, usage=None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model"),
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                data["usage"] = usage
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        completion_tokens = 0
+        if "tool_calls" in step:
+            await asyncio.sleep(self.tool_call_delay)
+            for index, tool_call in enumerate(step["tool_calls"]):
+                yield chunk({"tool_calls": [{
+                    "index": index,
+                    "id": tool_call["id"],
+                    "type": "function",
+                    "function": {"name": tool_call["function"]["name"], "arguments": ""}
+                }]})
+                yield chunk({"tool_calls": [{
+                    "index": index,
+                    "function": {"arguments": tool_call["function"]["arguments"]}
+                }]})
+                completion_tokens += 20
+            yield chunk({}, finish_reason="tool_calls")
+        else:
+            await asyncio.sleep(self.first_token_delay)
+            for token in step["content"].split(" "):
+                yield chunk({"content": token + " "})
+                completion_tokens += 1
+                await asyncio.sleep(self.token_delay)
+            yield chunk({}, finish_reason="stop")
+
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            yield chunk({}, usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            })
+        yield "data: [DONE]\n\n"
+
+
+class FakeSefaria:
+    """
+    Sefaria API stub serving recorded payloads.
+
+    Payloads are keyed by request path (e.g. "/api/v3/texts/Genesis 1:1");
+    unknown paths return 404. Every response waits `delay` seconds, and
+    with rate_limit_every set every Nth request is answered 429.
+    """
+
+    def __init__(self, payloads: dict[str, object], delay: float = 0.1, rate_limit_every: int = 0):
+        self.payloads = payloads
+        self.delay = delay
+        self.rate_limit_every = rate_limit_every
+        self.throttled = 0
+        self.requests = 0
+        self.response_bytes = 0
+        self.app = FastAPI()
+        self.app.add_api_route("/api/{path:path}", self.serve, methods=["GET"])
+
+    def reset(self):
+        """Reset request counters."""
+        self.requests = 0
+        self.response_bytes = 0
+        self.throttled = 0
+
+    async def serve(self, path: str):
+        """Return the recorded payload for a path."""
+        self.requests += 1
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            self.throttled += 1
+            return rate_limited()
+        await asyncio.sleep(self.delay)
+        payload = self.payloads.get(f"/api/{unquote(path)}")
+        if payload is None:
+            return JSONResponse({"error": f"No recorded payload for /api/{path}"}, status_code=404)
+        body = json.dumps(payload, ensure_ascii=False)
+        self.response_bytes += len(body.encode("utf-8"))
+        return JSONResponse(payload)
+
+
+class FakeSefariaMCP:
+    """
+    MCP server stub on the SSE transport, serving the same recorded payloads.
+
+    GET /sse opens a session and announces its message endpoint; JSON-RPC
+    requests POSTed there are answered on the session's stream. tools/call
+    maps each tool to the API path the app would request (see bench.record).
+    """
+
+    TOOLS = ["get_text", "text_search", "english_semantic_search", "get_links_between_texts",
+             "get_topic_details", "clarify_name_argument"]
+
+    def __init__(self, payloads: dict[str, object], delay: float = 0.1):
+        self.payloads = payloads
+        self.delay = delay
+        self.requests = 0
+        self.response_bytes = 0
+        self.sessions: dict[str, asyncio.Queue] = {}
+        self.app = FastAPI()
+        self.app.add_api_route("/sse", self.sse, methods=["GET"])
+        self.app.add_api_route("/messages", self.messages, methods=["POST"])
+
+    def reset(self):
+        """Reset request counters."""
+        self.requests = 0
+        self.response_bytes = 0
+
+    async def sse(self):
+        """Open a session stream."""
+        session_id = uuid.uuid4().hex
+        queue = self.sessions[session_id] = asyncio.Queue()
+
+        async def events():
+            yield f"event: endpoint\ndata: /messages?session_id={session_id}\n\n"
+            try:
+                while True:
+                    message = await queue.get()
+                    if message is None:
+                        return
+                    yield f"event: message\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+            finally:
+                self.sessions.pop(session_id, None)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    def drop_sessions(self):
+        """End every open session stream, as a server restart would."""
+        for queue in self.sessions.values():
+            queue.put_nowait(None)
+
+    async def messages(self, session_id: str, request: Request):
+        """Accept a JSON-RPC message and answer it on the session's stream."""
+        queue = self.sessions.get(session_id)
+        if queue is None:
+            return JSONResponse({"error": "Unknown session"}, status_code=404)
+        message = await request.json()
+        if "id" in message:
+            asyncio.create_task(self._answer(queue, message))
+        return Response(status_code=202)
+
+    async def _answer(self, queue: asyncio.Queue, message: dict):
+        method, params = message.get("method"), message.get("params") or {}
+        if method == "initialize":
+            result = {"protocolVersion": params.get("protocolVersion"), "capabilities": {"tools": {}},
+                      "serverInfo": {"name": "fake-sefaria-mcp", "version": "0"}}
+        elif method == "tools/list":
+            result = {"tools": [
+                {"name": name, "description": f"Stub for {name}", "inputSchema": {"type": "object", "properties": {}}}
+                for name in self.TOOLS
+            ]}
+        elif method == "tools/call":
+            from bench.record import payload_path
+
+            self.requests += 1
+            await asyncio.sleep(self.delay)
+            try:
+                path, _ = payload_path(params.get("name"), params.get("arguments") or {})
+                payload = self.payloads.get(path)
+            except (KeyError, ValueError):
+                payload = None
+            if payload is None:
+                result = {"content": [{"type": "text", "text": "No recorded payload"}], "isError": True}
+            else:
+                text = json.dumps(payload, ensure_ascii=False)
+                self.response_bytes += len(text.encode("utf-8"))
+                result = {"content": [{"type": "text", "text": text}]}
+        else:
+            await queue.put({"jsonrpc": "2.0", "id": message["id"],
+                             "error": {"code": -32601, "message": f"Method not found: {method}"}})
+            return
+        await queue.put({"jsonrpc": "2.0", "id": message["id"], "result": result})
+
+
+class FakeRedis:
+    """
+    In-memory server for the Redis protocol subset the session store uses.
+
+    Supports PING, AUTH, SELECT, HSET, HGETALL, RPUSH, LRANGE, DEL, EXPIRE
+    and MULTI/EXEC; expiry times are accepted but not enforced.
+    """
+
+    def __init__(self):
+        self.data: dict[bytes, object] = {}
+        self.commands = 0
+        self.server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self) -> str:
+        """Listen on a free local port and return a redis:// URL for it."""
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"redis://127.0.0.1:{port}/0"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @staticmethod
+    def _reply(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, Exception):
+            return b"-ERR %s\r\n" % str(value).encode()
+        if isinstance(value, str):
+            return b"+%s\r\n" % value.encode()
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, bytes):
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        return b"*%d\r\n" % len(value) + b"".join(FakeRedis._reply(item) for item in value)
+
+    def _run(self, command: list[bytes]):
+        self.commands += 1
+        name, args = command[0].upper(), command[1:]
+        if name in (b"PING", b"AUTH", b"SELECT", b"EXPIRE"):
+            return "PONG" if name == b"PING" else ("OK" if name != b"EXPIRE" else 1)
+        if name == b"HSET":
+            fields = self.data.setdefault(args[0], {})
+            for i in range(1, len(args), 2):
+                fields[args[i]] = args[i + 1]
+            return (len(args) - 1) // 2
+        if name == b"HGETALL":
+            return [item for pair in self.data.get(args[0], {}).items() for item in pair]
+        if name == b"RPUSH":
+            entries = self.data.setdefault(args[0], [])
+            entries.extend(args[1:])
+            return len(entries)
+        if name == b"LRANGE":
+            entries = self.data.get(args[0], [])
+            start, stop = int(args[1]), int(args[2])
+            return entries[start:stop + 1 if stop != -1 else None]
+        if name == b"DEL":
+            return sum(self.data.pop(key, None) is not None for key in args)
+        return ValueError(f"unknown command '{name.decode()}'")
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[list[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        command = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            command.append((await reader.readexactly(length + 2))[:-2])
+        return command
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        queued: Optional[list] = None
+        try:
+            while (command := await self._read_command(reader)) is not None:
+                name = command[0].upper()
+                if name == b"MULTI":
+                    queued, reply = [], "OK"
+                elif name == b"EXEC":
+                    reply, queued = [self._run(queued_command) for queued_command in queued or []], None
+                elif queued is not None:
+                    queued.append(command)
+                    reply = "QUEUED"
+                else:
+                    reply = self._run(command)
+                writer.write(self._reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def start_server(app: FastAPI) -> tuple[uvicorn.Server, asyncio.Task, str]:
+    """Start an ASGI app on a free local port and return (server, task, base_url)."""
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+async def stop_server(server: uvicorn.Server, task: asyncio.Task):
+    """Stop a server started with start_server."""
+    server.should_exit = True
+    await task
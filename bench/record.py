@@ -0,0 +1,69 @@
+"""
+Payload Recorder
+
+Fetches the Sefaria responses needed by bench/scenarios.json from the live API
+and saves them as the stub's recorded payloads.
+
+Usage:
+    python -m bench.record [--output bench/payloads.json]
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+
+BENCH_DIR = Path(__file__).parent
+SEFARIA_BASE = "https://www.sefaria.org"
+
+
+def payload_path(tool_name: str, arguments: dict) -> tuple[str, dict]:
+    """Map a tool call to the Sefaria API path and query parameters the app requests."""
+    if tool_name == "get_text":
+        params = {"version": arguments["version_language"]} if arguments.get("version_language") else {}
+        return f"/api/v3/texts/{arguments['reference']}", params
+    if tool_name == "get_links_between_texts":
+        return f"/api/links/{arguments['reference']}", {"with_text": arguments.get("with_text", "0")}
+    if tool_name == "get_topic_details":
+        params = {key: "1" for key in ("with_links", "with_refs") if arguments.get(key)}
+        return f"/api/topics/{arguments['topic_slug']}", params
+    if tool_name == "clarify_name_argument":
+        return f"/api/name/{arguments['name']}", {"limit": arguments.get("limit", 10)}
+    if tool_name == "text_search":
+        return f"/api/search-wrapper/text/{arguments['query']}", {"size": arguments.get("size", 10)}
+    if tool_name == "english_semantic_search":
+        return f"/api/search/text/{arguments['query']}", {}
+    raise ValueError(f"Unknown tool: {tool_name}")
+
+
+async def record(output: Path):
+    """Fetch every payload referenced by the scenarios and write them to output."""
+    scenarios = json.loads((BENCH_DIR / "scenarios.json").read_text())
+    payloads = {}
+    async with httpx.AsyncClient(base_url=SEFARIA_BASE, timeout=30.0) as http_client:
+        for scenario in scenarios:
+            for round_calls in scenario.get("rounds", []):
+                for call in round_calls:
+                    path, params = payload_path(call["name"], call["arguments"])
+                    if path in payloads:
+                        continue
+                    response = await http_client.get(path, params=params)
+                    print(f"{response.status_code} {path}")
+                    if response.status_code == 200:
+                        payloads[path] = response.json()
+
+    output.write_text(json.dumps(payloads, ensure_ascii=False, indent=1))
+    print(f"Recorded {len(payloads)} payloads to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record Sefaria payloads for the benchmark stub")
+    parser.add_argument("--output", default=str(BENCH_DIR / "payloads.json"))
+    args = parser.parse_args()
+    asyncio.run(record(Path(args.output)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+End-to-End Latency Benchmark
+
+Starts local stand-ins for OpenRouter and Sefaria, points the app at them and
+drives the real on_message pipeline for a mix of scripted turns.
+
+Usage:
+    python -m bench.run --turns 100 --concurrency 10
+    python -m bench.run --compare bench/results/previous.json
+    python -m bench.run --mcp    # tool calls over the MCP session instead of REST
+    python -m bench.run --session-store redis    # sessions on the Redis-protocol stand-in
+    python -m bench.run --rate-limit-every 7    # every 7th upstream request gets a 429
+"""
+
+import argparse
+import asyncio
+import contextvars
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from bench.fakes import FakeOpenRouter, FakeRedis, FakeSefaria, FakeSefariaMCP, start_server, stop_server
+
+BENCH_DIR = Path(__file__).parent
+RESULTS_DIR = BENCH_DIR / "results"
+
+# Time of the first visible output for the turn being measured
+_first_output: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("first_output", default=None)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(values: list[float]) -> dict:
+    """Return p50/p95/p99/mean/max in milliseconds."""
+    if not values:
+        return {}
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+def git_revision() -> str:
+    """Return the current commit hash, or 'unknown' outside a git checkout."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR.parent, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def instrument_messages(cl):
+    """Record the first streamed token or message update of each turn."""
+    original_stream_token = cl.Message.stream_token
+    original_update = cl.Message.update
+
+    def mark():
+        first = _first_output.get()
+        if first is not None and not first:
+            first.append(time.perf_counter())
+
+    async def stream_token(self, token: str, is_sequence: bool = False):
+        if token:
+            mark()
+        return await original_stream_token(self, token, is_sequence)
+
+    async def update(self):
+        if self.content:
+            mark()
+        return await original_update(self)
+
+    cl.Message.stream_token = stream_token
+    cl.Message.update = update
+
+
+async def run_turn(app, prompt: str, system_prompt: str) -> dict:
+    """Run one user turn through on_message in a fresh Chainlit context."""
+    from chainlit.context import init_http_context
+    import chainlit as cl
+
+    init_http_context()
+    cl.user_session.set("message_history", [{"role": "system", "content": system_prompt}])
+    first = []
+    _first_output.set(first)
+
+    started = time.perf_counter()
+    await app.on_message(cl.Message(content=prompt))
+    finished = time.perf_counter()
+    return {
+        "latency": finished - started,
+        "ttft": (first[0] - started) if first else None,
+    }
+
+
+async def run_benchmark(args) -> dict:
+    """Start the stand-ins, run the configured turns and collect results."""
+    scenarios = json.loads((BENCH_DIR / "scenarios.json").read_text())
+    payloads = json.loads(Path(args.payloads).read_text())
+
+    fake_llm = FakeOpenRouter(
+        scenarios,
+        first_token_delay=args.llm_first_token_delay,
+        token_delay=args.llm_token_delay,
+        tool_call_delay=args.llm_tool_call_delay,
+        rate_limit_every=args.rate_limit_every,
+    )
+    fake_sefaria = FakeSefaria(payloads, delay=args.sefaria_delay, rate_limit_every=args.rate_limit_every)
+    fake_mcp = FakeSefariaMCP(payloads, delay=args.sefaria_delay)
+    llm_server, llm_task, llm_url = await start_server(fake_llm.app)
+    sefaria_server, sefaria_task, sefaria_url = await start_server(fake_sefaria.app)
+    mcp_server, mcp_task, mcp_url = await start_server(fake_mcp.app)
+    fake_redis = FakeRedis()
+    redis_url = await fake_redis.start()
+
+    try:
+        # Point the app at the stand-ins before it is imported
+        cache_dir = tempfile.mkdtemp(prefix="sefaria-bench-")
+        session_stores = {
+            "memory": "memory",
+            "sqlite": f"sqlite://{Path(cache_dir) / 'sessions.sqlite3'}",
+            "redis": redis_url,
+        }
+        os.environ.update({
+            "OPEN_ROUTER_API": "sk-or-bench",
+            "OPENROUTER_BASE_URL": f"{llm_url}/v1",
+            "SEFARIA_API_URL": f"{sefaria_url}/api",
+            "SEFARIA_MCP_URL": f"{mcp_url}/sse",
+            "MCP_ENABLED": "1" if args.mcp else "0",
+            "STREAM_RESPONSES": "1" if args.stream else "0",
+            "CACHE_ENABLED": "1" if args.cache else "0",
+            "CACHE_DB_PATH": str(Path(cache_dir) / "cache.sqlite3"),
+            "SESSION_STORE": session_stores[args.session_store],
+        })
+        sys.path.insert(0, str(BENCH_DIR.parent))
+        import chainlit as cl
+        app = importlib.import_module("app")
+        from personas import get_persona
+
+        instrument_messages(cl)
+        if app.mcp_client is not None:
+            app.mcp_client.start()
+            if not await app.mcp_client.wait_ready(5):
+                raise RuntimeError("MCP stand-in session did not come up")
+        system_prompt = get_persona(args.persona)["system_prompt"]
+        prompts = [scenarios[i % len(scenarios)]["prompt"] for i in range(args.turns)]
+
+        # Warm up connections without counting them
+        if args.warmup:
+            await run_turn(app, scenarios[-1]["prompt"], system_prompt)
+        fake_llm.reset()
+        fake_sefaria.reset()
+        fake_mcp.reset()
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(prompt: str) -> dict:
+            # gather runs each turn in its own task (and context), so sessions stay separate
+            async with semaphore:
+                return await run_turn(app, prompt, system_prompt)
+
+        started = time.perf_counter()
+        turns = await asyncio.gather(*(bounded(prompt) for prompt in prompts))
+        wall_time = time.perf_counter() - started
+
+        sessions = app.session_store.stats()
+        limiters = {limiter.name: limiter.stats() for limiter in (app.openrouter_limiter, app.sefaria_limiter)}
+        if app.mcp_client is not None:
+            await app.mcp_client.close()
+        await app.session_store.close()
+        await app.close_http_client()
+    finally:
+        fake_mcp.drop_sessions()
+        await fake_redis.stop()
+        await stop_server(llm_server, llm_task)
+        await stop_server(sefaria_server, sefaria_task)
+        await stop_server(mcp_server, mcp_task)
+
+    latencies = [turn["latency"] for turn in turns]
+    ttfts = [turn["ttft"] for turn in turns if turn["ttft"] is not None]
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "turns": args.turns,
+            "concurrency": args.concurrency,
+            "stream": args.stream,
+            "cache": args.cache,
+            "mcp": args.mcp,
+            "session_store": args.session_store,
+            "persona": args.persona,
+            "llm_first_token_delay": args.llm_first_token_delay,
+            "llm_token_delay": args.llm_token_delay,
+            "llm_tool_call_delay": args.llm_tool_call_delay,
+            "sefaria_delay": args.sefaria_delay,
+            "rate_limit_every": args.rate_limit_every,
+        },
+        "wall_time_s": round(wall_time, 3),
+        "throughput_turns_per_s": round(len(turns) / wall_time, 2) if wall_time else 0.0,
+        "turn_latency": summarize(latencies),
+        "time_to_first_token": summarize(ttfts),
+        "upstream": {
+            "llm_requests": fake_llm.requests,
+            "llm_request_bytes": fake_llm.request_bytes,
+            "llm_request_bytes_per_turn": round(fake_llm.request_bytes / len(turns)),
+            "llm_prompt_tokens": fake_llm.prompt_tokens,
+            "llm_cached_prompt_tokens": fake_llm.cached_tokens,
+            "sefaria_requests": fake_sefaria.requests + fake_mcp.requests,
+            "sefaria_response_bytes": fake_sefaria.response_bytes + fake_mcp.response_bytes,
+            "llm_throttled": fake_llm.throttled,
+            "sefaria_throttled": fake_sefaria.throttled,
+        },
+        "sessions": sessions,
+        "limiters": limiters,
+    }
+
+
+def compare(current: dict, previous: dict) -> list[str]:
+    """Describe the change of each headline number against a previous run."""
+    lines = [f"Compared with {previous.get('revision', '?')} ({previous.get('timestamp', '?')}):"]
+    for section in ("turn_latency", "time_to_first_token", "upstream"):
+        for key, value in current.get(section, {}).items():
+            before = previous.get(section, {}).get(key)
+            if not isinstance(before, (int, float)) or not before:
+                continue
+            change = (value - before) / before * 100
+            lines.append(f"  {section}.{key}: {before} -> {value} ({change:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark for Sefaria Explorer")
+    parser.add_argument("--turns", type=int, default=50, help="Number of user turns to run")
+    parser.add_argument("--concurrency", type=int, default=5, help="Turns in flight at once")
+    parser.add_argument("--persona", default="generalist", help="Persona whose system prompt is used")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="Disable streamed completions")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="Disable the tool result cache")
+    parser.add_argument("--mcp", action="store_true", help="Route tool calls over the MCP session")
+    parser.add_argument("--session-store", choices=("memory", "sqlite", "redis"), default="memory",
+                        help="Session store backend")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="Skip the warm-up turn")
+    parser.add_argument("--llm-first-token-delay", type=float, default=0.2, help="Seconds before the first answer token")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005, help="Seconds between answer tokens")
+    parser.add_argument("--llm-tool-call-delay", type=float, default=0.3, help="Seconds before a tool-call response")
+    parser.add_argument("--sefaria-delay", type=float, default=0.1, help="Seconds per Sefaria API response")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth upstream request with 429")
+    parser.add_argument("--payloads", default=str(BENCH_DIR / "payloads.json"), help="Recorded Sefaria payloads")
+    parser.add_argument("--output", help="Where to write the JSON results (default: bench/results/<revision>.json)")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{results['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+
+    print(json.dumps(results, indent=2))
+    print(f"\nResults written to {output}")
+    if args.compare:
+        print("\n".join(compare(results, json.loads(Path(args.compare).read_text()))))
+
+
+if __name__ == "__main__":
+    main()
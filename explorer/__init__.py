@@ -0,0 +1,23 @@
+"""
+Sefaria Explorer Services
+
+Supporting services for the Chainlit app: caching, local data stores and
+other infrastructure shared by the Sefaria tool calls.
+"""
+
+from .cache import ToolCache, CACHE_POLICIES, normalize_arguments, make_cache_key
+from .projection import project_result, cap_result, dumps_compact
+from .history import ContextWindowManager, MODEL_TOKEN_BUDGETS, count_message_tokens
+from .singleflight import SingleFlight
+from .textstore import TextStore, build_store
+from .search_index import SearchIndex, build_index, normalize_token
+from .refs import RefResolver, TitleTrie, load_sefaria_index, split_ref, to_hebrew_numeral
+from .prefetch import Prefetcher, plan_prefetch
+from .linkgraph import LinkGraph, build_graph, expand_ref
+from .topics import TopicStore, build_topic_store
+from .bidi import BidiFormatter, format_bidi, contains_hebrew, RTL_OPEN, RTL_CLOSE
+from .telemetry import Telemetry, NOOP_SPAN, gauge_lines
+from .hebrew_calendar import HebrewYear, hebrew_year, to_hebrew, to_gregorian
+from .prompt_cache import PromptCacheStats, prepare_messages, prefix_fingerprint, cached_prompt_tokens, wants_cache_control
+from .sessions import SessionStore, MemorySessionStore, SQLiteSessionStore, RedisSessionStore, RespClient, SessionStoreError, open_session_store
+from .ratelimit import FairLimiter, RetryPolicy, UpstreamStatusError, RETRY_STATUSES, call_with_retry, parse_retry_after
@@ -0,0 +1,141 @@
+"""
+Bidirectional Text Formatting
+Wraps right-to-left paragraphs of a Markdown response in RTL containers, incrementally
+
+A paragraph's direction follows its first strong character (rule P2 of the
+Unicode bidi algorithm), so an English answer quoting a Hebrew phrase stays
+left-to-right while Hebrew paragraphs are right-aligned. Fenced code blocks
+are never split or wrapped.
+"""
+
+import re
+
+RTL_OPEN = '<div dir="rtl" style="text-align: right; font-family: \'David\', \'Noto Sans Hebrew\', serif;">'
+RTL_CLOSE = '</div>'
+
+_HEBREW = "\u0590-\u05FF\uFB1D-\uFB4F"
+_LTR = "A-Za-z\u00C0-\u024F\u0370-\u03FF\u0400-\u04FF"
+
+# Every character of the input belongs to exactly one token, so a single
+# finditer pass segments the text into lines, script runs and neutrals. A
+# script run spans the neutrals between letters of the same script.
+TOKEN_PATTERN = re.compile(
+    rf"(?P<nl>\n)"
+    rf"|(?P<ws>[^\S\n]+)"
+    rf"|(?P<fence>```)"
+    rf"|(?P<rtl>[{_HEBREW}](?:[^\n`{_LTR}]*[{_HEBREW}])?)"
+    rf"|(?P<ltr>[{_LTR}](?:[^\n`{_HEBREW}]*[{_LTR}])?)"
+    rf"|(?P<other>`|[^\s`{_HEBREW}{_LTR}]+)"
+)
+
+# Up to two trailing backticks may be the start of a fence split across deltas
+_PARTIAL_FENCE = re.compile(r"(?<!`)`{1,2}\Z")
+
+
+def contains_hebrew(text: str) -> bool:
+    """Return True if the text contains any character from the Hebrew blocks."""
+    return re.search(f"[{_HEBREW}]", text) is not None
+
+
+class BidiFormatter:
+    """
+    Streaming RTL formatter.
+
+    feed() scans only the new delta and returns the formatted text to
+    append, so output is never re-sent. Text is held back only while a
+    paragraph has not yet shown a strong character, and a paragraph's
+    container is closed at the next blank line or by formatted().
+    """
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self._output: list[str] = []
+        self._pending: list[str] = []
+        self._direction = None
+        self._line_has_content = False
+        self._in_fence = False
+        self._carry = ""
+
+    @property
+    def text(self) -> str:
+        """Return the raw (unformatted) text received so far."""
+        return "".join(self.parts)
+
+    def feed(self, delta: str) -> str:
+        """Add a delta and return the formatted output to append to what is displayed."""
+        self.parts.append(delta)
+        text = self._carry + delta
+        match = _PARTIAL_FENCE.search(text)
+        self._carry = match.group() if match else ""
+        if match:
+            text = text[:match.start()]
+        return self._scan(text)
+
+    def _emit(self, chunk: str, out: list[str]):
+        """Route a chunk into the undecided paragraph buffer or the output."""
+        if self._direction == "pending":
+            self._pending.append(chunk)
+        else:
+            out.append(chunk)
+
+    def _decide(self, direction: str, out: list[str]):
+        """Fix the current paragraph's direction and release its buffered prefix."""
+        if direction == "rtl":
+            out.append(RTL_OPEN + "\n\n")
+        out.extend(self._pending)
+        self._pending = []
+        self._direction = direction
+
+    def _close(self, out: list[str]):
+        """End the current paragraph."""
+        if self._direction == "rtl":
+            out.append("\n" + RTL_CLOSE + "\n")
+        out.extend(self._pending)
+        self._pending = []
+        self._direction = None
+
+    def _scan(self, text: str) -> str:
+        out: list[str] = []
+        for match in TOKEN_PATTERN.finditer(text):
+            kind, chunk = match.lastgroup, match.group()
+            if kind == "nl":
+                if not self._line_has_content and self._direction is not None and not self._in_fence:
+                    self._close(out)
+                self._emit(chunk, out)
+                self._line_has_content = False
+                continue
+            if kind == "ws":
+                self._emit(chunk, out)
+                continue
+
+            if kind == "fence" and not self._line_has_content:
+                self._in_fence = not self._in_fence
+                if self._direction in (None, "pending"):
+                    self._decide("ltr", out)
+            elif kind in ("rtl", "ltr") and self._direction in (None, "pending") and not self._in_fence:
+                self._decide(kind, out)
+            elif self._direction is None:
+                self._direction = "pending"
+            self._emit(chunk, out)
+            self._line_has_content = True
+
+        formatted = "".join(out)
+        self._output.append(formatted)
+        return formatted
+
+    def formatted(self) -> str:
+        """Return the full formatted text, closing the last paragraph."""
+        if self._carry:
+            carry, self._carry = self._carry, ""
+            self._scan(carry)
+        tail = "".join(self._pending)
+        if self._direction == "rtl":
+            tail += "\n\n" + RTL_CLOSE
+        return "".join(self._output) + tail
+
+
+def format_bidi(text: str) -> str:
+    """Format a complete response, wrapping only its right-to-left paragraphs."""
+    formatter = BidiFormatter()
+    formatter.feed(text)
+    return formatter.formatted()
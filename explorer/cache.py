@@ -0,0 +1,201 @@
+"""
+Tiered Response Cache
+Bounded in-memory LRU in front of a persistent SQLite store for Sefaria tool results
+"""
+
+import json
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# Per-tool cache policy: ttl in seconds, max_items for the memory tier and
+# max_disk_items for the SQLite tier. Tools without a policy are not cached.
+CACHE_POLICIES = {
+    "get_text": {"ttl": 7 * 24 * 3600, "max_items": 2000, "max_disk_items": 200_000},
+    "get_links_between_texts": {"ttl": 7 * 24 * 3600, "max_items": 1000, "max_disk_items": 100_000},
+    "get_topic_details": {"ttl": 24 * 3600, "max_items": 500, "max_disk_items": 20_000},
+    "clarify_name_argument": {"ttl": 7 * 24 * 3600, "max_items": 2000, "max_disk_items": 50_000},
+    "text_search": {"ttl": 3600, "max_items": 500, "max_disk_items": 10_000},
+    "english_semantic_search": {"ttl": 3600, "max_items": 500, "max_disk_items": 10_000},
+}
+
+# How many inserts between pruning passes on the disk tier
+PRUNE_INTERVAL = 500
+
+
+def normalize_arguments(arguments: dict) -> dict:
+    """Normalize tool arguments: drop empty values and collapse whitespace in strings."""
+    normalized = {}
+    for key, value in arguments.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.split())
+        normalized[key] = value
+    return normalized
+
+
+def make_cache_key(tool_name: str, arguments: dict) -> str:
+    """Build a stable cache key from a tool name and its normalized arguments."""
+    payload = json.dumps(normalize_arguments(arguments), sort_keys=True, ensure_ascii=False)
+    return f"{tool_name}:{payload}"
+
+
+class ToolCache:
+    """
+    Two-tier cache for tool results.
+
+    Lookups check a per-tool in-memory LRU first, then the SQLite store.
+    Disk hits are promoted into memory. Each tool has its own TTL and size
+    limits, taken from CACHE_POLICIES unless overridden.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, policies: Optional[dict] = None):
+        self.policies = policies if policies is not None else CACHE_POLICIES
+        self._memory: dict[str, OrderedDict] = {tool: OrderedDict() for tool in self.policies}
+        self._inserts = 0
+        self.stats_by_tool = {
+            tool: {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+            for tool in self.policies
+        }
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            db_path = Path(db_path)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tool_cache ("
+                "key TEXT PRIMARY KEY, tool TEXT NOT NULL, value BLOB NOT NULL, "
+                "expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tool_cache_tool ON tool_cache (tool, created_at)")
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        """Return True if results for this tool are cached."""
+        return tool_name in self.policies
+
+    def get(self, tool_name: str, arguments: dict) -> Optional[str]:
+        """Return the cached result for a tool call, or None on a miss."""
+        if not self.is_cacheable(tool_name):
+            return None
+
+        key = make_cache_key(tool_name, arguments)
+        stats = self.stats_by_tool[tool_name]
+        now = time.time()
+
+        # Memory tier
+        memory = self._memory[tool_name]
+        entry = memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                memory.move_to_end(key)
+                stats["memory_hits"] += 1
+                return value
+            del memory[key]
+
+        # Disk tier
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                blob, expires_at = row
+                if expires_at > now:
+                    value = zlib.decompress(blob).decode("utf-8")
+                    self._remember(tool_name, key, expires_at, value)
+                    stats["disk_hits"] += 1
+                    return value
+                self._db.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+
+        stats["misses"] += 1
+        return None
+
+    def contains(self, tool_name: str, arguments: dict) -> bool:
+        """Return True if an unexpired entry exists, without touching the hit counters or LRU order."""
+        if not self.is_cacheable(tool_name):
+            return False
+        key = make_cache_key(tool_name, arguments)
+        now = time.time()
+        entry = self._memory[tool_name].get(key)
+        if entry is not None and entry[0] > now:
+            return True
+        if self._db is not None:
+            row = self._db.execute("SELECT expires_at FROM tool_cache WHERE key = ?", (key,)).fetchone()
+            return row is not None and row[0] > now
+        return False
+
+    def set(self, tool_name: str, arguments: dict, value: str):
+        """Store a tool result in both tiers."""
+        if not self.is_cacheable(tool_name):
+            return
+
+        key = make_cache_key(tool_name, arguments)
+        now = time.time()
+        expires_at = now + self.policies[tool_name]["ttl"]
+        self._remember(tool_name, key, expires_at, value)
+        self.stats_by_tool[tool_name]["stores"] += 1
+
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, tool, value, expires_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, tool_name, zlib.compress(value.encode("utf-8")), expires_at, now),
+            )
+            self._inserts += 1
+            if self._inserts % PRUNE_INTERVAL == 0:
+                self.prune()
+
+    def _remember(self, tool_name: str, key: str, expires_at: float, value: str):
+        """Insert into the memory tier, evicting the least recently used entries."""
+        memory = self._memory[tool_name]
+        memory[key] = (expires_at, value)
+        memory.move_to_end(key)
+        max_items = self.policies[tool_name]["max_items"]
+        while len(memory) > max_items:
+            memory.popitem(last=False)
+
+    def prune(self):
+        """Drop expired rows and trim each tool to its disk size limit."""
+        if self._db is None:
+            return
+        self._db.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+        for tool_name, policy in self.policies.items():
+            self._db.execute(
+                "DELETE FROM tool_cache WHERE tool = ? AND key NOT IN ("
+                "SELECT key FROM tool_cache WHERE tool = ? ORDER BY created_at DESC LIMIT ?)",
+                (tool_name, tool_name, policy["max_disk_items"]),
+            )
+
+    def clear(self):
+        """Remove every entry from both tiers."""
+        for memory in self._memory.values():
+            memory.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM tool_cache")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters per tool plus totals."""
+        totals = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        for stats in self.stats_by_tool.values():
+            for name, count in stats.items():
+                totals[name] += count
+        lookups = totals["memory_hits"] + totals["disk_hits"] + totals["misses"]
+        totals["hit_rate"] = (totals["memory_hits"] + totals["disk_hits"]) / lookups if lookups else 0.0
+        return {
+            "totals": totals,
+            "tools": {tool: dict(stats) for tool, stats in self.stats_by_tool.items()},
+            "memory_items": {tool: len(memory) for tool, memory in self._memory.items()},
+        }
+
+    def close(self):
+        """Close the SQLite connection."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,723 @@
+"""
+Hebrew Calendar
+Pure-Python Jewish calendar: date conversion, holidays, weekly parsha and Daf Yomi
+
+Dates are handled as proleptic Gregorian ordinals (date.toordinal()), and
+each Hebrew year's months, holidays and Shabbat readings are computed once
+into a cached year table, so a lookup is a few dictionary probes. Torah
+readings and dapim are given as Sefaria refs that get_text accepts.
+
+Usage:
+    python -m explorer.hebrew_calendar convert 2025-04-13
+    python -m explorer.hebrew_calendar convert "15 Nisan 5785"
+    python -m explorer.hebrew_calendar holidays --year 5785 --israel
+    python -m explorer.hebrew_calendar parsha [--date 2025-03-29]
+    python -m explorer.hebrew_calendar daf [--date 2025-03-29]
+"""
+
+import argparse
+import json
+import re
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
+from .refs import from_hebrew_numeral, to_hebrew_numeral
+
+# Fixed day (proleptic Gregorian ordinal) of 1 Tishrei AM 1
+HEBREW_EPOCH = -1373427
+
+NISAN, IYYAR, SIVAN, TAMMUZ, AV, ELUL, TISHREI, CHESHVAN, KISLEV, TEVET, SHEVAT, ADAR, ADAR_II = range(1, 14)
+
+MONTH_NAMES = {
+    NISAN: ("Nisan", "ניסן"), IYYAR: ("Iyyar", "אייר"), SIVAN: ("Sivan", "סיון"),
+    TAMMUZ: ("Tamuz", "תמוז"), AV: ("Av", "אב"), ELUL: ("Elul", "אלול"),
+    TISHREI: ("Tishrei", "תשרי"), CHESHVAN: ("Cheshvan", "חשון"), KISLEV: ("Kislev", "כסלו"),
+    TEVET: ("Tevet", "טבת"), SHEVAT: ("Sh'vat", "שבט"), ADAR: ("Adar", "אדר"), ADAR_II: ("Adar II", "אדר ב׳"),
+}
+ADAR_I_NAMES = ("Adar I", "אדר א׳")
+
+# Spellings accepted when parsing a Hebrew date ("Adar" means Adar II in a leap year)
+MONTH_ALIASES = {
+    "nisan": NISAN, "nissan": NISAN, "ניסן": NISAN,
+    "iyyar": IYYAR, "iyar": IYYAR, "אייר": IYYAR,
+    "sivan": SIVAN, "סיון": SIVAN, "סיוון": SIVAN,
+    "tamuz": TAMMUZ, "tammuz": TAMMUZ, "תמוז": TAMMUZ,
+    "av": AV, "menachem av": AV, "אב": AV,
+    "elul": ELUL, "אלול": ELUL,
+    "tishrei": TISHREI, "tishri": TISHREI, "תשרי": TISHREI,
+    "cheshvan": CHESHVAN, "heshvan": CHESHVAN, "marcheshvan": CHESHVAN, "חשון": CHESHVAN, "חשוון": CHESHVAN,
+    "kislev": KISLEV, "כסלו": KISLEV,
+    "tevet": TEVET, "teves": TEVET, "טבת": TEVET,
+    "shvat": SHEVAT, "shevat": SHEVAT, "sh'vat": SHEVAT, "שבט": SHEVAT,
+    "adar": ADAR, "אדר": ADAR,
+    "adar i": ADAR, "adar 1": ADAR, "אדר א": ADAR,
+    "adar ii": ADAR_II, "adar 2": ADAR_II, "אדר ב": ADAR_II,
+}
+
+WEEKDAYS = ("Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday")
+SUNDAY, MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY = range(7)
+
+# (Sefaria name, Hebrew name, Torah reading)
+PARSHIYOT = [
+    ("Bereshit", "בראשית", "Genesis 1:1-6:8"),
+    ("Noach", "נח", "Genesis 6:9-11:32"),
+    ("Lech Lecha", "לך לך", "Genesis 12:1-17:27"),
+    ("Vayera", "וירא", "Genesis 18:1-22:24"),
+    ("Chayei Sara", "חיי שרה", "Genesis 23:1-25:18"),
+    ("Toldot", "תולדות", "Genesis 25:19-28:9"),
+    ("Vayetzei", "ויצא", "Genesis 28:10-32:3"),
+    ("Vayishlach", "וישלח", "Genesis 32:4-36:43"),
+    ("Vayeshev", "וישב", "Genesis 37:1-40:23"),
+    ("Miketz", "מקץ", "Genesis 41:1-44:17"),
+    ("Vayigash", "ויגש", "Genesis 44:18-47:27"),
+    ("Vayechi", "ויחי", "Genesis 47:28-50:26"),
+    ("Shemot", "שמות", "Exodus 1:1-6:1"),
+    ("Vaera", "וארא", "Exodus 6:2-9:35"),
+    ("Bo", "בא", "Exodus 10:1-13:16"),
+    ("Beshalach", "בשלח", "Exodus 13:17-17:16"),
+    ("Yitro", "יתרו", "Exodus 18:1-20:23"),
+    ("Mishpatim", "משפטים", "Exodus 21:1-24:18"),
+    ("Terumah", "תרומה", "Exodus 25:1-27:19"),
+    ("Tetzaveh", "תצוה", "Exodus 27:20-30:10"),
+    ("Ki Tisa", "כי תשא", "Exodus 30:11-34:35"),
+    ("Vayakhel", "ויקהל", "Exodus 35:1-38:20"),
+    ("Pekudei", "פקודי", "Exodus 38:21-40:38"),
+    ("Vayikra", "ויקרא", "Leviticus 1:1-5:26"),
+    ("Tzav", "צו", "Leviticus 6:1-8:36"),
+    ("Shmini", "שמיני", "Leviticus 9:1-11:47"),
+    ("Tazria", "תזריע", "Leviticus 12:1-13:59"),
+    ("Metzora", "מצורע", "Leviticus 14:1-15:33"),
+    ("Achrei Mot", "אחרי מות", "Leviticus 16:1-18:30"),
+    ("Kedoshim", "קדושים", "Leviticus 19:1-20:27"),
+    ("Emor", "אמור", "Leviticus 21:1-24:23"),
+    ("Behar", "בהר", "Leviticus 25:1-26:2"),
+    ("Bechukotai", "בחקתי", "Leviticus 26:3-27:34"),
+    ("Bamidbar", "במדבר", "Numbers 1:1-4:20"),
+    ("Nasso", "נשא", "Numbers 4:21-7:89"),
+    ("Beha'alotcha", "בהעלתך", "Numbers 8:1-12:16"),
+    ("Sh'lach", "שלח", "Numbers 13:1-15:41"),
+    ("Korach", "קרח", "Numbers 16:1-18:32"),
+    ("Chukat", "חקת", "Numbers 19:1-22:1"),
+    ("Balak", "בלק", "Numbers 22:2-25:9"),
+    ("Pinchas", "פינחס", "Numbers 25:10-30:1"),
+    ("Matot", "מטות", "Numbers 30:2-32:42"),
+    ("Masei", "מסעי", "Numbers 33:1-36:13"),
+    ("Devarim", "דברים", "Deuteronomy 1:1-3:22"),
+    ("Vaetchanan", "ואתחנן", "Deuteronomy 3:23-7:11"),
+    ("Eikev", "עקב", "Deuteronomy 7:12-11:25"),
+    ("Re'eh", "ראה", "Deuteronomy 11:26-16:17"),
+    ("Shoftim", "שופטים", "Deuteronomy 16:18-21:9"),
+    ("Ki Teitzei", "כי תצא", "Deuteronomy 21:10-25:19"),
+    ("Ki Tavo", "כי תבוא", "Deuteronomy 26:1-29:8"),
+    ("Nitzavim", "נצבים", "Deuteronomy 29:9-30:20"),
+    ("Vayeilech", "וילך", "Deuteronomy 31:1-30"),
+    ("Ha'Azinu", "האזינו", "Deuteronomy 32:1-52"),
+    ("V'Zot HaBerachah", "וזאת הברכה", "Deuteronomy 33:1-34:12"),
+]
+
+
+def _parsha_key(name: str) -> str:
+    """Normalize a parsha name for lookup ("Lech-Lecha" -> "lechlecha")."""
+    return re.sub(r"[\W_]", "", name.casefold())
+
+
+# Common transliterations besides Sefaria's
+PARSHA_ALIASES = {
+    "Chayei Sarah": 4, "Toldos": 5, "Vayeitzei": 6, "Vayeishev": 8, "Mikeitz": 9, "Vaeira": 13,
+    "Tetzave": 19, "Ki Sisa": 20, "Shemini": 25, "Acharei Mot": 28, "Acharei": 28, "Achrei": 28,
+    "Bechukosai": 32, "Bechukotai": 32, "Naso": 34, "Behaalotecha": 35, "Behaalotcha": 35,
+    "Shelach": 36, "Shlach Lecha": 36, "Korah": 37, "Chukas": 38, "Pinhas": 40, "Matos": 41,
+    "Ki Tetzei": 48, "Ki Seitzei": 48, "Ki Savo": 49, "Vayelech": 51, "Haazinu": 52,
+    "Vezot Haberakhah": 53, "Vezos Habracha": 53,
+}
+PARSHA_INDEX = {_parsha_key(name): index for index, (name, _, _) in enumerate(PARSHIYOT)}
+PARSHA_INDEX.update({_parsha_key(name): index for name, index in PARSHA_ALIASES.items()})
+PARSHA_INDEX.update({_parsha_key(he): index for index, (_, he, _) in enumerate(PARSHIYOT)})
+
+(VAYAKHEL, TZAV, TAZRIA, METZORA, ACHREI_MOT, BEHAR, BAMIDBAR, CHUKAT, MATOT, DEVARIM, VAETCHANAN,
+ NITZAVIM, VAYEILECH, HAAZINU) = (21, 24, 26, 27, 28, 31, 33, 38, 41, 43, 44, 50, 51, 52)
+
+# Pairs read together when a segment of the year has too few free Shabbatot,
+# in the order they are joined. Each pair is named by its first parsha.
+DOUBLED_BEFORE_PESACH = (VAYAKHEL, TAZRIA)
+DOUBLED_BEFORE_SHAVUOT = {False: (TAZRIA, ACHREI_MOT, BEHAR), True: (BEHAR, ACHREI_MOT)}
+DOUBLED_BEFORE_TISHA_BAV = (MATOT, CHUKAT)
+# In Israel the Shavuot anchor does not hold (an extra Shabbat after Pesach
+# or Shavuot puts Israel a week ahead), so Pesach to Tisha B'Av is one segment
+DOUBLED_AFTER_PESACH_ISRAEL = {False: (TAZRIA, ACHREI_MOT, MATOT, BEHAR, CHUKAT), True: (MATOT, CHUKAT, BEHAR, ACHREI_MOT)}
+
+SHABBAT_CHOL_HAMOED_READING = "Exodus 33:12-34:26"
+
+# Tractates in Daf Yomi order as (Sefaria title, Hebrew title, last daf)
+DAF_YOMI_TRACTATES = [
+    ("Berakhot", "ברכות", 64), ("Shabbat", "שבת", 157), ("Eruvin", "עירובין", 105),
+    ("Pesachim", "פסחים", 121), ("Shekalim", "שקלים", 22), ("Yoma", "יומא", 88),
+    ("Sukkah", "סוכה", 56), ("Beitzah", "ביצה", 40), ("Rosh Hashanah", "ראש השנה", 35),
+    ("Taanit", "תענית", 31), ("Megillah", "מגילה", 32), ("Moed Katan", "מועד קטן", 29),
+    ("Chagigah", "חגיגה", 27), ("Yevamot", "יבמות", 122), ("Ketubot", "כתובות", 112),
+    ("Nedarim", "נדרים", 91), ("Nazir", "נזיר", 66), ("Sotah", "סוטה", 49),
+    ("Gittin", "גיטין", 90), ("Kiddushin", "קידושין", 82), ("Bava Kamma", "בבא קמא", 119),
+    ("Bava Metzia", "בבא מציעא", 119), ("Bava Batra", "בבא בתרא", 176), ("Sanhedrin", "סנהדרין", 113),
+    ("Makkot", "מכות", 24), ("Shevuot", "שבועות", 49), ("Avodah Zarah", "עבודה זרה", 76),
+    ("Horayot", "הוריות", 14), ("Zevachim", "זבחים", 120), ("Menachot", "מנחות", 110),
+    ("Chullin", "חולין", 142), ("Bekhorot", "בכורות", 61), ("Arakhin", "ערכין", 34),
+    ("Temurah", "תמורה", 34), ("Keritot", "כריתות", 28), ("Meilah", "מעילה", 22),
+    ("Kinnim", "קינים", 25), ("Tamid", "תמיד", 33), ("Middot", "מדות", 37), ("Niddah", "נדה", 73),
+]
+# Kinnim, Tamid and Middot continue Meilah's pagination
+DAF_YOMI_FIRST_DAF = {"Kinnim": 23, "Tamid": 26, "Middot": 34}
+
+# Cycle 1 began 11 September 1923; from cycle 8 (24 June 1975) Shekalim has 22 dapim, not 13
+DAF_YOMI_START = date(1923, 9, 11).toordinal()
+DAF_YOMI_REVISED_START = date(1975, 6, 24).toordinal()
+DAF_YOMI_REVISED_CYCLE = 8
+
+HOLIDAY_CATEGORIES = ("major", "cholhamoed", "minor", "fast", "modern", "roshchodesh")
+
+ROMAN = ("I", "II", "III", "IV", "V", "VI", "VII", "VIII")
+HEBREW_ORDINALS = ("א׳", "ב׳", "ג׳", "ד׳", "ה׳", "ו׳", "ז׳", "ח׳")
+
+
+def is_leap_year(year: int) -> bool:
+    """Return True for years with Adar I and Adar II (7 of every 19)."""
+    return (7 * year + 1) % 19 < 7
+
+
+def _elapsed_days(year: int) -> int:
+    """Days from the epoch to the molad-based Rosh Hashanah of a year, before postponements for year length."""
+    months = (235 * year - 234) // 19
+    parts = 12084 + 13753 * months
+    day = 29 * months + parts // 25920
+    if (3 * (day + 1)) % 7 < 3:
+        day += 1
+    return day
+
+
+def new_year(year: int) -> int:
+    """Return the fixed day of 1 Tishrei of a Hebrew year."""
+    before, current, after = _elapsed_days(year - 1), _elapsed_days(year), _elapsed_days(year + 1)
+    if after - current == 356:
+        delay = 2
+    elif current - before == 382:
+        delay = 1
+    else:
+        delay = 0
+    return HEBREW_EPOCH + current + delay
+
+
+def weekday(fixed: int) -> int:
+    """Day of the week of a fixed day, with Sunday as 0."""
+    return fixed % 7
+
+
+def month_name(month: int, year: int, hebrew: bool = False) -> str:
+    """Return a month's name, distinguishing Adar I in leap years."""
+    names = ADAR_I_NAMES if month == ADAR and is_leap_year(year) else MONTH_NAMES[month]
+    return names[1] if hebrew else names[0]
+
+
+class HebrewYear:
+    """
+    Precomputed table for one Hebrew year.
+
+    Holds the start and length of each month, the holidays and the Shabbat
+    readings for Israel and the diaspora, all keyed by fixed day.
+    """
+
+    def __init__(self, year: int):
+        self.year = year
+        self.leap = is_leap_year(year)
+        self.start = new_year(year)
+        self.end = new_year(year + 1)
+        self.length = self.end - self.start
+
+        month_lengths = {
+            TISHREI: 30,
+            CHESHVAN: 30 if self.length % 10 == 5 else 29,
+            KISLEV: 29 if self.length % 10 == 3 else 30,
+            TEVET: 29, SHEVAT: 30, ADAR: 30 if self.leap else 29, ADAR_II: 29,
+            NISAN: 30, IYYAR: 29, SIVAN: 30, TAMMUZ: 29, AV: 30, ELUL: 29,
+        }
+        order = [TISHREI, CHESHVAN, KISLEV, TEVET, SHEVAT, ADAR] + ([ADAR_II] if self.leap else [])
+        order += [NISAN, IYYAR, SIVAN, TAMMUZ, AV, ELUL]
+        self.months: list[tuple[int, int, int]] = []
+        self.month_start: dict[int, int] = {}
+        fixed = self.start
+        for month in order:
+            self.months.append((month, fixed, month_lengths[month]))
+            self.month_start[month] = fixed
+            fixed += month_lengths[month]
+
+        self.holidays = {israel: self._holidays(israel) for israel in (False, True)}
+        self.readings = {israel: self._readings(israel) for israel in (False, True)}
+
+    def fixed(self, month: int, day: int) -> int:
+        """Return the fixed day of a day of this year (Adar means Adar II in a leap year)."""
+        if month == ADAR_II and not self.leap:
+            month = ADAR
+        if month not in self.month_start:
+            raise ValueError(f"Unknown month {month}")
+        length = next(length for m, _, length in self.months if m == month)
+        if not 1 <= day <= length:
+            raise ValueError(f"{month_name(month, self.year)} {self.year} has {length} days")
+        return self.month_start[month] + day - 1
+
+    def date_of(self, fixed: int) -> tuple[int, int, int]:
+        """Return (year, month, day) for a fixed day within this year."""
+        for month, start, length in self.months:
+            if fixed < start + length:
+                return self.year, month, fixed - start + 1
+        raise ValueError(f"Day {fixed} is not in {self.year}")
+
+    def _holidays(self, israel: bool) -> dict[int, list[dict]]:
+        """Build the holiday entries for Israel or the diaspora, keyed by fixed day."""
+        day = self.fixed
+        adar = ADAR_II if self.leap else ADAR
+        entries: list[tuple[int, str, str, str, dict]] = []
+
+        def add(fixed: int, name: str, he: str, category: str, **readings):
+            entries.append((fixed, name, he, category, readings))
+
+        # Tishrei
+        add(day(TISHREI, 1), "Rosh Hashanah I", "ראש השנה א׳", "major", ref="Genesis 21:1-34")
+        add(day(TISHREI, 2), "Rosh Hashanah II", "ראש השנה ב׳", "major", ref="Genesis 22:1-24")
+        gedaliah = day(TISHREI, 3)
+        add(gedaliah + (weekday(gedaliah) == SATURDAY), "Tzom Gedaliah", "צום גדליה", "fast")
+        add(day(TISHREI, 10), "Yom Kippur", "יום כפור", "major", ref="Leviticus 16:1-34")
+        festival_days = 1 if israel else 2
+        for offset in range(7):
+            fixed = day(TISHREI, 15) + offset
+            if offset < festival_days:
+                add(fixed, f"Sukkot {ROMAN[offset]}", f"סוכות {HEBREW_ORDINALS[offset]}", "major", ref="Leviticus 22:26-23:44")
+            elif offset == 6:
+                add(fixed, "Hoshana Raba", "הושענא רבה", "cholhamoed")
+            else:
+                add(fixed, f"Sukkot {ROMAN[offset]} (Chol HaMoed)", f"סוכות {HEBREW_ORDINALS[offset]} (חול המועד)", "cholhamoed")
+        if israel:
+            add(day(TISHREI, 22), "Shmini Atzeret / Simchat Torah", "שמיני עצרת / שמחת תורה", "major",
+                ref="Deuteronomy 33:1-34:12")
+        else:
+            add(day(TISHREI, 22), "Shmini Atzeret", "שמיני עצרת", "major", ref="Deuteronomy 14:22-16:17")
+            add(day(TISHREI, 23), "Simchat Torah", "שמחת תורה", "major", ref="Deuteronomy 33:1-34:12")
+
+        # Kislev to Adar
+        for offset in range(8):
+            add(day(KISLEV, 25) + offset, f"Chanukah {ROMAN[offset]}", f"חנוכה {HEBREW_ORDINALS[offset]}", "minor")
+        add(day(TEVET, 10), "Asara B'Tevet", "עשרה בטבת", "fast")
+        add(day(SHEVAT, 15), "Tu BiShvat", "ט״ו בשבט", "minor")
+        if self.leap:
+            add(day(ADAR, 14), "Purim Katan", "פורים קטן", "minor")
+        esther = day(adar, 13)
+        add(esther - 2 * (weekday(esther) == SATURDAY), "Ta'anit Esther", "תענית אסתר", "fast")
+        add(day(adar, 14), "Purim", "פורים", "minor", ref="Exodus 17:8-16", megillah="Esther 1:1-10:3")
+        add(day(adar, 15), "Shushan Purim", "שושן פורים", "minor")
+
+        # Nisan to Sivan
+        festival_days = 1 if israel else 2
+        last_day = 7 if israel else 8
+        for offset in range(last_day):
+            fixed = day(NISAN, 15) + offset
+            name, he = f"Pesach {ROMAN[offset]}", f"פסח {HEBREW_ORDINALS[offset]}"
+            if offset == 0:
+                add(fixed, name, he, "major", ref="Exodus 12:21-51")
+            elif offset < festival_days:
+                add(fixed, name, he, "major", ref="Leviticus 22:26-23:44")
+            elif offset == 6:
+                add(fixed, name, he, "major", ref="Exodus 13:17-15:26")
+            elif offset == 7:
+                start = "14:22" if weekday(fixed) == SATURDAY else "15:19"
+                add(fixed, name, he, "major", ref=f"Deuteronomy {start}-16:17")
+            else:
+                add(fixed, f"{name} (Chol HaMoed)", f"{he} (חול המועד)", "cholhamoed")
+        if self.year >= 5711:
+            shoah = day(NISAN, 27)
+            if weekday(shoah) == FRIDAY:
+                shoah -= 1
+            elif weekday(shoah) == SUNDAY and self.year >= 5757:
+                shoah += 1
+            add(shoah, "Yom HaShoah", "יום השואה", "modern")
+        if self.year >= 5708:
+            atzmaut = day(IYYAR, 5)
+            if weekday(atzmaut) == FRIDAY:
+                atzmaut -= 1
+            elif weekday(atzmaut) == SATURDAY:
+                atzmaut -= 2
+            elif weekday(atzmaut) == MONDAY and self.year >= 5764:
+                atzmaut += 1
+            add(atzmaut - 1, "Yom HaZikaron", "יום הזכרון", "modern")
+            add(atzmaut, "Yom HaAtzma'ut", "יום העצמאות", "modern")
+        add(day(IYYAR, 14), "Pesach Sheni", "פסח שני", "minor")
+        add(day(IYYAR, 18), "Lag BaOmer", "ל״ג בעומר", "minor")
+        if self.year >= 5728:
+            add(day(IYYAR, 28), "Yom Yerushalayim", "יום ירושלים", "modern")
+        add(day(SIVAN, 6), "Shavuot I", "שבועות א׳", "major", ref="Exodus 19:1-20:23")
+        if not israel:
+            second = day(SIVAN, 7)
+            start = "14:22" if weekday(second) == SATURDAY else "15:19"
+            add(second, "Shavuot II", "שבועות ב׳", "major", ref=f"Deuteronomy {start}-16:17")
+
+        # Tammuz and Av
+        tammuz = day(TAMMUZ, 17)
+        add(tammuz + (weekday(tammuz) == SATURDAY), "Tzom Tammuz", "צום תמוז", "fast")
+        tisha_bav = day(AV, 9)
+        if weekday(tisha_bav) == SATURDAY:
+            add(tisha_bav + 1, "Tish'a B'Av (observed)", "תשעה באב נדחה", "fast",
+                ref="Deuteronomy 4:25-40", megillah="Lamentations 1:1-5:22")
+        else:
+            add(tisha_bav, "Tish'a B'Av", "תשעה באב", "fast", ref="Deuteronomy 4:25-40", megillah="Lamentations 1:1-5:22")
+        add(day(AV, 15), "Tu B'Av", "ט״ו באב", "minor")
+
+        # Rosh Chodesh: the 30th of a full month and the 1st of the next
+        for (previous, start, length), (month, _, _) in zip(self.months, self.months[1:]):
+            name, he = month_name(month, self.year), month_name(month, self.year, hebrew=True)
+            if length == 30:
+                add(start + 29, f"Rosh Chodesh {name}", f"ראש חודש {he}", "roshchodesh")
+            add(start + length, f"Rosh Chodesh {name}", f"ראש חודש {he}", "roshchodesh")
+
+        holidays: dict[int, list[dict]] = {}
+        for fixed, name, he, category, readings in sorted(entries, key=lambda entry: entry[0]):
+            holidays.setdefault(fixed, []).append({"name": name, "he": he, "category": category, **readings})
+        return holidays
+
+    def _readings(self, israel: bool) -> dict[int, dict]:
+        """
+        Assign the weekly readings to this year's Shabbatot.
+
+        Festival Shabbatot take the festival reading. The free Shabbatot are
+        split into segments ending before Pesach, Shavuot (diaspora only),
+        on or before Tisha B'Av and before Rosh Hashanah, and within each
+        segment just enough pairs are doubled for the parshiyot to fit.
+        """
+        holidays = self.holidays[israel]
+        readings: dict[int, dict] = {}
+        free = []
+        first_shabbat = self.start + (SATURDAY - weekday(self.start)) % 7
+        for fixed in range(first_shabbat, self.end, 7):
+            festival = next((entry for entry in holidays.get(fixed, []) if entry["category"] in ("major", "cholhamoed")), None)
+            if festival is None:
+                free.append(fixed)
+            elif festival["category"] == "cholhamoed":
+                readings[fixed] = {"holiday": festival["name"], "he": festival["he"], "ref": SHABBAT_CHOL_HAMOED_READING}
+            else:
+                readings[fixed] = {"holiday": festival["name"], "he": festival["he"], "ref": festival["ref"]}
+
+        # Vayeilech is read on Shabbat Shuva when two Shabbatot precede Sukkot,
+        # otherwise together with Nitzavim at the end of the previous year
+        sukkot = self.fixed(TISHREI, 15)
+        before_sukkot = [fixed for fixed in free if fixed < sukkot]
+        for fixed, parsha in zip(before_sukkot, [VAYEILECH, HAAZINU][-len(before_sukkot):]):
+            readings[fixed] = self._parsha_entry((parsha,))
+        next_start = self.end
+        last = VAYEILECH if weekday(next_start) in (THURSDAY, SATURDAY) else NITZAVIM
+
+        pesach = self.fixed(NISAN, 15)
+        segments = [(pesach, METZORA if self.leap else TZAV, DOUBLED_BEFORE_PESACH)]
+        if israel:
+            segments.append((self.fixed(AV, 9) + 1, DEVARIM, DOUBLED_AFTER_PESACH_ISRAEL[self.leap]))
+        else:
+            segments.append((self.fixed(SIVAN, 6), BAMIDBAR, DOUBLED_BEFORE_SHAVUOT[self.leap]))
+            segments.append((self.fixed(AV, 9) + 1, DEVARIM, DOUBLED_BEFORE_TISHA_BAV))
+        segments.append((self.end, last, (NITZAVIM,)))
+
+        remaining = [fixed for fixed in free if fixed > sukkot]
+        first = 0
+        for boundary, last, pairs in segments:
+            slots = [fixed for fixed in remaining if fixed < boundary]
+            remaining = remaining[len(slots):]
+            for fixed, parshiyot in zip(slots, _fit(first, last, len(slots), pairs)):
+                readings[fixed] = self._parsha_entry(parshiyot)
+                first = parshiyot[-1] + 1
+        return readings
+
+    @staticmethod
+    def _parsha_entry(parshiyot: tuple) -> dict:
+        """Describe one Shabbat's parsha (or doubled parshiyot) with its Torah ref."""
+        first, last = PARSHIYOT[parshiyot[0]], PARSHIYOT[parshiyot[-1]]
+        ref = first[2]
+        if len(parshiyot) > 1:
+            ref = first[2].split("-")[0] + "-" + last[2].split("-")[1]
+        return {
+            "parsha": "-".join(PARSHIYOT[index][0] for index in parshiyot),
+            "he": "-".join(PARSHIYOT[index][1] for index in parshiyot),
+            "ref": ref,
+        }
+
+
+def _fit(first: int, last: int, slots: int, pairs: tuple) -> list[tuple]:
+    """
+    Group parshiyot from `first` into `slots` readings that end at `last`.
+
+    Pairs are doubled in the given order while there are too few slots;
+    with more slots than parshiyot, reading simply continues past `last`.
+    """
+    pairs = [pair for pair in pairs if first <= pair < last]
+    excess = last - first + 1 - slots
+    if excess > len(pairs):
+        raise ValueError(f"Cannot fit parshiyot {first}-{last} into {slots} Shabbatot")
+    doubled = set(pairs[:max(excess, 0)])
+    groups, index = [], first
+    while len(groups) < slots:
+        if index in doubled:
+            groups.append((index, index + 1))
+            index += 2
+        else:
+            groups.append((index,))
+            index += 1
+    return groups
+
+
+@lru_cache(maxsize=64)
+def hebrew_year(year: int) -> HebrewYear:
+    """Return the (cached) table for a Hebrew year."""
+    if year < 1:
+        raise ValueError(f"Hebrew year {year} is out of range")
+    return HebrewYear(year)
+
+
+def year_of(fixed: int) -> HebrewYear:
+    """Return the table of the Hebrew year containing a fixed day."""
+    year = date.fromordinal(fixed).year + 3761
+    table = hebrew_year(year)
+    return table if fixed >= table.start else hebrew_year(year - 1)
+
+
+def to_hebrew(day: date) -> tuple[int, int, int]:
+    """Convert a Gregorian date to a Hebrew (year, month, day)."""
+    fixed = day.toordinal()
+    return year_of(fixed).date_of(fixed)
+
+
+def to_gregorian(year: int, month: int, day: int) -> date:
+    """Convert a Hebrew date to a Gregorian date."""
+    return date.fromordinal(hebrew_year(year).fixed(month, day))
+
+
+def format_hebrew_date(year: int, month: int, day: int, hebrew: bool = False) -> str:
+    """Format a Hebrew date as "15 Nisan 5785" or "ט״ו ניסן תשפ״ה"."""
+    if hebrew:
+        return f"{to_hebrew_numeral(day)} {month_name(month, year, hebrew=True)} {to_hebrew_numeral(year % 1000)}"
+    return f"{day} {month_name(month, year)} {year}"
+
+
+def parse_date(text: Optional[str], today: Optional[date] = None) -> date:
+    """Parse an ISO Gregorian date; empty means today."""
+    if not text or str(text).strip().lower() == "today":
+        return today or date.today()
+    try:
+        return date.fromisoformat(str(text).strip())
+    except ValueError:
+        raise ValueError(f"Expected a Gregorian date as YYYY-MM-DD, got '{text}'") from None
+
+
+def _parse_number(token: str) -> int:
+    """Parse Arabic or Hebrew numerals."""
+    return int(token) if token.isdigit() else from_hebrew_numeral(token)
+
+
+def parse_hebrew_date(text: str) -> tuple[int, int, int]:
+    """Parse "15 Nisan 5785", "Adar II 14 5784" or "ט״ו ניסן תשפ״ה" into (year, month, day)."""
+    words = re.sub(r"[,.]", " ", text).split()
+    for length in (2, 1):
+        for position in range(len(words) - length + 1):
+            name = " ".join(words[position:position + length]).casefold().replace("׳", "")
+            month = MONTH_ALIASES.get(name) or MONTH_ALIASES.get(name.rstrip("'׳"))
+            if month is None:
+                continue
+            numbers = words[:position] + words[position + length:]
+            if len(numbers) != 2:
+                break
+            try:
+                day, year = _parse_number(numbers[0]), _parse_number(numbers[1])
+            except ValueError:
+                break
+            if year < 1000:
+                year += 5000
+            if month == ADAR and is_leap_year(year) and length == 1:
+                month = ADAR_II
+            return year, month, day
+    raise ValueError(f"Expected a Hebrew date like '15 Nisan 5785', got '{text}'")
+
+
+def _day_info(fixed: int) -> dict:
+    """Gregorian and Hebrew forms of a fixed day."""
+    year, month, day = year_of(fixed).date_of(fixed)
+    return {
+        "date": date.fromordinal(fixed).isoformat(),
+        "weekday": WEEKDAYS[weekday(fixed)],
+        "hebrew_date": format_hebrew_date(year, month, day),
+        "hebrew_date_he": format_hebrew_date(year, month, day, hebrew=True),
+    }
+
+
+def convert_date(gregorian: Optional[str] = None, hebrew: Optional[str] = None, after_sunset: bool = False,
+                 israel: bool = False, today: Optional[date] = None) -> dict:
+    """
+    Convert between Gregorian and Hebrew dates, with that day's holidays.
+
+    after_sunset moves a Gregorian date to the Hebrew day that began that
+    evening.
+    """
+    if hebrew:
+        fixed = to_gregorian(*parse_hebrew_date(hebrew)).toordinal()
+    else:
+        fixed = parse_date(gregorian, today).toordinal() + bool(after_sunset)
+    result = _day_info(fixed)
+    if after_sunset and not hebrew:
+        result["date"] = date.fromordinal(fixed - 1).isoformat()
+        result["weekday"] = WEEKDAYS[weekday(fixed - 1)]
+        result["note"] = "After sunset: the Hebrew date is that of the following day"
+    holidays = year_of(fixed).holidays[israel].get(fixed)
+    if holidays:
+        result["holidays"] = holidays
+    return result
+
+
+def holidays(start: Optional[str] = None, end: Optional[str] = None, year: Optional[int] = None,
+             israel: bool = False, categories: Optional[list[str]] = None, today: Optional[date] = None,
+             max_days: int = 400) -> dict:
+    """
+    List holidays in a Gregorian date range (default: the next 30 days) or a whole Hebrew year.
+    """
+    if year:
+        table = hebrew_year(int(year))
+        first, last = table.start, table.end - 1
+    else:
+        first = parse_date(start, today).toordinal()
+        last = parse_date(end, today).toordinal() if end else first + 29
+    if last < first:
+        raise ValueError("end is before start")
+    last = min(last, first + max_days - 1)
+    wanted = set(categories or HOLIDAY_CATEGORIES)
+
+    entries = []
+    fixed = first
+    while fixed <= last:
+        table = year_of(fixed)
+        for day in range(fixed, min(last, table.end - 1) + 1):
+            for holiday in table.holidays[israel].get(day, ()):
+                if holiday["category"] in wanted:
+                    year_, month, day_ = table.date_of(day)
+                    entries.append({"date": date.fromordinal(day).isoformat(),
+                                    "hebrew_date": format_hebrew_date(year_, month, day_), **holiday})
+        fixed = table.end
+    return {
+        "start": date.fromordinal(first).isoformat(),
+        "end": date.fromordinal(last).isoformat(),
+        "israel": israel,
+        "holidays": entries,
+    }
+
+
+def parsha(gregorian: Optional[str] = None, name: Optional[str] = None, israel: bool = False,
+           today: Optional[date] = None) -> dict:
+    """
+    Return the reading for the Shabbat on or after a date, or the next Shabbat a named parsha is read.
+    """
+    fixed = parse_date(gregorian, today).toordinal()
+    shabbat = fixed + (SATURDAY - weekday(fixed)) % 7
+    if name:
+        name = re.sub(r"^(parashat|parshat|parashas|parshas)\s+", "", name.strip(), flags=re.I)
+        index = PARSHA_INDEX.get(_parsha_key(name), PARSHA_INDEX.get(_parsha_key(name.split("-")[0])))
+        if index is None:
+            raise ValueError(f"Unknown parsha '{name}'")
+        wanted = PARSHIYOT[index][0]
+        table = year_of(shabbat)
+        for _ in range(3):
+            for day in sorted(table.readings[israel]):
+                reading = table.readings[israel][day]
+                if day >= shabbat and wanted in reading.get("parsha", "").split("-"):
+                    return {**_day_info(day), "israel": israel, **reading}
+            table = hebrew_year(table.year + 1)
+        # Only V'Zot HaBerachah, which is read on Simchat Torah, gets here
+        raise ValueError(f"{wanted} is not read on a Shabbat; see Simchat Torah in get_jewish_holidays")
+    reading = year_of(shabbat).readings[israel][shabbat]
+    return {**_day_info(shabbat), "israel": israel, **reading}
+
+
+@lru_cache(maxsize=2)
+def _daf_table(shekalim_dapim: int) -> list[tuple[int, int]]:
+    """Precompute (tractate index, daf) for each day of a Daf Yomi cycle."""
+    table = []
+    for index, (title, _, last_daf) in enumerate(DAF_YOMI_TRACTATES):
+        first = DAF_YOMI_FIRST_DAF.get(title, 2)
+        if title == "Shekalim":
+            last_daf = shekalim_dapim
+        table.extend((index, daf) for daf in range(first, last_daf + 1))
+    return table
+
+
+def daf_yomi(gregorian: Optional[str] = None, days: int = 1, today: Optional[date] = None) -> dict:
+    """Return the Daf Yomi for a date (and optionally the following days), with Sefaria refs."""
+    first = parse_date(gregorian, today).toordinal()
+    if first < DAF_YOMI_START:
+        raise ValueError("The Daf Yomi cycle began on 1923-09-11")
+    entries = []
+    for fixed in range(first, first + max(1, min(int(days), 31))):
+        if fixed >= DAF_YOMI_REVISED_START:
+            table = _daf_table(22)
+            cycle, position = divmod(fixed - DAF_YOMI_REVISED_START, len(table))
+            cycle += DAF_YOMI_REVISED_CYCLE
+        else:
+            table = _daf_table(13)
+            cycle, position = divmod(fixed - DAF_YOMI_START, len(table))
+            cycle += 1
+        index, daf = table[position]
+        title, he_title, _ = DAF_YOMI_TRACTATES[index]
+        entry = {
+            "date": date.fromordinal(fixed).isoformat(),
+            "cycle": cycle,
+            "daf": f"{title} {daf}",
+            "he": f"{he_title} {to_hebrew_numeral(daf)}",
+            "ref": f"{title} {daf}",
+        }
+        if title == "Shekalim":
+            # Daf Yomi studies the Jerusalem Talmud here, which Sefaria does not divide by Vilna daf
+            entry["ref"] = "Jerusalem Talmud Shekalim"
+            entry["note"] = "Shekalim is studied in the Jerusalem Talmud; the ref is the whole tractate"
+        entries.append(entry)
+    return entries[0] if len(entries) == 1 else {"days": entries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hebrew calendar: dates, holidays, parsha and Daf Yomi")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Convert a Gregorian (YYYY-MM-DD) or Hebrew date")
+    convert.add_argument("date")
+    convert.add_argument("--after-sunset", action="store_true")
+    convert.add_argument("--israel", action="store_true")
+
+    listing = subparsers.add_parser("holidays", help="List holidays")
+    listing.add_argument("--start")
+    listing.add_argument("--end")
+    listing.add_argument("--year", type=int, help="A whole Hebrew year")
+    listing.add_argument("--israel", action="store_true")
+    listing.add_argument("--categories", nargs="+", choices=HOLIDAY_CATEGORIES)
+
+    weekly = subparsers.add_parser("parsha", help="The parsha for the Shabbat on or after a date")
+    weekly.add_argument("--date")
+    weekly.add_argument("--name", help="Find the next Shabbat this parsha is read")
+    weekly.add_argument("--israel", action="store_true")
+
+    daf = subparsers.add_parser("daf", help="The Daf Yomi for a date")
+    daf.add_argument("--date")
+    daf.add_argument("--days", type=int, default=1)
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        if re.match(r"^\d{4}-\d{2}-\d{2}$", args.date):
+            result = convert_date(args.date, after_sunset=args.after_sunset, israel=args.israel)
+        else:
+            result = convert_date(hebrew=args.date, israel=args.israel)
+    elif args.command == "holidays":
+        result = holidays(args.start, args.end, args.year, args.israel, args.categories)
+    elif args.command == "parsha":
+        result = parsha(args.date, args.name, args.israel)
+    else:
+        result = daf_yomi(args.date, args.days)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
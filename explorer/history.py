@@ -0,0 +1,137 @@
+"""
+Context Window Manager
+Keeps per-session message history within a model's token budget
+"""
+
+from typing import Optional
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# Token budgets for the message history, leaving room for tools and the answer
+MODEL_TOKEN_BUDGETS = {
+    "anthropic/claude-sonnet-4": 150_000,
+    "anthropic/claude-3.5-haiku": 150_000,
+    "openai/gpt-4o": 100_000,
+    "openai/gpt-4o-mini": 100_000,
+}
+DEFAULT_TOKEN_BUDGET = 60_000
+
+# Prefix of the stub that replaces an elided tool result
+STUB_PREFIX = "[Earlier "
+
+# Fixed per-message overhead for role and framing tokens
+MESSAGE_OVERHEAD = 4
+
+
+def count_text_tokens(text: str) -> int:
+    """Count tokens locally with tiktoken, or estimate from the UTF-8 size."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    # Hebrew takes two bytes per letter and tokenizes densely, so bytes / 3
+    # is a closer estimate than characters / 4 for mixed text
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def count_message_tokens(message: dict) -> int:
+    """Count the tokens one chat message contributes to a request."""
+    tokens = MESSAGE_OVERHEAD + count_text_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += count_text_tokens(function.get("name", "")) + count_text_tokens(function.get("arguments", ""))
+    return tokens
+
+
+class ContextWindowManager:
+    """
+    Trims message history to a token budget.
+
+    The leading system prompt is always kept, and so is the current turn
+    (everything from the latest user message on). Older tool results are
+    replaced with short stubs first. If that is not enough, whole old turns
+    are dropped, so every tool result still follows its tool call.
+    """
+
+    def __init__(self, model: str, budget: Optional[int] = None):
+        self.model = model
+        self.budget = budget or MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+    def count(self, messages: list[dict]) -> int:
+        """Count the tokens of a whole message list."""
+        return sum(count_message_tokens(message) for message in messages)
+
+    def fit(self, messages: list[dict]) -> list[dict]:
+        """Return a copy of messages that fits the budget."""
+        messages = list(messages)
+        counts = [count_message_tokens(message) for message in messages]
+        total = sum(counts)
+        if total <= self.budget:
+            return messages
+
+        head = 1 if messages and messages[0].get("role") == "system" else 0
+        current_turn = self._last_user_index(messages, head)
+
+        # Pass 1: replace old tool results with stubs, oldest first
+        tool_names = self._tool_names(messages)
+        for index in range(head, current_turn):
+            if total <= self.budget:
+                return messages
+            message = messages[index]
+            content = message.get("content") or ""
+            if message.get("role") != "tool" or content.startswith(STUB_PREFIX):
+                continue
+            stub = dict(message)
+            stub["content"] = self._stub(tool_names.get(message.get("tool_call_id")), content)
+            messages[index] = stub
+            new_count = count_message_tokens(stub)
+            total += new_count - counts[index]
+            counts[index] = new_count
+
+        # Pass 2: drop whole old turns, oldest first
+        while total > self.budget and head < current_turn:
+            next_turn = self._next_user_index(messages, head + 1, current_turn)
+            total -= sum(counts[head:next_turn])
+            del messages[head:next_turn]
+            del counts[head:next_turn]
+            current_turn -= next_turn - head
+
+        return messages
+
+    @staticmethod
+    def _stub(tool_name: Optional[str], content: str) -> str:
+        """Describe an elided tool result."""
+        return (
+            f"{STUB_PREFIX}{tool_name or 'tool'} result removed to save context "
+            f"({len(content.encode('utf-8'))} bytes). Call the tool again if it is needed.]"
+        )
+
+    @staticmethod
+    def _tool_names(messages: list[dict]) -> dict:
+        """Map tool_call ids to tool names."""
+        names = {}
+        for message in messages:
+            for tool_call in message.get("tool_calls") or []:
+                names[tool_call.get("id")] = tool_call.get("function", {}).get("name")
+        return names
+
+    @staticmethod
+    def _last_user_index(messages: list[dict], head: int) -> int:
+        """Index of the latest user message, or head if there is none."""
+        for index in range(len(messages) - 1, head - 1, -1):
+            if messages[index].get("role") == "user":
+                return index
+        return head
+
+    @staticmethod
+    def _next_user_index(messages: list[dict], start: int, limit: int) -> int:
+        """Index of the first user message at or after start, capped at limit."""
+        for index in range(start, limit):
+            if messages[index].get("role") == "user":
+                return index
+        return limit
+
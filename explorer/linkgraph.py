@@ -0,0 +1,407 @@
+"""
+Local Link Graph
+Compact, memory-mapped graph of Sefaria's links built from the Sefaria-Export dump
+
+Every distinct ref is interned to an integer ID (IDs follow the UTF-8 sort
+order of the refs, so a ref is found by binary search). Links are stored
+in CSR form: the neighbours of node i are targets[offsets[i]:offsets[i + 1]].
+
+Layout of a graph directory:
+    manifest.json    books (title, category, commentator), link types, counts
+    refs.bin         UTF-8 refs of every node, concatenated in ID order
+    ref_offsets.bin  uint64 start of each ref in refs.bin (nodes + 1 entries)
+    node_books.bin   uint32 book of each node
+    offsets.bin      uint64 start of each node's edges (nodes + 1 entries)
+    targets.bin      uint32 neighbour of each edge
+    types.bin        uint8 link type of each edge
+
+Usage:
+    python -m explorer.linkgraph build <Sefaria-Export dir> <graph dir>
+    python -m explorer.linkgraph links <graph dir> "Genesis 1:1"
+    python -m explorer.linkgraph path <graph dir> "Genesis 1:1" "Shabbat 88a" [--max-hops 3]
+"""
+
+import argparse
+import csv
+import json
+import mmap
+from array import array
+from bisect import bisect_left
+from collections import deque
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .refs import split_ref, parse_range, format_address
+
+# Ranges longer than this are linked through their first segment only
+MAX_RANGE_SEGMENTS = 200
+
+# Upper bounds for traversal requests
+MAX_HOPS = 4
+MAX_VISITED = 200_000
+
+CSV_COLUMNS = {
+    "Citation 1": "ref1", "Citation 2": "ref2",
+    "Conection Type": "type", "Connection Type": "type",
+    "Text 1": "text1", "Text 2": "text2",
+    "Category 1": "category1", "Category 2": "category2",
+}
+
+
+def expand_ref(ref: str) -> list[str]:
+    """
+    Split a ref into the segment refs it covers.
+
+    Ranges within one section ("Genesis 1:1-3", "Berakhot 2a-2b") are
+    expanded; anything else is returned as is.
+    """
+    title, start, end = split_ref(ref)
+    if start is None:
+        return [ref]
+    address_types = ["Talmud" if token[-1:] in ("a", "b") else "Integer" for token in start.replace(".", ":").split(":")]
+    try:
+        sections, to_sections = parse_range(start, end, address_types)
+    except ValueError:
+        return [ref]
+    if end is None or len(sections) != len(to_sections) or sections[:-1] != to_sections[:-1]:
+        return [f"{title} {format_address(sections, address_types)}"]
+    last = range(sections[-1], min(to_sections[-1], sections[-1] + MAX_RANGE_SEGMENTS - 1) + 1)
+    return [f"{title} {format_address(sections[:-1] + [section], address_types)}" for section in last]
+
+
+def _read_links(export_dir: Path) -> Iterator[dict]:
+    """Yield rows of every links CSV in the export, with normalized column names."""
+    for path in sorted((export_dir / "links").glob("*.csv")):
+        with open(path, encoding="utf-8", newline="") as file:
+            for row in csv.DictReader(file):
+                yield {CSV_COLUMNS[key]: value for key, value in row.items() if key in CSV_COLUMNS}
+
+
+def _write(path: Path, values: array):
+    """Write a typed array to a file."""
+    with open(path, "wb") as file:
+        values.tofile(file)
+
+
+def build_graph(export_dir: Path, graph_dir: Path) -> dict:
+    """
+    Build a link graph from the links/*.csv files of a Sefaria-Export checkout.
+
+    Links are undirected, so each is stored in both directions. Range
+    citations are expanded to their segments and linked to the first
+    segment of the other side. Returns build statistics.
+    """
+    export_dir, graph_dir = Path(export_dir), Path(graph_dir)
+    graph_dir.mkdir(parents=True, exist_ok=True)
+
+    books: list[dict] = []
+    book_ids: dict[str, int] = {}
+    types: list[str] = []
+    type_ids: dict[str, int] = {}
+    ref_ids: dict[str, int] = {}
+    ref_books = array("I")
+    sources, destinations, edge_types = array("I"), array("I"), array("B")
+    stats = {"links": 0, "skipped": 0}
+
+    def book_id(title: str, category: str) -> int:
+        if title not in book_ids:
+            book_ids[title] = len(books)
+            commentator = title.split(" on ")[0] if category == "Commentary" and " on " in title else ""
+            books.append({"title": title, "category": category, "commentator": commentator})
+        return book_ids[title]
+
+    def node_ids(ref: str, book: int) -> list[int]:
+        ids = []
+        for segment in expand_ref(ref):
+            if segment not in ref_ids:
+                ref_ids[segment] = len(ref_books)
+                ref_books.append(book)
+            ids.append(ref_ids[segment])
+        return ids
+
+    for row in _read_links(export_dir):
+        if not row.get("ref1") or not row.get("ref2"):
+            stats["skipped"] += 1
+            continue
+        link_type = (row.get("type") or "").strip().lower()
+        if link_type not in type_ids:
+            if len(types) < 256:
+                type_ids[link_type] = len(types)
+                types.append(link_type)
+            else:
+                type_ids[link_type] = type_ids.get("", 0)
+        first = node_ids(row["ref1"], book_id(row.get("text1") or split_ref(row["ref1"])[0], row.get("category1", "")))
+        second = node_ids(row["ref2"], book_id(row.get("text2") or split_ref(row["ref2"])[0], row.get("category2", "")))
+        for source, destination in [(node, second[0]) for node in first] + [(node, first[0]) for node in second]:
+            if source != destination:
+                for a, b in ((source, destination), (destination, source)):
+                    sources.append(a)
+                    destinations.append(b)
+                    edge_types.append(type_ids[link_type])
+        stats["links"] += 1
+
+    # Renumber nodes in byte order of their refs so lookups can binary search
+    refs = sorted(ref_ids, key=lambda ref: ref.encode("utf-8"))
+    new_ids = array("I", bytes(4 * len(refs)))
+    for new_id, ref in enumerate(refs):
+        new_ids[ref_ids[ref]] = new_id
+    node_count = len(refs)
+
+    # Sort and deduplicate edges by (source, target, type)
+    keys = sorted({
+        (new_ids[source] * node_count + new_ids[destination]) * 256 + edge_type
+        for source, destination, edge_type in zip(sources, destinations, edge_types)
+    })
+    offsets, targets, target_types = array("Q", [0] * (node_count + 1)), array("I"), array("B")
+    for key in keys:
+        pair, edge_type = divmod(key, 256)
+        source, destination = divmod(pair, node_count)
+        offsets[source + 1] += 1
+        targets.append(destination)
+        target_types.append(edge_type)
+    for node in range(node_count):
+        offsets[node + 1] += offsets[node]
+
+    ref_offsets, node_books = array("Q", [0]), array("I", bytes(4 * node_count))
+    with open(graph_dir / "refs.bin", "wb") as refs_file:
+        for old_id, ref in enumerate(ref_ids):
+            node_books[new_ids[old_id]] = ref_books[old_id]
+        for ref in refs:
+            encoded = ref.encode("utf-8")
+            refs_file.write(encoded)
+            ref_offsets.append(ref_offsets[-1] + len(encoded))
+    _write(graph_dir / "ref_offsets.bin", ref_offsets)
+    _write(graph_dir / "node_books.bin", node_books)
+    _write(graph_dir / "offsets.bin", offsets)
+    _write(graph_dir / "targets.bin", targets)
+    _write(graph_dir / "types.bin", target_types)
+
+    stats.update({"nodes": node_count, "edges": len(targets), "books": len(books), "types": len(types)})
+    manifest = {"format": 1, "books": books, "types": types, "nodes": node_count, "edges": len(targets)}
+    (graph_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    return stats
+
+
+class LinkGraph:
+    """
+    Read-only view of a built link graph.
+
+    All arrays are memory-mapped and read through typed memoryviews, so
+    opening the graph is cheap and traversal allocates only its frontier.
+    """
+
+    def __init__(self, graph_dir: Path):
+        graph_dir = Path(graph_dir)
+        manifest = json.loads((graph_dir / "manifest.json").read_text(encoding="utf-8"))
+        self.books: list[dict] = manifest["books"]
+        self.types: list[str] = manifest["types"]
+        self.node_count: int = manifest["nodes"]
+        self._files = []
+        self._refs = self._map(graph_dir / "refs.bin", "B")
+        self._ref_offsets = self._map(graph_dir / "ref_offsets.bin", "Q")
+        self._node_books = self._map(graph_dir / "node_books.bin", "I")
+        self._offsets = self._map(graph_dir / "offsets.bin", "Q")
+        self._targets = self._map(graph_dir / "targets.bin", "I")
+        self._types = self._map(graph_dir / "types.bin", "B")
+
+    def _map(self, path: Path, fmt: str) -> memoryview:
+        """Memory-map a file read-only as a typed array."""
+        if path.stat().st_size == 0:
+            return memoryview(b"").cast(fmt)
+        file = open(path, "rb")
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files.append((file, mapped))
+        return memoryview(mapped).cast(fmt)
+
+    def ref(self, node: int) -> str:
+        """Return the ref of a node."""
+        return bytes(self._refs[self._ref_offsets[node]:self._ref_offsets[node + 1]]).decode("utf-8")
+
+    def book(self, node: int) -> dict:
+        """Return the book record of a node."""
+        return self.books[self._node_books[node]]
+
+    def _lower_bound(self, key: bytes) -> int:
+        """Index of the first node whose ref is >= key."""
+        return bisect_left(range(self.node_count), key, key=lambda node: bytes(
+            self._refs[self._ref_offsets[node]:self._ref_offsets[node + 1]]
+        ))
+
+    def lookup(self, ref: str) -> list[int]:
+        """Return the nodes of a ref: its segments and everything nested below them."""
+        nodes = []
+        for segment in expand_ref(ref):
+            key = segment.encode("utf-8")
+            node = self._lower_bound(key)
+            if node < self.node_count and self.ref(node) == segment:
+                nodes.append(node)
+            # Descendants ("Genesis 1:" under "Genesis 1") sort right after the prefix
+            prefix = segment + ":"
+            node = self._lower_bound(prefix.encode("utf-8"))
+            while node < self.node_count and self.ref(node).startswith(prefix):
+                nodes.append(node)
+                node += 1
+        return list(dict.fromkeys(nodes))
+
+    def neighbours(self, node: int) -> Iterator[tuple[int, int]]:
+        """Yield (neighbour, link type id) for every edge of a node."""
+        for edge in range(self._offsets[node], self._offsets[node + 1]):
+            yield self._targets[edge], self._types[edge]
+
+    def _type_filter(self, link_types: Optional[list[str]]) -> Optional[set[int]]:
+        """Map link type names to ids (None means any type)."""
+        if not link_types:
+            return None
+        wanted = {link_type.lower() for link_type in link_types}
+        return {type_id for type_id, name in enumerate(self.types) if name in wanted}
+
+    def _allowed(self, node: int, categories: Optional[set[str]]) -> bool:
+        """Check a node's book category against a category filter."""
+        return not categories or self.book(node)["category"] in categories
+
+    def _describe(self, node: int) -> dict:
+        """Describe a node as a ref with its category and commentator."""
+        book = self.book(node)
+        described = {"ref": self.ref(node), "category": book["category"]}
+        if book["commentator"]:
+            described["commentator"] = book["commentator"]
+        return described
+
+    def links(self, ref: str, link_types: Optional[list[str]] = None,
+              categories: Optional[list[str]] = None) -> Optional[list[dict]]:
+        """
+        Return the direct links of a ref in the projected get_links_between_texts shape.
+
+        Returns None when the ref is not in the graph, so callers can fall back.
+        """
+        nodes = self.lookup(ref)
+        if not nodes:
+            return None
+        type_ids = self._type_filter(link_types)
+        category_set = set(categories) if categories else None
+        links, seen = [], set()
+        for node in nodes:
+            anchor = self.ref(node)
+            for target, type_id in self.neighbours(node):
+                if target in seen or (type_ids is not None and type_id not in type_ids):
+                    continue
+                if not self._allowed(target, category_set):
+                    continue
+                seen.add(target)
+                link = self._describe(target)
+                link.update({"anchorRef": anchor, "type": self.types[type_id]})
+                links.append(link)
+        return links
+
+    def find_paths(self, source: str, target: Optional[str] = None, max_hops: int = 3,
+                   link_types: Optional[list[str]] = None, categories: Optional[list[str]] = None,
+                   max_paths: int = 5, limit: int = 50) -> Optional[dict]:
+        """
+        Breadth-first traversal from a ref.
+
+        With a target, returns up to max_paths shortest paths of at most
+        max_hops links. Without one, returns the refs reachable within
+        max_hops, nearest first. The category filter applies to every ref
+        on the way except the target. Returns None when the source ref is
+        not in the graph.
+        """
+        sources = self.lookup(source)
+        if not sources:
+            return None
+        max_hops = max(1, min(int(max_hops), MAX_HOPS))
+        type_ids = self._type_filter(link_types)
+        category_set = set(categories) if categories else None
+        targets = set(self.lookup(target)) if target else set()
+        if target and not targets:
+            return {"from": source, "to": target, "error": "Target ref has no links in the local graph"}
+
+        parents: dict[int, tuple[int, int]] = {node: (-1, -1) for node in sources}
+        distances = {node: 0 for node in sources}
+        frontier = deque(sources)
+        found, reachable = [], []
+        while frontier and len(parents) < MAX_VISITED:
+            node = frontier.popleft()
+            depth = distances[node]
+            if depth >= max_hops or (found and depth >= distances[found[0]]):
+                continue
+            for neighbour, type_id in self.neighbours(node):
+                if neighbour in parents or (type_ids is not None and type_id not in type_ids):
+                    continue
+                is_target = neighbour in targets
+                if not is_target and not self._allowed(neighbour, category_set):
+                    continue
+                parents[neighbour] = (node, type_id)
+                distances[neighbour] = depth + 1
+                if is_target:
+                    found.append(neighbour)
+                elif target is None:
+                    reachable.append(neighbour)
+                frontier.append(neighbour)
+            if target is None and len(reachable) >= limit:
+                break
+            if len(found) >= max_paths:
+                break
+
+        if target is None:
+            return {
+                "from": source,
+                "max_hops": max_hops,
+                "reachable": [{**self._describe(node), "hops": distances[node]} for node in reachable[:limit]],
+            }
+        paths = []
+        for node in found[:max_paths]:
+            refs, link_types_on_path = [], []
+            while node != -1:
+                parent, type_id = parents[node]
+                refs.append(self.ref(node))
+                if parent != -1:
+                    link_types_on_path.append(self.types[type_id])
+                node = parent
+            paths.append({"refs": refs[::-1], "types": link_types_on_path[::-1], "hops": len(refs) - 1})
+        return {"from": source, "to": target, "max_hops": max_hops, "paths": paths}
+
+    def close(self):
+        """Release the memory maps."""
+        for view in (self._refs, self._ref_offsets, self._node_books, self._offsets, self._targets, self._types):
+            view.release()
+        for file, mapped in self._files:
+            mapped.close()
+            file.close()
+        self._files = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local Sefaria link graph")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Ingest the links of a Sefaria-Export checkout")
+    build.add_argument("export_dir", type=Path)
+    build.add_argument("graph_dir", type=Path)
+
+    links = subparsers.add_parser("links", help="List the direct links of a ref")
+    links.add_argument("graph_dir", type=Path)
+    links.add_argument("reference")
+
+    path = subparsers.add_parser("path", help="Find connections from a ref")
+    path.add_argument("graph_dir", type=Path)
+    path.add_argument("source")
+    path.add_argument("target", nargs="?")
+    path.add_argument("--max-hops", type=int, default=3)
+    path.add_argument("--types", nargs="+")
+    path.add_argument("--categories", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        print(json.dumps(build_graph(args.export_dir, args.graph_dir), indent=2))
+        return
+    graph = LinkGraph(args.graph_dir)
+    if args.command == "links":
+        result = graph.links(args.reference)
+    else:
+        result = graph.find_paths(args.source, args.target, args.max_hops, args.types, args.categories)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    graph.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+MCP Client
+Long-lived MCP session over the SSE transport, multiplexing concurrent tool calls
+
+The session itself is the mcp SDK's SSE transport and ClientSession: the
+SDK performs the initialize handshake, matches responses to requests by id
+so any number of tool calls share the one stream, and answers server
+pings. This module keeps that session alive in a background task, caches
+the server's tool list, fails pending calls fast when the stream drops and
+re-establishes the session with jittered exponential backoff.
+"""
+
+import asyncio
+import random
+from datetime import timedelta
+from typing import Optional
+
+import anyio
+from mcp import ClientSession, McpError
+from mcp.client.sse import sse_client
+from mcp.types import Implementation
+
+CLIENT_INFO = Implementation(name="sefaria-explorer", version="0.1")
+
+
+class MCPError(Exception):
+    """An error result from the server, or a session that is not available."""
+
+
+def mcp_tool_to_openai(tool: dict) -> dict:
+    """Convert an MCP tool description to an OpenAI function tool."""
+    return {
+        "type": "function",
+        "function": {
+            "name": tool["name"],
+            "description": tool.get("description", ""),
+            "parameters": tool.get("inputSchema") or {"type": "object", "properties": {}},
+        },
+    }
+
+
+def result_text(result: dict) -> str:
+    """Join the text items of a tools/call result."""
+    return "\n".join(
+        item.get("text", "") for item in result.get("content", []) if item.get("type") == "text"
+    )
+
+
+class MCPClient:
+    """
+    Persistent MCP session to one server.
+
+    start() launches a background task that keeps the session alive;
+    call_tool() raises MCPError while it is not ready, so callers can fall
+    back to another path.
+    """
+
+    def __init__(self, url: str, request_timeout: float = 30.0, backoff_min: float = 0.5, backoff_max: float = 30.0):
+        self.url = url
+        self.request_timeout = request_timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+        self.tools: list[dict] = []
+        self.server_info: dict = {}
+        self._session: Optional[ClientSession] = None
+        self._calls: set[asyncio.Task] = set()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"connects": 0, "disconnects": 0, "calls": 0, "errors": 0}
+
+    @property
+    def connected(self) -> bool:
+        """True once the handshake has completed on the current stream."""
+        return self._ready.is_set()
+
+    def start(self):
+        """Start maintaining the session in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for the session; returns whether it is ready."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.connected
+
+    async def _run(self):
+        """Connect, serve the stream until it drops, and reconnect with backoff."""
+        delay = self.backoff_min
+        while True:
+            try:
+                await self._connect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"MCP session to {self.url} failed: {e}")
+            if self.connected:
+                delay = self.backoff_min
+            self._disconnect()
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, self.backoff_max)
+
+    async def _connect(self):
+        """Open one SSE session, initialize it and hold it until the stream ends."""
+        async with sse_client(self.url, timeout=self.request_timeout, sse_read_timeout=None) as (read_stream, write_stream):
+            # The server's messages pass through a relay so the end of the stream is noticed here
+            relay_writer, relay_reader = anyio.create_memory_object_stream(0)
+            relay = asyncio.create_task(self._relay(read_stream, relay_writer))
+            try:
+                async with ClientSession(
+                    relay_reader, write_stream, timedelta(seconds=self.request_timeout), client_info=CLIENT_INFO
+                ) as session:
+                    initialized = await session.initialize()
+                    self.server_info = initialized.serverInfo.model_dump(exclude_none=True)
+                    tools, cursor = [], None
+                    while True:
+                        listed = await session.list_tools(cursor)
+                        tools += [tool.model_dump(by_alias=True, exclude_none=True) for tool in listed.tools]
+                        cursor = listed.nextCursor
+                        if not cursor:
+                            break
+                    self.tools = tools
+                    self._session = session
+                    self.counters["connects"] += 1
+                    self._ready.set()
+                    await relay
+                    # Fail calls still waiting while the session can no longer answer them
+                    self._disconnect()
+            finally:
+                if not relay.done():
+                    relay.cancel()
+                await asyncio.gather(relay, return_exceptions=True)
+
+    @staticmethod
+    async def _relay(source, sink):
+        """Forward server messages to the session until the stream ends."""
+        async with sink:
+            async for message in source:
+                await sink.send(message)
+
+    def _disconnect(self):
+        """Mark the session down and fail every pending call."""
+        if self.connected:
+            self.counters["disconnects"] += 1
+        self._ready.clear()
+        self._session = None
+        for call in self._calls:
+            call.cancel()
+
+    async def call_tool(self, name: str, arguments: dict, timeout: Optional[float] = None) -> tuple[str, bool]:
+        """Call a server tool and return (text, is_error)."""
+        self.counters["calls"] += 1
+        if self._session is None:
+            self.counters["errors"] += 1
+            raise MCPError("MCP session not connected")
+        call = asyncio.create_task(self._session.call_tool(
+            name, arguments, read_timeout_seconds=timedelta(seconds=timeout or self.request_timeout)
+        ))
+        self._calls.add(call)
+        try:
+            await asyncio.wait({call})
+        finally:
+            self._calls.discard(call)
+            call.cancel()
+        try:
+            if call.cancelled():
+                raise MCPError("MCP session closed")
+            result = call.result().model_dump(by_alias=True, exclude_none=True)
+        except McpError as e:
+            self.counters["errors"] += 1
+            raise MCPError(e.error.message) from e
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        return result_text(result), bool(result.get("isError"))
+
+    def stats(self) -> dict:
+        """Return connection state and counters."""
+        return {"connected": self.connected, "tools": len(self.tools), "pending": len(self._calls), **self.counters}
+
+    async def close(self):
+        """Stop the session."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._disconnect()
@@ -0,0 +1,251 @@
+"""
+Speculative Prefetch
+Warms the tool cache with the lookups that usually follow a get_text, get_links_between_texts or calendar lookup
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from .cache import make_cache_key
+from .refs import RefResolver
+
+# Priorities: lower runs first
+PRIORITY_NEIGHBOR = 0
+PRIORITY_LINKS = 1
+PRIORITY_COMMENTARY = 2
+
+# Categories whose segments have a Rashi commentary worth warming
+RASHI_CATEGORIES = ("Tanakh", "Talmud")
+
+# Calendar tools whose result carries the ref the model reads next
+CALENDAR_REF_TOOLS = ("get_parsha", "get_daf_yomi")
+
+# How many prefetched keys are remembered for hit accounting
+TRACKED_KEYS = 10_000
+
+# How many ended sessions are remembered so their queued entries are skipped
+TRACKED_SESSIONS = 1_000
+
+
+def plan_prefetch(resolver: RefResolver, tool_name: str, arguments: dict, result: str,
+                  max_commentaries: int = 3) -> list[tuple[int, str, dict]]:
+    """
+    Predict the next lookups after a tool call.
+
+    After get_text: the neighbouring segments, the links of the ref and, for
+    Tanakh and Talmud, Rashi on it. After get_links_between_texts: the first
+    linked segment of the most-cited commentaries. After get_parsha or
+    get_daf_yomi: the text of the returned ref.
+    Returns (priority, tool name, arguments) tuples.
+    """
+    plans = []
+    if result.startswith('{"error"'):
+        return plans
+    if tool_name == "get_text":
+        resolved = resolver.resolve(arguments.get("reference", ""))
+        if resolved is None or not resolved["sections"] or resolved["sections"] != resolved["toSections"]:
+            return plans
+        book, sections = resolved["book"], resolved["sections"]
+        version = {"version_language": arguments["version_language"]} if arguments.get("version_language") else {}
+        following = sections[:-1] + [sections[-1] + 1]
+        plans.append((PRIORITY_NEIGHBOR, "get_text", {"reference": resolver.format_ref(book, following), **version}))
+        address_types = resolver.books.get(book, {}).get("addressTypes", [])
+        first = 3 if address_types[len(sections) - 1:len(sections)] == ["Talmud"] else 1
+        if sections[-1] > first:
+            previous = sections[:-1] + [sections[-1] - 1]
+            plans.append((PRIORITY_NEIGHBOR, "get_text", {"reference": resolver.format_ref(book, previous), **version}))
+        plans.append((PRIORITY_LINKS, "get_links_between_texts", {"reference": resolved["ref"]}))
+        if any(category in RASHI_CATEGORIES for category in resolver.categories(book)):
+            plans.append((PRIORITY_COMMENTARY, "get_text", {"reference": f"Rashi on {resolved['ref']}", **version}))
+
+    elif tool_name == "get_links_between_texts":
+        try:
+            links = json.loads(result)
+        except ValueError:
+            return plans
+        if not isinstance(links, list):
+            return plans
+        first_ref: dict[str, str] = {}
+        counts: Counter = Counter()
+        for link in links:
+            if not isinstance(link, dict) or link.get("category") != "Commentary" or not link.get("ref"):
+                continue
+            commentator = link.get("commentator") or link.get("ref").split(" on ")[0]
+            counts[commentator] += 1
+            first_ref.setdefault(commentator, link["ref"])
+        for commentator, _ in counts.most_common(max_commentaries):
+            plans.append((PRIORITY_COMMENTARY, "get_text", {"reference": first_ref[commentator]}))
+
+    elif tool_name in CALENDAR_REF_TOOLS:
+        try:
+            data = json.loads(result)
+        except ValueError:
+            return plans
+        entry = data["days"][0] if isinstance(data, dict) and data.get("days") else data
+        if isinstance(entry, dict) and entry.get("ref") and "note" not in entry:
+            plans.append((PRIORITY_NEIGHBOR, "get_text", {"reference": entry["ref"]}))
+    return plans
+
+
+class Prefetcher:
+    """
+    Low-priority background prefetcher.
+
+    Predicted lookups go into a priority queue and are fetched by a few
+    workers, but only while no live tool call is running. Each session has
+    its own budget, and there is a global per-minute budget. Queued and
+    running prefetches for a session are dropped when it ends.
+    """
+
+    def __init__(self, resolver: RefResolver, fetch: Callable[[str, dict], Awaitable[Optional[str]]],
+                 is_cached: Callable[[str, dict], bool], workers: int = 2, session_budget: int = 30,
+                 global_budget_per_minute: int = 120, max_queue: int = 500, max_commentaries: int = 3):
+        self.resolver = resolver
+        self.fetch = fetch
+        self.is_cached = is_cached
+        self.worker_count = workers
+        self.session_budget = session_budget
+        self.global_budget_per_minute = global_budget_per_minute
+        self.max_queue = max_queue
+        self.max_commentaries = max_commentaries
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: list[asyncio.Task] = []
+        self._sequence = itertools.count()
+        self._session_used: dict[str, int] = {}
+        self._cancelled: OrderedDict = OrderedDict()
+        self._running: dict[str, set[asyncio.Task]] = {}
+        self._window_start = time.monotonic()
+        self._window_used = 0
+        self._live = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._prefetched: OrderedDict = OrderedDict()
+        self.counters = {
+            "scheduled": 0, "fetched": 0, "already_cached": 0, "failed": 0,
+            "dropped_budget": 0, "dropped_queue_full": 0, "cancelled": 0, "hits": 0,
+        }
+
+    def _ensure_started(self):
+        """Create the queue and workers on first use, inside the running loop."""
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._idle = asyncio.Event()
+            self._idle.set()
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    def live_started(self):
+        """Mark a live tool call as running; prefetch workers pause."""
+        self._live += 1
+        if self._idle is not None:
+            self._idle.clear()
+
+    def live_finished(self):
+        """Mark a live tool call as finished."""
+        self._live = max(0, self._live - 1)
+        if self._live == 0 and self._idle is not None:
+            self._idle.set()
+
+    def schedule(self, session_id: str, tool_name: str, arguments: dict, result: str):
+        """Queue the predicted follow-up lookups of a completed tool call."""
+        self._ensure_started()
+        self._cancelled.pop(session_id, None)
+        for priority, planned_tool, planned_arguments in plan_prefetch(
+                self.resolver, tool_name, arguments, result, self.max_commentaries):
+            if self.is_cached(planned_tool, planned_arguments):
+                continue
+            if self._session_used.get(session_id, 0) >= self.session_budget:
+                self.counters["dropped_budget"] += 1
+                continue
+            if self._queue.qsize() >= self.max_queue:
+                self.counters["dropped_queue_full"] += 1
+                continue
+            self._session_used[session_id] = self._session_used.get(session_id, 0) + 1
+            self._queue.put_nowait((priority, next(self._sequence), session_id, planned_tool, planned_arguments))
+            self.counters["scheduled"] += 1
+
+    def cancel_session(self, session_id: str):
+        """Drop a session's queued prefetches and cancel its running ones."""
+        self._cancelled[session_id] = True
+        while len(self._cancelled) > TRACKED_SESSIONS:
+            self._cancelled.popitem(last=False)
+        self._session_used.pop(session_id, None)
+        for task in self._running.pop(session_id, set()):
+            task.cancel()
+
+    def _take_global_budget(self) -> bool:
+        """Consume one unit of the global per-minute budget if available."""
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start, self._window_used = now, 0
+        if self._window_used >= self.global_budget_per_minute:
+            return False
+        self._window_used += 1
+        return True
+
+    async def _worker(self):
+        """Fetch queued lookups whenever no live request is running."""
+        while True:
+            _, _, session_id, tool_name, arguments = await self._queue.get()
+            try:
+                if session_id in self._cancelled:
+                    self.counters["cancelled"] += 1
+                    continue
+                await self._idle.wait()
+                if self.is_cached(tool_name, arguments):
+                    self.counters["already_cached"] += 1
+                    continue
+                if not self._take_global_budget():
+                    self.counters["dropped_budget"] += 1
+                    continue
+
+                task = asyncio.create_task(self.fetch(tool_name, arguments))
+                self._running.setdefault(session_id, set()).add(task)
+                try:
+                    result = await task
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        raise
+                    self.counters["cancelled"] += 1
+                    continue
+                except Exception:
+                    self.counters["failed"] += 1
+                    continue
+                finally:
+                    self._running.get(session_id, set()).discard(task)
+
+                if result is None:
+                    self.counters["failed"] += 1
+                    continue
+                self.counters["fetched"] += 1
+                self._prefetched[make_cache_key(tool_name, arguments)] = True
+                while len(self._prefetched) > TRACKED_KEYS:
+                    self._prefetched.popitem(last=False)
+            finally:
+                self._queue.task_done()
+
+    def record_hit(self, tool_name: str, arguments: dict):
+        """Count a live cache hit on an entry that was prefetched."""
+        key = make_cache_key(tool_name, arguments)
+        if self._prefetched.pop(key, None):
+            self.counters["hits"] += 1
+
+    def stats(self) -> dict:
+        """Return prefetch counters and the fraction of fetched entries later used."""
+        fetched = self.counters["fetched"]
+        return {
+            **self.counters,
+            "hit_rate": self.counters["hits"] / fetched if fetched else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def close(self):
+        """Stop the workers."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
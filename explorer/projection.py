@@ -0,0 +1,278 @@
+"""
+Tool Result Projection
+Trims raw Sefaria API responses down to the fields the model needs and caps their size
+"""
+
+import json
+from typing import Any, Callable, Optional
+
+# Marker key added to lists that were shortened to fit the size cap
+TRUNCATION_KEY = "_truncated"
+
+
+def dumps_compact(value: Any) -> str:
+    """Serialize to compact JSON, keeping Hebrew readable."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _pick(source: dict, fields: tuple) -> dict:
+    """Return the listed fields of source that are present and not empty."""
+    return {field: source[field] for field in fields if source.get(field) not in (None, "", [], {})}
+
+
+def project_text(data: Any) -> Any:
+    """Keep ref metadata and the text of each returned version."""
+    if not isinstance(data, dict):
+        return data
+    projected = _pick(data, ("ref", "heRef", "sectionRef", "heSectionRef", "indexTitle", "categories", "next", "prev", "warnings"))
+    projected["versions"] = [
+        _pick(version, ("language", "versionTitle", "direction", "text"))
+        for version in data.get("versions", [])
+    ]
+    return projected
+
+
+def project_links(data: Any) -> Any:
+    """Keep the ref, category and commentator of each link (and its text when requested)."""
+    if not isinstance(data, list):
+        return data
+    links = []
+    for link in data:
+        if not isinstance(link, dict):
+            continue
+        projected = _pick(link, ("ref", "anchorRef", "category", "type", "text", "he"))
+        collective = link.get("collectiveTitle")
+        if isinstance(collective, dict) and collective.get("en"):
+            projected["commentator"] = collective["en"]
+        links.append(projected)
+    return links
+
+
+def project_topic(data: Any) -> Any:
+    """Keep the topic's titles, description, related topic slugs and tagged refs."""
+    if not isinstance(data, dict) or "slug" not in data:
+        return data
+    projected = _pick(data, ("slug", "numSources"))
+    for title in data.get("titles", []):
+        if title.get("primary"):
+            projected[f"title_{title.get('lang', 'en')}"] = title.get("text")
+    description = data.get("description")
+    if isinstance(description, dict):
+        projected["description"] = _pick(description, ("en", "he"))
+
+    links = data.get("links")
+    if isinstance(links, dict):
+        projected["links"] = {
+            link_type: [
+                link.get("topic") for link in group.get("links", []) if isinstance(link, dict)
+            ]
+            for link_type, group in links.items()
+            if isinstance(group, dict)
+        }
+
+    refs = data.get("refs")
+    if isinstance(refs, dict):
+        projected["refs"] = {
+            ref_type: [
+                ref.get("ref") for ref in group.get("refs", []) if isinstance(ref, dict)
+            ]
+            for ref_type, group in refs.items()
+            if isinstance(group, dict)
+        }
+    return projected
+
+
+def project_name(data: Any) -> Any:
+    """Keep the resolution result and a short list of completions."""
+    if not isinstance(data, dict):
+        return data
+    projected = _pick(data, ("lang", "type", "is_ref", "is_book", "is_range", "ref", "index", "book", "completions"))
+    objects = data.get("completion_objects")
+    if isinstance(objects, list):
+        projected["completion_objects"] = [
+            _pick(obj, ("title", "key", "type")) for obj in objects if isinstance(obj, dict)
+        ]
+    return projected
+
+
+def project_search(data: Any) -> Any:
+    """Keep the ref and highlighted snippet of each search hit."""
+    hits = data.get("hits", {}).get("hits") if isinstance(data, dict) else None
+    if not isinstance(hits, list):
+        return data
+    results = []
+    for hit in hits:
+        source = hit.get("_source", {})
+        result = _pick(source, ("ref", "heRef", "categories"))
+        highlight = hit.get("highlight")
+        if isinstance(highlight, dict):
+            snippets = [snippet for values in highlight.values() for snippet in values]
+            if snippets:
+                result["highlight"] = snippets[:3]
+        results.append(result)
+    return results
+
+
+PROJECTIONS: dict[str, Callable[[Any], Any]] = {
+    "get_text": project_text,
+    "get_links_between_texts": project_links,
+    "get_topic_details": project_topic,
+    "clarify_name_argument": project_name,
+    "text_search": project_search,
+    "english_semantic_search": project_search,
+}
+
+
+def project_result(tool_name: str, raw: str) -> str:
+    """
+    Project a raw tool response into compact JSON.
+
+    Responses that are not JSON, or tools without a projection, are
+    returned unchanged.
+    """
+    projection = PROJECTIONS.get(tool_name)
+    if projection is None:
+        return raw
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return raw
+    if isinstance(data, dict) and "error" in data:
+        return dumps_compact(data)
+    return dumps_compact(projection(data))
+
+
+def _longest_prefix(length: int, fits: Callable[[int], bool]) -> Optional[int]:
+    """Binary-search the largest n <= length for which fits(n) holds, or None if none does."""
+    low, high = 0, length
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        if fits(middle):
+            best = middle
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def _fit_list(items: list, max_bytes: int, wrap: Callable[[list, int], Any]) -> Optional[str]:
+    """Binary-search the longest prefix of items whose wrapped JSON fits in max_bytes."""
+    def encode(kept: int) -> str:
+        return dumps_compact(wrap(items[:kept], len(items) - kept))
+
+    kept = _longest_prefix(len(items), lambda kept: len(encode(kept).encode("utf-8")) <= max_bytes)
+    return encode(kept) if kept is not None else None
+
+
+def _fields(value: Any, path: str = ""):
+    """Yield (object, key, path) for every list or string field of value, at any depth."""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if key == TRUNCATION_KEY:
+                continue
+            child_path = f"{path}.{key}" if path else key
+            if isinstance(child, (list, str)):
+                yield value, key, child_path
+            yield from _fields(child, child_path)
+    elif isinstance(value, list):
+        for index, child in enumerate(value):
+            yield from _fields(child, f"{path}[{index}]")
+
+
+def _size(value: Any) -> int:
+    return len(dumps_compact(value).encode("utf-8"))
+
+
+def _largest_field(data: dict) -> Optional[tuple]:
+    """
+    Return (object, key, path) of the non-empty field to shorten next, or None.
+
+    That is the largest list or string field, except that a list of objects
+    that are each mostly one field (e.g. text versions) is cut inside its
+    objects rather than by dropping whole objects.
+    """
+    fields = [field for field in _fields(data) if field[0][field[1]]]
+    while fields:
+        obj, key, path = max(fields, key=lambda field: _size(field[0][field[1]]))
+        items = [item for item in obj[key] if isinstance(item, dict)] if isinstance(obj[key], list) else []
+        inner = [field for field in _fields(obj[key], path) if field[0][field[1]]]
+        if not items or not inner:
+            return obj, key, path
+        largest_inner = max(_size(field[0][field[1]]) for field in inner)
+        if largest_inner * 2 < max(_size(item) for item in items):
+            return obj, key, path
+        fields = inner
+    return None
+
+
+def _fit_object(data: dict, max_bytes: int) -> Optional[str]:
+    """
+    Shrink the largest list or string fields of a JSON object until it fits in max_bytes.
+
+    Each shortened field is cut to a prefix and noted under TRUNCATION_KEY
+    by its path, so the result stays valid JSON.
+    """
+    notes: dict[str, str] = {}
+    data[TRUNCATION_KEY] = notes
+    lengths: dict[str, int] = {}
+
+    def size() -> int:
+        return _size(data)
+
+    while size() > max_bytes:
+        field = _largest_field(data)
+        if field is None:
+            return None
+        obj, key, path = field
+        value = obj[key]
+        unit = "items" if isinstance(value, list) else "characters"
+        length = lengths.setdefault(path, len(value))
+
+        def shorten(kept: int):
+            obj[key] = value[:kept]
+            notes[path] = f"{length - kept} of {length} {unit} omitted"
+
+        def fits(kept: int) -> bool:
+            shorten(kept)
+            return size() <= max_bytes
+
+        # Too big even with this field emptied: halve it and let the next largest share the cut
+        kept = _longest_prefix(len(value) - 1, fits)
+        shorten(kept if kept is not None else len(value) // 2)
+    return dumps_compact(data)
+
+
+def cap_result(result: str, max_bytes: int) -> str:
+    """
+    Cap a tool result at max_bytes of UTF-8.
+
+    JSON lists are cut at an item boundary with a marker recording how many
+    items were dropped. JSON objects have their largest list and string
+    fields shortened, with the cuts recorded under TRUNCATION_KEY. Text
+    that is not JSON is cut at the byte limit with a trailing note.
+    """
+    encoded = result.encode("utf-8")
+    if max_bytes <= 0 or len(encoded) <= max_bytes:
+        return result
+
+    try:
+        data = json.loads(result)
+    except ValueError:
+        note = f"\n[{TRUNCATION_KEY}: showing {max_bytes} of {len(encoded)} bytes]"
+        return encoded[:max_bytes].decode("utf-8", errors="ignore") + note
+
+    capped = None
+    if isinstance(data, list) and data:
+        capped = _fit_list(
+            data, max_bytes,
+            lambda kept, omitted: kept + [{TRUNCATION_KEY: f"{omitted} of {len(data)} items omitted"}],
+        )
+    elif isinstance(data, dict):
+        capped = _fit_object(data, max_bytes)
+    elif isinstance(data, str):
+        kept = _longest_prefix(len(data), lambda kept: len(dumps_compact(data[:kept]).encode("utf-8")) <= max_bytes)
+        capped = dumps_compact(data[:kept]) if kept is not None else None
+    if capped is not None:
+        return capped
+    return dumps_compact({TRUNCATION_KEY: f"result of {len(encoded)} bytes omitted"})
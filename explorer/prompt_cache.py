@@ -0,0 +1,126 @@
+"""
+Provider Prompt Caching
+Builds cache-friendly completion requests and tracks cached prompt tokens
+
+Providers cache a request's longest previously seen prefix: the tool
+schema, then the system prompt, then the conversation. Keeping those
+bytes identical from one request to the next is what makes them
+reusable. Some providers (Anthropic and Gemini through OpenRouter) also
+need explicit cache_control breakpoints; others (OpenAI, DeepSeek and
+more) cache any long prefix automatically.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Optional
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Model prefixes whose providers only cache at explicit cache_control breakpoints
+CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+
+def wants_cache_control(model: str, mode: str = "auto") -> bool:
+    """Decide whether to add breakpoints: 'on', 'off' or 'auto' (by model)."""
+    if mode in ("0", "off", "false", "no"):
+        return False
+    if mode in ("1", "on", "true", "yes"):
+        return True
+    return model.startswith(CACHE_CONTROL_MODEL_PREFIXES)
+
+
+def _with_breakpoint(message: dict) -> dict:
+    """Copy a message with its text content as one part marked as a cache breakpoint."""
+    content = message.get("content")
+    if isinstance(content, list):
+        parts = [dict(part) for part in content]
+        if parts:
+            parts[-1]["cache_control"] = CACHE_CONTROL
+    else:
+        parts = [{"type": "text", "text": content or "", "cache_control": CACHE_CONTROL}]
+    return {**message, "content": parts}
+
+
+def prepare_messages(messages: list[dict], cache_control: bool) -> list[dict]:
+    """
+    Return the messages to send, leaving the stored history untouched.
+
+    With cache_control, breakpoints go on the system prompt (caching the
+    tools and the prompt) and on the latest user message (caching the
+    conversation for the rest of the turn's tool rounds).
+    """
+    if not cache_control or not messages:
+        return messages
+    prepared = list(messages)
+    if prepared[0].get("role") == "system":
+        prepared[0] = _with_breakpoint(prepared[0])
+    for index in range(len(prepared) - 1, 0, -1):
+        if prepared[index].get("role") == "user":
+            prepared[index] = _with_breakpoint(prepared[index])
+            break
+    return prepared
+
+
+def prefix_fingerprint(tools: Optional[list], messages: list[dict]) -> str:
+    """Hash the cacheable prefix (tool schema and system prompt) of a request."""
+    system = messages[0] if messages and messages[0].get("role") == "system" else None
+    payload = json.dumps([tools or [], system], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def cached_prompt_tokens(usage) -> int:
+    """Read cached prompt tokens from an OpenAI-style usage object or dict."""
+    if usage is None:
+        return 0
+    get = usage.get if isinstance(usage, dict) else lambda key, default=None: getattr(usage, key, default)
+    details = get("prompt_tokens_details")
+    if details is not None:
+        cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+        if cached:
+            return int(cached)
+    # Anthropic-style field, passed through by some gateways
+    return int(get("cache_read_input_tokens") or 0)
+
+
+class PromptCacheStats:
+    """
+    Counts prompt tokens served from the provider cache.
+
+    Each request's prefix fingerprint is remembered per persona, so a
+    prefix that changes between requests (and therefore cannot be cached)
+    shows up as prefix_changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prefixes: dict[str, str] = {}
+        self.counters = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "prefix_changes": 0}
+
+    def observe_prefix(self, key: str, fingerprint: str):
+        """Record the prefix a request was sent with."""
+        with self._lock:
+            previous = self._prefixes.get(key)
+            if previous is not None and previous != fingerprint:
+                self.counters["prefix_changes"] += 1
+            self._prefixes[key] = fingerprint
+
+    def record(self, prompt_tokens: int, cached_tokens: int):
+        """Record one completion's prompt usage."""
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters["prompt_tokens"] += prompt_tokens
+            self.counters["cached_tokens"] += cached_tokens
+
+    def stats(self) -> dict:
+        """Return counters and the share of prompt tokens read from cache."""
+        with self._lock:
+            counters = dict(self.counters)
+            prefixes = dict(self._prefixes)
+        prompt = counters["prompt_tokens"]
+        return {
+            **counters,
+            "uncached_tokens": prompt - counters["cached_tokens"],
+            "cached_ratio": round(counters["cached_tokens"] / prompt, 4) if prompt else 0.0,
+            "prefixes": prefixes,
+        }
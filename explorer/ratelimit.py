@@ -0,0 +1,234 @@
+"""
+Upstream Rate Limiting
+Token-bucket limits, fair queueing across sessions and 429-aware retries
+
+Every request to an upstream (OpenRouter, Sefaria) first takes a slot
+from that upstream's limiter: a token bucket caps requests per second
+and a counter caps requests in flight. Requests that cannot start at once
+wait in per-session queues that are served round-robin, so a session
+running a long research turn gets one slot in turn with everyone else
+rather than all of them. A 429 pauses the whole limiter for its
+Retry-After, and the request is retried with jittered exponential backoff.
+"""
+
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+# Status codes worth retrying: rate limited, or the upstream is briefly unavailable
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class UpstreamStatusError(Exception):
+    """An upstream answered with a retryable status (raised so the caller can retry)."""
+
+    def __init__(self, upstream: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"{upstream} returned HTTP {status_code}"
+                         + (f" (retry after {retry_after:g}s)" if retry_after is not None else ""))
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Read a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def error_status(error: BaseException) -> tuple[Optional[int], Optional[float]]:
+    """Return (status code, Retry-After seconds) from an upstream error, if it has them."""
+    if isinstance(error, UpstreamStatusError):
+        return error.status_code, error.retry_after
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    return status, parse_retry_after(headers.get("retry-after"))
+
+
+class FairLimiter:
+    """
+    Rate and concurrency limiter for one upstream with round-robin queueing.
+
+    rate is requests per second (0 for no rate limit) with bursts of up to
+    burst requests; max_concurrency caps requests in flight (0 for no cap).
+    """
+
+    def __init__(self, name: str, rate: float = 0, burst: Optional[float] = None, max_concurrency: int = 0,
+                 on_wait: Optional[Callable[[float], None]] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst if burst else max(1.0, rate)
+        self.max_concurrency = max_concurrency
+        self.on_wait = on_wait
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._active = 0
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.counters = {"requests": 0, "queued": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                         "throttled": 0, "retries": 0}
+
+    def _refill(self, now: float):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self) -> Optional[float]:
+        """Seconds until a request may start (0 if now, None if waiting on a free slot)."""
+        now = time.monotonic()
+        self._refill(now)
+        if self.max_concurrency and self._active >= self.max_concurrency:
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rate and self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0.0
+
+    def _take(self):
+        if self.rate:
+            self._tokens -= 1
+        self._active += 1
+
+    def _dispatch(self):
+        """Start queued requests, one session at a time, while capacity allows."""
+        while self._queues:
+            delay = self._delay()
+            if delay is None:
+                return
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+                return
+            session, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(session)
+            else:
+                del self._queues[session]
+            if waiter.done():
+                continue
+            self._take()
+            waiter.set_result(None)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def _record_wait(self, waited: float):
+        self.counters["requests"] += 1
+        self.counters["wait_seconds"] += waited
+        self.counters["max_wait_seconds"] = max(self.counters["max_wait_seconds"], waited)
+        if self.on_wait is not None:
+            self.on_wait(waited)
+
+    async def acquire(self, session: str = ""):
+        """Wait for a slot; callers from the same session queue behind each other."""
+        if not self._queues and self._delay() == 0:
+            self._take()
+            self._record_wait(0.0)
+            return
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(session, deque()).append(waiter)
+        self.counters["queued"] += 1
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Granted a slot just as the caller gave up: hand it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        self._record_wait(time.monotonic() - started)
+
+    def release(self):
+        """Return a slot taken by acquire."""
+        self._active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, session: str = ""):
+        """Hold a slot for the duration of a request."""
+        await self.acquire(session)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def throttle(self, seconds: float):
+        """Start no new requests for a while, e.g. after a 429 with Retry-After."""
+        self.counters["throttled"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        """Return queue depth, requests in flight and wait counters."""
+        requests = self.counters["requests"]
+        return {
+            **self.counters,
+            "queue_depth": sum(len(queue) for queue in self._queues.values()),
+            "sessions_waiting": len(self._queues),
+            "active": self._active,
+            "mean_wait_seconds": round(self.counters["wait_seconds"] / requests, 4) if requests else 0.0,
+        }
+
+
+class RetryPolicy:
+    """Jittered exponential backoff that defers to the upstream's Retry-After."""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.5, max_delay: float = 20.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """Seconds to wait before retry number attempt (0-based), or None to give up."""
+        if attempt >= self.attempts:
+            return None
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+async def call_with_retry(limiter: FairLimiter, policy: RetryPolicy, session: str,
+                          request: Callable[[], Awaitable]):
+    """
+    Run request() under the limiter, retrying retryable upstream errors.
+
+    A 429 pauses the limiter for everyone, since the upstream is telling
+    all callers to slow down, not just this one.
+    """
+    attempt = 0
+    while True:
+        async with limiter.slot(session):
+            try:
+                return await request()
+            except Exception as e:
+                status, retry_after = error_status(e)
+                if status not in RETRY_STATUSES:
+                    raise
+                delay = policy.delay(attempt, retry_after)
+                if delay is None:
+                    raise
+                if status == 429:
+                    limiter.throttle(retry_after if retry_after is not None else delay)
+        limiter.counters["retries"] += 1
+        attempt += 1
+        await asyncio.sleep(delay)
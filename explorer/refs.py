@@ -0,0 +1,418 @@
+"""
+Reference Parsing
+Splits Sefaria-style refs into a title and numeric sections, and formats them back.
+Resolves aliased or Hebrew refs to canonical Sefaria refs with a title trie.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Optional
+
+from .titles import builtin_books
+
+# Title followed by an address such as "1:1", "2a:5", "1:1-5" or "2a-3b"
+_ADDRESS = r"\d+[ab]?(?:[:.]\d+[ab]?)*"
+REF_PATTERN = re.compile(rf"^(?P<title>.+?)[\s,]+(?P<start>{_ADDRESS})(?:\s*[-–]\s*(?P<end>{_ADDRESS}))?$")
+
+# Hebrew numeral letters, largest first
+_HEBREW_NUMERALS = [
+    (400, "ת"), (300, "ש"), (200, "ר"), (100, "ק"),
+    (90, "צ"), (80, "פ"), (70, "ע"), (60, "ס"), (50, "נ"),
+    (40, "מ"), (30, "ל"), (20, "כ"), (10, "י"),
+    (9, "ט"), (8, "ח"), (7, "ז"), (6, "ו"), (5, "ה"), (4, "ד"), (3, "ג"), (2, "ב"), (1, "א"),
+]
+
+
+# Niqqud, cantillation, quote marks and abbreviation dots are ignored in titles
+_TITLE_NOISE = re.compile(r"[\u0591-\u05C7\u05F3\u05F4\"'.]")
+
+# Hebrew address after a title: "א:ב", "א׳:ב׳-ג׳", "ב.", "ב:", "ב ע״א"
+_HEBREW_NUMBER = r"[\u05D0-\u05EA]+[\u05F3\u05F4\"']?[\u05D0-\u05EA]?[\u05F3']?"
+HEBREW_TALMUD_PATTERN = re.compile(
+    rf"^(?P<daf>{_HEBREW_NUMBER})\s*(?:(?P<mark>[.:])|\s+(?:ע[\"\u05F4]?)?(?P<amud>[אב]))?(?:\s*:\s*(?P<line>{_HEBREW_NUMBER}))?$"
+)
+HEBREW_ADDRESS_PATTERN = re.compile(
+    rf"^(?P<start>{_HEBREW_NUMBER}(?:\s*:\s*{_HEBREW_NUMBER})*)(?:\s*[-–]\s*(?P<end>{_HEBREW_NUMBER}(?:\s*:\s*{_HEBREW_NUMBER})*))?$"
+)
+
+
+def split_ref(ref: str) -> tuple[str, Optional[str], Optional[str]]:
+    """Split a ref into (title, start address, end address); addresses may be None."""
+    ref = " ".join(ref.replace("_", " ").split())
+    match = REF_PATTERN.match(ref)
+    if not match:
+        return ref, None, None
+    return match.group("title"), match.group("start"), match.group("end")
+
+
+def parse_section(token: str, address_type: str = "Integer") -> int:
+    """Parse one address token to a 1-based section number (amudim for Talmud: 2a=3, 2b=4)."""
+    if address_type == "Talmud" or token[-1:] in ("a", "b"):
+        daf = int(token.rstrip("ab"))
+        return daf * 2 - 1 + (1 if token.endswith("b") else 0)
+    return int(token)
+
+
+def parse_address(address: str, address_types: list[str]) -> list[int]:
+    """Parse an address like "1:1" or "2a:5" into 1-based section numbers."""
+    tokens = re.split(r"[:.]", address)
+    return [
+        parse_section(token, address_types[i] if i < len(address_types) else "Integer")
+        for i, token in enumerate(tokens)
+    ]
+
+
+def parse_range(start: str, end: Optional[str], address_types: list[str]) -> tuple[list[int], list[int]]:
+    """
+    Parse a start and optional end address into two section lists.
+
+    A shortened end borrows its leading sections from the start, so
+    "1:1-5" ends at [1, 5] and "1:1-2:3" ends at [2, 3].
+    """
+    start_sections = parse_address(start, address_types)
+    if end is None:
+        return start_sections, list(start_sections)
+    end_tokens = re.split(r"[:.]", end)
+    offset = len(start_sections) - len(end_tokens)
+    if offset < 0:
+        return start_sections, parse_address(end, address_types)
+    end_types = address_types[offset:]
+    end_sections = start_sections[:offset] + [
+        parse_section(token, end_types[i] if i < len(end_types) else "Integer")
+        for i, token in enumerate(end_tokens)
+    ]
+    return start_sections, end_sections
+
+
+def format_section(section: int, address_type: str = "Integer") -> str:
+    """Format a 1-based section number as it appears in an English ref."""
+    if address_type == "Talmud":
+        return f"{(section + 1) // 2}{'a' if section % 2 else 'b'}"
+    return str(section)
+
+
+def format_address(sections: list[int], address_types: list[str]) -> str:
+    """Format section numbers as an English address like "1:1" or "2a:5"."""
+    return ":".join(
+        format_section(section, address_types[i] if i < len(address_types) else "Integer")
+        for i, section in enumerate(sections)
+    )
+
+
+def to_hebrew_numeral(number: int, punctuate: bool = True) -> str:
+    """Convert a positive integer to Hebrew numerals (15 and 16 use ט״ו and ט״ז)."""
+    letters = []
+    thousands, number = divmod(number, 1000)
+    prefix = ""
+    if thousands:
+        prefix = to_hebrew_numeral(thousands, punctuate=False) + ("׳" if punctuate else "")
+    for value, letter in _HEBREW_NUMERALS:
+        # 15 and 16 avoid spelling divine names
+        if number in (15, 16):
+            letters.append("ט" + ("ו" if number == 15 else "ז"))
+            number = 0
+            break
+        while number >= value:
+            letters.append(letter)
+            number -= value
+    text = "".join(letters)
+    if punctuate and len(text) == 1:
+        text += "׳"
+    elif punctuate and text:
+        text = text[:-1] + "״" + text[-1]
+    return prefix + text
+
+
+def from_hebrew_numeral(text: str) -> int:
+    """Convert Hebrew numerals ("י״ב", "תרי״ג") to an integer."""
+    values = {letter: value for value, letter in _HEBREW_NUMERALS}
+    values.update({"ך": 20, "ם": 40, "ן": 50, "ף": 80, "ץ": 90})
+    total = 0
+    for char in text:
+        if char in values:
+            total += values[char]
+        elif char not in "\u05F3\u05F4\"' ":
+            raise ValueError(f"Not a Hebrew numeral: {text}")
+    if not total:
+        raise ValueError(f"Not a Hebrew numeral: {text}")
+    return total
+
+
+def format_hebrew_address(sections: list[int], address_types: list[str]) -> str:
+    """Format section numbers the way Sefaria writes Hebrew refs ("א׳:א׳", "ב׳ א")."""
+    parts = []
+    for i, section in enumerate(sections):
+        address_type = address_types[i] if i < len(address_types) else "Integer"
+        if address_type == "Talmud":
+            parts.append(f"{to_hebrew_numeral((section + 1) // 2)} {'א' if section % 2 else 'ב'}")
+        else:
+            parts.append(to_hebrew_numeral(section))
+    return ":".join(parts)
+
+
+def normalize_title(title: str) -> str:
+    """Normalize a title for lookup: casefold, drop marks and dots, collapse spaces."""
+    return " ".join(_TITLE_NOISE.sub("", title.replace("_", " ")).casefold().split())
+
+
+class TitleTrie:
+    """Character trie mapping normalized titles and aliases to canonical titles."""
+
+    _END = "\0"
+
+    def __init__(self):
+        self.root: dict = {}
+        self.size = 0
+
+    def insert(self, key: str, title: str):
+        """Map a normalized key to a canonical title (the first mapping wins)."""
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        if self._END not in node:
+            node[self._END] = title
+            self.size += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the title for an exact normalized key."""
+        node = self.root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node.get(self._END)
+
+    def longest_prefix(self, text: str) -> Optional[tuple[int, str]]:
+        """Return (length, title) of the longest key that starts the text at a word boundary."""
+        node = self.root
+        best = None
+        for index, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                break
+            if self._END in node and (index + 1 == len(text) or text[index + 1] == " "):
+                best = (index + 1, node[self._END])
+        return best
+
+    def complete(self, prefix: str, limit: int = 10) -> list[str]:
+        """Return up to `limit` distinct titles whose keys start with the prefix, shortest keys first."""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        titles = []
+        level = [node]
+        while level and len(titles) < limit:
+            next_level = []
+            for current in level:
+                title = current.get(self._END)
+                if title is not None and title not in titles:
+                    titles.append(title)
+                next_level.extend(child for char, child in sorted(current.items()) if char != self._END)
+            level = next_level
+        return titles[:limit]
+
+
+def load_sefaria_index(path: Path) -> list[dict]:
+    """Flatten a saved /api/index category tree into book entries."""
+    books = []
+
+    def walk(nodes: list, categories: list):
+        for node in nodes:
+            if "contents" in node:
+                walk(node["contents"], categories + [node.get("category", "")])
+            elif node.get("title"):
+                bavli = "Bavli" in categories
+                books.append({
+                    "title": node["title"],
+                    "heTitle": node.get("heTitle", ""),
+                    "categories": node.get("categories") or categories,
+                    "addressTypes": ["Talmud", "Integer"] if bavli else ["Integer", "Integer"],
+                    "titleVariants": [],
+                })
+
+    walk(json.loads(Path(path).read_text(encoding="utf-8")), [])
+    return books
+
+
+class RefResolver:
+    """
+    Resolves refs written with aliases, abbreviations or Hebrew titles to canonical Sefaria refs.
+
+    "Gen 1:1" -> "Genesis 1:1", "Brachot 2a" -> "Berakhot 2a",
+    "בראשית א:א" -> "Genesis 1:1", "Rashi on Bereishit 1:1:1" -> "Rashi on Genesis 1:1:1".
+    """
+
+    def __init__(self, books: Optional[list[dict]] = None):
+        self.trie = TitleTrie()
+        self.books: dict[str, dict] = {}
+        self.add_books(builtin_books())
+        if books:
+            self.add_books(books)
+
+    def add_books(self, books: list[dict]):
+        """Register books (text store manifest or /api/index shaped) and their aliases."""
+        for book in books:
+            title = book["title"]
+            if title not in self.books:
+                self.books[title] = book
+            for name in [title, book.get("heTitle", "")] + list(book.get("titleVariants", [])):
+                key = normalize_title(name) if name else ""
+                if key:
+                    self.trie.insert(key, title)
+
+    def find_title(self, name: str) -> Optional[str]:
+        """Return the canonical title for a title or alias."""
+        return self.trie.get(normalize_title(name))
+
+    def resolve(self, ref: str) -> Optional[dict]:
+        """
+        Resolve a ref to {"ref", "book", "sections", "toSections", "heRef"}.
+
+        Returns None when the title is unknown or the address cannot be parsed.
+        """
+        ref = " ".join(ref.replace("_", " ").split())
+
+        # Commentary refs resolve their base text ("Rashi on Bereishit 1:1")
+        commentary = re.match(r"^(?P<commentator>.+?) on (?P<base>.+)$", ref)
+        if commentary and not self.find_title(split_ref(ref)[0]):
+            base = self.resolve(commentary.group("base"))
+            if base is None:
+                return None
+            base["ref"] = f"{commentary.group('commentator')} on {base['ref']}"
+            base["book"] = f"{commentary.group('commentator')} on {base['book']}"
+            base["heRef"] = ""
+            return base
+
+        title, start, end = split_ref(ref)
+        canonical = self.find_title(title)
+        if canonical is not None:
+            return self._build(canonical, start, end)
+
+        # Hebrew refs: match the title as a prefix, then parse a Hebrew address
+        normalized = " ".join(ref.replace("_", " ").split())
+        match = self.trie.longest_prefix(normalize_title(normalized))
+        if match is None:
+            return None
+        length, canonical = match
+        address = self._hebrew_rest(normalized, length)
+        if address is None:
+            return None
+        return self._build_hebrew(canonical, address)
+
+    def _hebrew_rest(self, ref: str, key_length: int) -> Optional[str]:
+        """Return the part of the original ref after a title that matched key_length normalized chars."""
+        consumed = 0
+        for index, char in enumerate(ref):
+            if consumed == key_length:
+                return ref[index:].strip()
+            if normalize_title(char) or char == " ":
+                consumed += 1
+        return "" if consumed == key_length else None
+
+    def _build(self, title: str, start: Optional[str], end: Optional[str]) -> Optional[dict]:
+        """Build a resolution from English address strings."""
+        address_types = self.books[title].get("addressTypes", ["Integer", "Integer"])
+        if start is None:
+            return {"ref": title, "book": title, "sections": [], "toSections": [], "heRef": self.books[title].get("heTitle", "")}
+        try:
+            sections, to_sections = parse_range(start, end, address_types)
+        except ValueError:
+            return None
+        # A bare daf ("Berakhot 2") covers both amudim
+        if address_types[:1] == ["Talmud"] and start.isdigit() and (end is None or end.isdigit()):
+            to_sections[0] += 1
+        return self._result(title, sections, to_sections)
+
+    def _build_hebrew(self, title: str, address: str) -> Optional[dict]:
+        """Build a resolution from a Hebrew address string."""
+        address_types = self.books[title].get("addressTypes", ["Integer", "Integer"])
+        if not address:
+            return {"ref": title, "book": title, "sections": [], "toSections": [], "heRef": self.books[title].get("heTitle", "")}
+        try:
+            if address_types[:1] == ["Talmud"]:
+                match = HEBREW_TALMUD_PATTERN.match(address)
+                if not match:
+                    return None
+                daf = from_hebrew_numeral(match.group("daf"))
+                side = "b" if match.group("mark") == ":" or match.group("amud") == "ב" else "a"
+                whole_daf = not match.group("mark") and not match.group("amud")
+                sections = [parse_section(f"{daf}{side}", "Talmud")]
+                to_sections = [sections[0] + 1] if whole_daf else list(sections)
+                if match.group("line"):
+                    sections.append(from_hebrew_numeral(match.group("line")))
+                    to_sections = list(sections)
+                return self._result(title, sections, to_sections)
+
+            match = HEBREW_ADDRESS_PATTERN.match(address)
+            if not match:
+                return None
+            sections = [from_hebrew_numeral(part) for part in re.split(r"\s*:\s*", match.group("start"))]
+            to_sections = list(sections)
+            if match.group("end"):
+                end = [from_hebrew_numeral(part) for part in re.split(r"\s*:\s*", match.group("end"))]
+                to_sections = sections[:len(sections) - len(end)] + end if len(end) <= len(sections) else end
+        except ValueError:
+            return None
+        return self._result(title, sections, to_sections)
+
+    def _result(self, title: str, sections: list[int], to_sections: list[int]) -> dict:
+        """Format a resolution with canonical English and Hebrew refs."""
+        book = self.books[title]
+        address_types = book.get("addressTypes", ["Integer", "Integer"])
+        ref = f"{title} {format_address(sections, address_types)}"
+        he_ref = f"{book.get('heTitle', '')} {format_hebrew_address(sections, address_types)}".strip()
+        if to_sections != sections:
+            # Sefaria shortens the end of a range to the sections that differ
+            common = 0
+            while common < len(sections) - 1 and sections[common] == to_sections[common]:
+                common += 1
+            end_types = address_types[common:]
+            ref += "-" + format_address(to_sections[common:], end_types)
+            he_ref += "-" + format_hebrew_address(to_sections[common:], end_types)
+        return {"ref": ref, "book": title, "sections": sections, "toSections": to_sections, "heRef": he_ref}
+
+    def format_ref(self, book: str, sections: list[int]) -> str:
+        """Format a canonical ref for sections of a known book."""
+        address_types = self.books.get(book, {}).get("addressTypes", ["Integer", "Integer"])
+        return f"{book} {format_address(sections, address_types)}" if sections else book
+
+    def categories(self, book: str) -> list[str]:
+        """Return the categories of a known book (empty for unknown ones)."""
+        return self.books.get(book, {}).get("categories", [])
+
+    def canonical(self, ref: str) -> Optional[str]:
+        """Return the canonical ref string, or None if the ref cannot be resolved."""
+        resolved = self.resolve(ref)
+        return resolved["ref"] if resolved else None
+
+    def clarify(self, name: str, limit: int = 10) -> Optional[dict]:
+        """
+        Answer clarify_name_argument for refs and book titles.
+
+        Returns None for names that are not refs (topics, people, partial
+        names), which need the remote Name API. A bare book title may also
+        name a topic; callers add topic matches for is_book results.
+        """
+        resolved = self.resolve(name)
+        if resolved is None:
+            return None
+        completions = [resolved["ref"]]
+        if not resolved["sections"]:
+            completions += [
+                title for title in self.trie.complete(normalize_title(name), limit)
+                if title != resolved["ref"]
+            ]
+        return {
+            "is_ref": True,
+            "is_book": not resolved["sections"],
+            "is_range": resolved["sections"] != resolved["toSections"],
+            "type": "ref",
+            "ref": resolved["ref"],
+            "heRef": resolved["heRef"],
+            "book": resolved["book"],
+            "completions": completions[:limit],
+            "source": "local",
+        }
@@ -0,0 +1,457 @@
+"""
+Local Hebrew/Aramaic Search Index
+Inverted index over the local text store with Hebrew-aware normalization and BM25 ranking
+
+An index directory holds a manifest and one or more index segments. Each
+build adds a segment for the book versions that are not indexed yet, so the
+index grows incrementally as the text store does. Segment files are flat
+little-endian arrays that are memory-mapped when searching:
+
+    docs.bin          per document: book, version, three sections, length
+    terms.bin         sorted vocabulary, UTF-8 concatenated
+    term_offsets.bin  uint64 start of each term in terms.bin (plus the end)
+    term_info.bin     per term: first posting, document frequency
+    postings.bin      per posting: document, term frequency, first position
+    positions.bin     uint32 token positions
+
+Usage:
+    python -m explorer.search_index build <store dir> <index dir> [--languages he]
+    python -m explorer.search_index search <store dir> <index dir> "בראשית ברא"
+"""
+
+import argparse
+import heapq
+import json
+import math
+import mmap
+import re
+import shutil
+import struct
+from array import array
+from pathlib import Path
+from typing import Optional
+
+from .textstore import TextStore
+from .refs import format_address
+
+DOC = struct.Struct("<IH2xIIII")
+TERM_INFO = struct.Struct("<QI")
+POSTING = struct.Struct("<III")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Hebrew prefix letters that attach to words (and, the, in, as, to, from, that),
+# and the two-letter clusters they commonly form ("and the", "that in", ...)
+PREFIX_LETTERS = "והבכלמש"
+PREFIX_PAIRS = ("וה", "וב", "וכ", "ול", "ומ", "וש", "שה", "שב", "שכ", "של", "שמ", "מש", "כש")
+
+# Term frequency weight of a prefixed form relative to the form as typed
+PREFIX_WEIGHT = 0.5
+
+# Niqqud, cantillation and quote marks are dropped; maqaf, paseq and sof pasuq split words
+_FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+_MARKS = re.compile(r"[\u0591-\u05BD\u05BF\u05C1\u05C2\u05C4\u05C5\u05C7\u05F3\u05F4\"']")
+_RAW_TOKEN = re.compile(r"[\u0591-\u05BD\u05BF\u05C1\u05C2\u05C4-\u05C7\u05D0-\u05EA\u05F3\u05F4\"'A-Za-z0-9]+")
+_HTML = re.compile(r"<[^>]+>")
+
+# Flush an in-memory batch to disk after this many documents
+BATCH_DOCUMENTS = 500_000
+
+
+def normalize_token(token: str) -> str:
+    """Strip niqqud, cantillation and quote marks, fold final letters and lowercase."""
+    return _MARKS.sub("", token).translate(_FINAL_LETTERS).lower()
+
+
+def tokenize(text: str) -> list[tuple[str, int, int]]:
+    """Return (normalized token, start, end) for each word of the text."""
+    tokens = []
+    for match in _RAW_TOKEN.finditer(text):
+        token = normalize_token(match.group())
+        if token:
+            tokens.append((token, match.start(), match.end()))
+    return tokens
+
+
+def strip_html(text: str) -> str:
+    """Remove HTML tags from segment text."""
+    return _HTML.sub("", text)
+
+
+def prefix_variants(term: str) -> set[str]:
+    """
+    Return the term as typed with Hebrew prefix letters added in front.
+
+    "בית" matches "הבית", "ובית", "ובבית" and so on. Letters are never
+    stripped from the term, since a leading מ or ש is as often part of
+    the root (משה, שלום) as a prefix.
+    """
+    if len(term) < 2 or not all("א" <= letter <= "ת" for letter in term):
+        return set()
+    variants = {letter + term for letter in PREFIX_LETTERS}
+    for pair in PREFIX_PAIRS:
+        variants.add(pair + term)
+        if pair[1] != "ה":
+            variants.add(pair + "ה" + term)
+    return variants
+
+
+class IndexSegment:
+    """One memory-mapped index segment."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        meta = json.loads((path / "segment.json").read_text(encoding="utf-8"))
+        self.books: list[dict] = meta["books"]
+        self.doc_count: int = meta["documents"]
+        self.total_length: int = meta["total_length"]
+
+        self._files = []
+        self._maps = {}
+        for name in ("docs", "terms", "term_offsets", "term_info", "postings", "positions"):
+            file = open(path / f"{name}.bin", "rb")
+            self._files.append(file)
+            size = (path / f"{name}.bin").stat().st_size
+            self._maps[name] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.term_offsets = memoryview(self._maps["term_offsets"]).cast("Q") if self._maps["term_offsets"] else []
+        self.positions = memoryview(self._maps["positions"]).cast("I") if self._maps["positions"] else []
+        self.term_count = max(0, len(self.term_offsets) - 1)
+
+    def _term(self, index: int) -> bytes:
+        """Return the UTF-8 bytes of the term at a vocabulary index."""
+        return self._maps["terms"][self.term_offsets[index]:self.term_offsets[index + 1]]
+
+    def lookup(self, term: str) -> Optional[tuple[int, int]]:
+        """Return (first posting, document frequency) for a term, or None."""
+        target = term.encode("utf-8")
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.term_count and self._term(low) == target:
+            return TERM_INFO.unpack_from(self._maps["term_info"], low * TERM_INFO.size)
+        return None
+
+    def postings(self, term: str) -> list[tuple[int, int, int]]:
+        """Return (document, term frequency, first position index) for each posting of a term."""
+        info = self.lookup(term)
+        if info is None:
+            return []
+        start, count = info
+        return list(POSTING.iter_unpack(self._maps["postings"][start * POSTING.size:(start + count) * POSTING.size]))
+
+    def document(self, doc_id: int) -> tuple:
+        """Return (book, version, s1, s2, s3, length) for a document."""
+        return DOC.unpack_from(self._maps["docs"], doc_id * DOC.size)
+
+    def close(self):
+        """Release the memory maps and files."""
+        self.term_offsets = self.positions = []
+        for mapped in self._maps.values():
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        for file in self._files:
+            file.close()
+
+
+def _write_segment(path: Path, books: list[dict], docs: bytearray, postings: dict[str, list], total_length: int):
+    """Write one segment's arrays to disk."""
+    path.mkdir(parents=True, exist_ok=True)
+    terms = sorted(postings, key=lambda term: term.encode("utf-8"))
+    term_offsets = array("Q")
+    term_info = bytearray()
+    posting_bytes = bytearray()
+    positions = array("I")
+    terms_blob = bytearray()
+    posting_count = 0
+    for term in terms:
+        term_offsets.append(len(terms_blob))
+        terms_blob += term.encode("utf-8")
+        entries = postings[term]
+        term_info += TERM_INFO.pack(posting_count, len(entries))
+        for doc_id, doc_positions in entries:
+            posting_bytes += POSTING.pack(doc_id, len(doc_positions), len(positions))
+            positions.extend(doc_positions)
+        posting_count += len(entries)
+    term_offsets.append(len(terms_blob))
+
+    (path / "docs.bin").write_bytes(docs)
+    (path / "terms.bin").write_bytes(terms_blob)
+    (path / "term_offsets.bin").write_bytes(term_offsets.tobytes())
+    (path / "term_info.bin").write_bytes(term_info)
+    (path / "postings.bin").write_bytes(posting_bytes)
+    (path / "positions.bin").write_bytes(positions.tobytes())
+    (path / "segment.json").write_text(json.dumps({
+        "books": books,
+        "documents": len(docs) // DOC.size,
+        "total_length": total_length,
+    }, ensure_ascii=False), encoding="utf-8")
+
+
+def build_index(store: TextStore, index_dir: Path, languages: tuple = ("he",), rebuild: bool = False) -> dict:
+    """
+    Index every book version in the store that the index does not cover yet.
+
+    New versions are written as additional segments; existing segments are
+    left untouched unless rebuild is set. Returns build statistics.
+    """
+    index_dir = Path(index_dir)
+    if rebuild and index_dir.exists():
+        shutil.rmtree(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = index_dir / "manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {"segments": [], "indexed": []}
+    indexed = {tuple(entry) for entry in manifest["indexed"]}
+    stats = {"segments_added": 0, "documents": 0}
+
+    books: list[dict] = []
+    book_slots: dict[str, int] = {}
+    docs = bytearray()
+    postings: dict[str, list] = {}
+    total_length = 0
+
+    def flush():
+        nonlocal books, book_slots, docs, postings, total_length
+        if not docs:
+            return
+        name = f"segment-{len(manifest['segments']):04d}"
+        _write_segment(index_dir / name, books, docs, postings, total_length)
+        manifest["segments"].append(name)
+        stats["segments_added"] += 1
+        books, book_slots, docs, postings, total_length = [], {}, bytearray(), {}, 0
+
+    for book_id, book in enumerate(store.books):
+        for version_id, version in enumerate(book["versions"]):
+            key = (book["title"], version["language"], version["versionTitle"])
+            if version["language"] not in languages or key in indexed:
+                continue
+            if book["title"] not in book_slots:
+                book_slots[book["title"]] = len(books)
+                books.append({"title": book["title"], "versions": []})
+            slot = book_slots[book["title"]]
+            local_version = len(books[slot]["versions"])
+            books[slot]["versions"].append({"language": version["language"], "versionTitle": version["versionTitle"]})
+
+            for sections, text in store.segments(book_id, version_id, [], []):
+                tokens = tokenize(strip_html(text))
+                doc_id = len(docs) // DOC.size
+                docs += DOC.pack(slot, local_version, *sections, len(tokens))
+                total_length += len(tokens)
+                by_term: dict[str, list] = {}
+                for position, (token, _, _) in enumerate(tokens):
+                    by_term.setdefault(token, []).append(position)
+                for token, token_positions in by_term.items():
+                    postings.setdefault(token, []).append((doc_id, token_positions))
+                stats["documents"] += 1
+            indexed.add(key)
+
+            if len(docs) // DOC.size >= BATCH_DOCUMENTS:
+                flush()
+    flush()
+
+    manifest["indexed"] = sorted(indexed)
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    return stats
+
+
+class SearchIndex:
+    """
+    BM25 search over all segments of an index directory.
+
+    Query terms are normalized like the indexed text. Quoted phrases must
+    match consecutive positions. With prefixes enabled, each term also
+    matches its forms with Hebrew prefix letters in front, at a reduced
+    weight; documents with the form as typed rank above those with only
+    prefixed forms.
+    """
+
+    def __init__(self, index_dir: Path, store: TextStore, prefixes: bool = True):
+        index_dir = Path(index_dir)
+        manifest = json.loads((index_dir / "manifest.json").read_text(encoding="utf-8"))
+        self.store = store
+        self.prefixes = prefixes
+        self.segments = [IndexSegment(index_dir / name) for name in manifest["segments"]]
+        self.doc_count = sum(segment.doc_count for segment in self.segments)
+        total_length = sum(segment.total_length for segment in self.segments)
+        self.average_length = total_length / self.doc_count if self.doc_count else 0.0
+
+    @staticmethod
+    def parse_query(query: str) -> list[list[str]]:
+        """Split a query into groups of terms; a quoted phrase is one group, other words are their own."""
+        groups = []
+        for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query):
+            terms = [token for token, _, _ in tokenize(phrase or word)]
+            if phrase:
+                if terms:
+                    groups.append(terms)
+            else:
+                groups.extend([term] for term in terms)
+        return groups
+
+    def _term_postings(self, segment: IndexSegment, term: str) -> tuple[dict[int, list[int]], dict[int, float], set[int]]:
+        """
+        Match a term and its prefix variants in one segment.
+
+        Returns {document: positions}, {document: weighted term frequency}
+        and the documents containing the term as typed.
+        """
+        matches: dict[int, list[int]] = {}
+        frequencies: dict[int, float] = {}
+        exact: set[int] = set()
+        variants = [(term, 1.0)]
+        if self.prefixes:
+            variants += [(variant, PREFIX_WEIGHT) for variant in prefix_variants(term)]
+        for variant, weight in variants:
+            for doc_id, frequency, first_position in segment.postings(variant):
+                matches.setdefault(doc_id, []).extend(segment.positions[first_position:first_position + frequency])
+                frequencies[doc_id] = frequencies.get(doc_id, 0.0) + weight * frequency
+                if variant == term:
+                    exact.add(doc_id)
+        return matches, frequencies, exact
+
+    @staticmethod
+    def _phrase_positions(term_matches: list[dict[int, list[int]]]) -> tuple[dict[int, list[int]], dict[int, float], set[int]]:
+        """
+        Keep documents where the terms occur consecutively.
+
+        Returns the phrase start positions, their counts as frequencies and
+        the matching documents (a phrase match counts as exact).
+        """
+        candidates = set(term_matches[0])
+        for matches in term_matches[1:]:
+            candidates &= set(matches)
+        phrases = {}
+        for doc_id in candidates:
+            starts = set(term_matches[0][doc_id])
+            for offset, matches in enumerate(term_matches[1:], start=1):
+                starts &= {position - offset for position in matches[doc_id]}
+            if starts:
+                phrases[doc_id] = sorted(starts)
+        return phrases, {doc_id: float(len(starts)) for doc_id, starts in phrases.items()}, set(phrases)
+
+    def search(self, query: str, size: int = 10) -> dict:
+        """Return the top `size` documents for a query, ranked by BM25."""
+        groups = self.parse_query(query)
+        if not groups or not self.doc_count:
+            return {"query": query, "total": 0, "results": []}
+
+        # Gather per-group matches, then score with BM25 using global statistics
+        group_matches = []
+        for group in groups:
+            per_segment = []
+            for segment in self.segments:
+                term_matches = [self._term_postings(segment, term) for term in group]
+                if len(term_matches) == 1:
+                    per_segment.append(term_matches[0])
+                else:
+                    per_segment.append(self._phrase_positions([matches for matches, _, _ in term_matches]))
+            group_matches.append(per_segment)
+
+        scores: dict[tuple[int, int], float] = {}
+        exact_groups: dict[tuple[int, int], int] = {}
+        first_hits: dict[tuple[int, int], int] = {}
+        for per_segment in group_matches:
+            document_frequency = sum(len(matches) for matches, _, _ in per_segment)
+            if not document_frequency:
+                continue
+            idf = math.log(1 + (self.doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            for segment_id, (matches, frequencies, exact) in enumerate(per_segment):
+                segment = self.segments[segment_id]
+                for doc_id, positions in matches.items():
+                    length = segment.document(doc_id)[5]
+                    frequency = frequencies[doc_id]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self.average_length or 1))
+                    key = (segment_id, doc_id)
+                    scores[key] = scores.get(key, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    exact_groups[key] = exact_groups.get(key, 0) + (doc_id in exact)
+                    first_hits.setdefault(key, min(positions))
+
+        # Documents matching more query terms as typed come first, then by score
+        top = heapq.nlargest(size, scores.items(), key=lambda item: (exact_groups[item[0]], item[1]))
+        return {
+            "query": query,
+            "total": len(scores),
+            "results": [self._result(key, score, first_hits[key]) for key, score in top],
+            "source": "local",
+        }
+
+    def _result(self, key: tuple[int, int], score: float, position: int) -> dict:
+        """Describe one hit with its ref and a snippet around the first match."""
+        segment_id, doc_id = key
+        segment = self.segments[segment_id]
+        book_slot, version_slot, *sections, _ = segment.document(doc_id)
+        sections = [section for section in sections if section]
+        book_info = segment.books[book_slot]
+        version = book_info["versions"][version_slot]
+
+        result = {"ref": book_info["title"], "score": round(score, 3), "language": version["language"]}
+        book_id = self.store.find_book(book_info["title"])
+        if book_id is None:
+            return result
+        book = self.store.books[book_id]
+        result["ref"] = f"{book['title']} {format_address(sections, book['addressTypes'])}"
+        result["categories"] = book["categories"]
+
+        version_id = next(
+            (i for i, v in enumerate(book["versions"])
+             if v["language"] == version["language"] and v["versionTitle"] == version["versionTitle"]),
+            None,
+        )
+        if version_id is not None:
+            texts = self.store.segments(book_id, version_id, sections, sections)
+            if texts:
+                result["snippet"] = self._snippet(strip_html(texts[0][1]), position)
+        return result
+
+    @staticmethod
+    def _snippet(text: str, position: int, context: int = 80) -> str:
+        """Cut a window of text around the token at a position."""
+        tokens = tokenize(text)
+        if position >= len(tokens):
+            return text[:2 * context]
+        _, start, end = tokens[position]
+        prefix = "…" if start > context else ""
+        suffix = "…" if end + context < len(text) else ""
+        return prefix + text[max(0, start - context):end + context] + suffix
+
+    def close(self):
+        """Release every segment."""
+        for segment in self.segments:
+            segment.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local Hebrew search index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Index versions of the text store not indexed yet")
+    build.add_argument("store_dir", type=Path)
+    build.add_argument("index_dir", type=Path)
+    build.add_argument("--languages", nargs="+", default=["he"])
+    build.add_argument("--rebuild", action="store_true", help="Discard the existing index first")
+
+    search = subparsers.add_parser("search", help="Run a query")
+    search.add_argument("store_dir", type=Path)
+    search.add_argument("index_dir", type=Path)
+    search.add_argument("query")
+    search.add_argument("--size", type=int, default=10)
+    search.add_argument("--no-prefixes", dest="prefixes", action="store_false")
+
+    args = parser.parse_args()
+    store = TextStore(args.store_dir)
+    if args.command == "build":
+        print(json.dumps(build_index(store, args.index_dir, tuple(args.languages), args.rebuild), indent=2))
+    else:
+        index = SearchIndex(args.index_dir, store, args.prefixes)
+        print(json.dumps(index.search(args.query, args.size), ensure_ascii=False, indent=2))
+        index.close()
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Local Semantic Search
+Vector index over English segments of the local text store
+
+Segment embeddings are computed offline and stored as a memory-mapped
+float16 or int8 matrix. Queries run a vectorized top-k over the matrix
+(brute force), or over the nearest inverted lists when an IVF index has
+been trained. Requires numpy; the embedding model is pluggable.
+
+Usage:
+    python -m explorer.semantic build <store dir> <vector dir> [--embedder hashing] [--ivf-lists 1024]
+    python -m explorer.semantic search <store dir> <vector dir> "repentance and forgiveness" [--category Talmud]
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import struct
+from pathlib import Path
+from typing import Optional, Protocol
+
+import numpy as np
+
+from .textstore import TextStore, MAX_DEPTH
+from .refs import format_address
+from .search_index import strip_html
+
+DOC = struct.Struct("<IH2xIII")
+
+# Rows scored per matrix chunk during brute-force search
+SEARCH_CHUNK_ROWS = 65_536
+
+# Segments embedded per batch while building
+EMBED_BATCH = 256
+
+
+class Embedder(Protocol):
+    """Turns texts into L2-normalized float32 vectors."""
+
+    name: str
+    dimension: int
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embedder using hashed word and word-pair features.
+
+    It captures lexical overlap rather than meaning. It is useful for
+    testing and as a fallback where no neural model can be installed.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.name = f"hashing:{dimension}"
+        self.dimension = dimension
+
+    def _features(self, text: str) -> list[str]:
+        words = re.findall(r"[a-z0-9']+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[row, value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a sentence-transformers model running on CPU."""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.name = f"sentence-transformers:{model_name}"
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def load_embedder(spec: str) -> Embedder:
+    """Create an embedder from a spec like "hashing:384" or "sentence-transformers:all-MiniLM-L6-v2"."""
+    kind, _, option = spec.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(int(option) if option else 384)
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbedder(option or "all-MiniLM-L6-v2")
+    raise ValueError(f"Unknown embedder: {spec}")
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """Convert float32 rows to the storage dtype; int8 rows also get a per-row scale."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def _kmeans(vectors: np.ndarray, lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a float32 sample; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for index in range(lists):
+            members = vectors[assignment == index]
+            if len(members):
+                centroids[index] = members.mean(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def build_vectors(store: TextStore, vector_dir: Path, embedder: Embedder, dtype: str = "float16",
+                  ivf_lists: int = 0, languages: tuple = ("en",)) -> dict:
+    """
+    Embed every segment of the chosen languages and write the vector index.
+
+    With ivf_lists > 0, also trains k-means centroids on a sample and stores
+    the row ids of each inverted list. Returns build statistics.
+    """
+    vector_dir = Path(vector_dir)
+    vector_dir.mkdir(parents=True, exist_ok=True)
+
+    # Collect document addresses first so the matrix can be preallocated
+    docs = bytearray()
+    sources = []
+    books = []
+    for book_id, book in enumerate(store.books):
+        for version_id, version in enumerate(book["versions"]):
+            if version["language"] not in languages:
+                continue
+            slot = len(books)
+            books.append({"title": book["title"], "categories": book["categories"], "versionTitle": version["versionTitle"]})
+            for sections, _ in store.segments(book_id, version_id, [], []):
+                docs += DOC.pack(slot, 0, *sections)
+                sources.append((book_id, version_id, list(sections)))
+            break
+
+    matrix = np.lib.format.open_memmap(
+        vector_dir / "vectors.npy", mode="w+",
+        dtype=np.float16 if dtype == "float16" else np.int8,
+        shape=(len(sources), embedder.dimension),
+    )
+    scales = np.ones(len(sources), dtype=np.float32)
+    for start in range(0, len(sources), EMBED_BATCH):
+        batch = sources[start:start + EMBED_BATCH]
+        texts = [
+            strip_html(store.segments(book_id, version_id, sections, sections)[0][1])
+            for book_id, version_id, sections in batch
+        ]
+        stored, batch_scales = _quantize(embedder.embed(texts), dtype)
+        matrix[start:start + len(batch)] = stored
+        if batch_scales is not None:
+            scales[start:start + len(batch)] = batch_scales
+    matrix.flush()
+    if dtype == "int8":
+        np.save(vector_dir / "scales.npy", scales)
+    (vector_dir / "docs.bin").write_bytes(docs)
+
+    if ivf_lists and len(sources) > ivf_lists:
+        sample_rows = np.random.default_rng(0).choice(len(sources), size=min(len(sources), ivf_lists * 64), replace=False)
+        sample = np.asarray(matrix[np.sort(sample_rows)], dtype=np.float32)
+        if dtype == "int8":
+            sample *= scales[np.sort(sample_rows)][:, None]
+        centroids = _kmeans(sample, ivf_lists)
+        assignment = np.empty(len(sources), dtype=np.int32)
+        for start in range(0, len(sources), SEARCH_CHUNK_ROWS):
+            chunk = np.asarray(matrix[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32)
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable").astype(np.uint32)
+        offsets = np.searchsorted(assignment[order], np.arange(ivf_lists + 1)).astype(np.uint64)
+        np.save(vector_dir / "ivf_centroids.npy", centroids)
+        np.save(vector_dir / "ivf_order.npy", order)
+        np.save(vector_dir / "ivf_offsets.npy", offsets)
+
+    manifest = {
+        "embedder": embedder.name,
+        "dimension": embedder.dimension,
+        "dtype": dtype,
+        "documents": len(sources),
+        "books": books,
+        "ivf_lists": ivf_lists if ivf_lists and len(sources) > ivf_lists else 0,
+    }
+    (vector_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    return {"documents": len(sources), "books": len(books), "ivf_lists": manifest["ivf_lists"]}
+
+
+class VectorIndex:
+    """Memory-mapped vector index answering top-k semantic queries."""
+
+    def __init__(self, vector_dir: Path, store: TextStore, embedder: Optional[Embedder] = None, nprobe: int = 16):
+        vector_dir = Path(vector_dir)
+        manifest = json.loads((vector_dir / "manifest.json").read_text(encoding="utf-8"))
+        self.store = store
+        self.books: list[dict] = manifest["books"]
+        self.embedder = embedder or load_embedder(manifest["embedder"])
+        if self.embedder.name != manifest["embedder"]:
+            raise ValueError(f"Index was built with {manifest['embedder']}, not {self.embedder.name}")
+        self.nprobe = nprobe
+
+        self.matrix = np.load(vector_dir / "vectors.npy", mmap_mode="r")
+        self.scales = np.load(vector_dir / "scales.npy", mmap_mode="r") if manifest["dtype"] == "int8" else None
+        docs = np.fromfile(vector_dir / "docs.bin", dtype=np.uint32).reshape(-1, DOC.size // 4)
+        self.doc_books = docs[:, 0].copy()
+        self.doc_sections = docs[:, 2:2 + MAX_DEPTH].copy()
+
+        self.centroids = self.ivf_order = self.ivf_offsets = None
+        if manifest.get("ivf_lists"):
+            self.centroids = np.load(vector_dir / "ivf_centroids.npy")
+            self.ivf_order = np.load(vector_dir / "ivf_order.npy", mmap_mode="r")
+            self.ivf_offsets = np.load(vector_dir / "ivf_offsets.npy")
+
+    def _book_mask(self, category: Optional[str]) -> Optional[np.ndarray]:
+        """Boolean mask over book slots whose categories include the category."""
+        if not category:
+            return None
+        wanted = category.casefold()
+        return np.array([
+            any(c.casefold() == wanted for c in book["categories"]) for book in self.books
+        ], dtype=bool)
+
+    def _top_k(self, candidate_rows: np.ndarray, query: np.ndarray, size: int) -> list[tuple[int, float]]:
+        """Score candidate rows in chunks and keep the best `size`."""
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(candidate_rows), SEARCH_CHUNK_ROWS):
+            rows = candidate_rows[start:start + SEARCH_CHUNK_ROWS]
+            scores = np.asarray(self.matrix[rows], dtype=np.float32) @ query
+            if self.scales is not None:
+                scores *= self.scales[rows]
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > size:
+                keep = np.argpartition(-best_scores, size)[:size]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        order = np.argsort(-best_scores)
+        return [(int(best_rows[i]), float(best_scores[i])) for i in order]
+
+    def search(self, query: str, size: int = 10, category: Optional[str] = None) -> dict:
+        """
+        Return the `size` segments most similar to the query, optionally within a category.
+
+        CPU-bound; call it through asyncio.to_thread from an event loop.
+        """
+        query_vector = self.embedder.embed([query])[0].astype(np.float32)
+
+        if self.centroids is not None:
+            probes = np.argsort(-(self.centroids @ query_vector))[:self.nprobe]
+            candidate_rows = np.sort(np.concatenate([
+                self.ivf_order[int(self.ivf_offsets[p]):int(self.ivf_offsets[p + 1])] for p in probes
+            ]).astype(np.int64))
+        else:
+            candidate_rows = np.arange(len(self.doc_books), dtype=np.int64)
+
+        mask = self._book_mask(category)
+        if mask is not None:
+            candidate_rows = candidate_rows[mask[self.doc_books[candidate_rows]]]
+
+        results = [self._result(row, score) for row, score in self._top_k(candidate_rows, query_vector, size)]
+        return {"query": query, "category": category, "results": results, "source": "local"}
+
+    def _result(self, row: int, score: float) -> dict:
+        """Describe one hit with its ref, categories and English text."""
+        book_info = self.books[int(self.doc_books[row])]
+        sections = [int(section) for section in self.doc_sections[row] if section]
+        result = {"ref": book_info["title"], "score": round(score, 4), "categories": book_info["categories"]}
+        book_id = self.store.find_book(book_info["title"])
+        if book_id is None:
+            return result
+        book = self.store.books[book_id]
+        result["ref"] = f"{book['title']} {format_address(sections, book['addressTypes'])}"
+        version_id = next(
+            (i for i, v in enumerate(book["versions"]) if v["versionTitle"] == book_info["versionTitle"]), None
+        )
+        if version_id is not None:
+            texts = self.store.segments(book_id, version_id, sections, sections)
+            if texts:
+                result["text"] = strip_html(texts[0][1])[:400]
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local semantic vector index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Embed the store's English segments")
+    build.add_argument("store_dir", type=Path)
+    build.add_argument("vector_dir", type=Path)
+    build.add_argument("--embedder", default="sentence-transformers:all-MiniLM-L6-v2")
+    build.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    build.add_argument("--ivf-lists", type=int, default=0, help="Train an IVF index with this many lists")
+
+    search = subparsers.add_parser("search", help="Run a query")
+    search.add_argument("store_dir", type=Path)
+    search.add_argument("vector_dir", type=Path)
+    search.add_argument("query")
+    search.add_argument("--size", type=int, default=10)
+    search.add_argument("--category")
+
+    args = parser.parse_args()
+    store = TextStore(args.store_dir)
+    if args.command == "build":
+        stats = build_vectors(store, args.vector_dir, load_embedder(args.embedder), args.dtype, args.ivf_lists)
+        print(json.dumps(stats, indent=2))
+    else:
+        index = VectorIndex(args.vector_dir, store)
+        print(json.dumps(index.search(args.query, args.size, args.category), ensure_ascii=False, indent=2))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
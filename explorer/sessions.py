@@ -0,0 +1,451 @@
+"""
+Session Store
+Keeps each chat session's persona, flags and message history outside the worker process
+
+cl.user_session only lives in the process that accepted the websocket, so
+a reconnect that lands on another worker (or a restarted one) would start
+over. The stores here hold the same state in memory, in a SQLite file in
+WAL mode shared by all workers on a host, or on a Redis-protocol server.
+History is stored one compact message per row or list entry and appended
+incrementally; it is only rewritten when the context window manager has
+trimmed or stubbed earlier messages.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from urllib.parse import unquote, urlsplit
+
+# Sessions untouched for this long are dropped by the persistent stores
+DEFAULT_TTL = 7 * 24 * 3600
+
+# Messages larger than this are zlib-compressed (tool results, mostly)
+COMPRESS_MIN_BYTES = 512
+
+# How many writes between expiry passes on the SQLite store
+PRUNE_INTERVAL = 500
+
+
+class SessionStoreError(RuntimeError):
+    """Raised when the backing store cannot be reached or rejects a command."""
+
+
+def encode_message(message: dict) -> bytes:
+    """Serialize a message as compact JSON, compressing large ones."""
+    data = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data, 6)
+    return b"j" + data
+
+
+def decode_message(data: bytes) -> dict:
+    """Reverse encode_message."""
+    if data[:1] == b"z":
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+class SessionStore:
+    """
+    Interface shared by the session backends.
+
+    load returns {"history": [...], **fields} or None for an unknown
+    session. update merges small JSON-serializable fields (persona,
+    needs_api_key); append adds messages to the end of the history and
+    replace swaps the whole history.
+    """
+
+    kind = "none"
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def update(self, session_id: str, **fields):
+        raise NotImplementedError
+
+    async def append(self, session_id: str, messages: list[dict]):
+        raise NotImplementedError
+
+    async def replace(self, session_id: str, messages: list[dict]):
+        raise NotImplementedError
+
+    async def delete(self, session_id: str):
+        raise NotImplementedError
+
+    async def close(self):
+        """Release connections; the default store holds none."""
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store, bounded to the most recently used max_sessions."""
+
+    kind = "memory"
+
+    def __init__(self, max_sessions: int = 10_000, ttl: float = DEFAULT_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, dict] = OrderedDict()
+        self.counters = {"loads": 0, "misses": 0, "appended": 0, "rewrites": 0}
+
+    def _entry(self, session_id: str) -> dict:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = {"fields": {}, "history": []}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        entry["updated_at"] = time.time()
+        return entry
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        self.counters["loads"] += 1
+        entry = self._sessions.get(session_id)
+        if entry is None or time.time() - entry["updated_at"] > self.ttl:
+            self.counters["misses"] += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        return {**entry["fields"], "history": list(entry["history"])}
+
+    async def update(self, session_id: str, **fields):
+        self._entry(session_id)["fields"].update(fields)
+
+    async def append(self, session_id: str, messages: list[dict]):
+        self._entry(session_id)["history"].extend(messages)
+        self.counters["appended"] += len(messages)
+
+    async def replace(self, session_id: str, messages: list[dict]):
+        self._entry(session_id)["history"] = list(messages)
+        self.counters["rewrites"] += 1
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {"backend": self.kind, "sessions": len(self._sessions), **self.counters}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite store in WAL mode, safe to share between worker processes.
+
+    Each message is one row keyed by (session, seq), so a turn only
+    inserts the messages it added. Queries run in a worker thread so a
+    locked or slow database never stalls the event loop.
+    """
+
+    kind = "sqlite"
+
+    def __init__(self, db_path: Path, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counters = {"loads": 0, "misses": 0, "appended": 0, "rewrites": 0}
+
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, fields TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, data BLOB NOT NULL, "
+            "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+
+    def _touch(self, session_id: str, fields: Optional[dict] = None):
+        """Create or refresh the session row, merging in fields."""
+        row = self._db.execute("SELECT fields FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        merged = json.loads(row[0]) if row else {}
+        if fields:
+            merged.update(fields)
+        self._db.execute(
+            "INSERT INTO sessions (id, fields, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET fields = excluded.fields, updated_at = excluded.updated_at",
+            (session_id, json.dumps(merged, ensure_ascii=False, separators=(",", ":")), time.time()),
+        )
+
+    def _write(self, work):
+        """Run work inside one write transaction, pruning expired sessions now and then."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                work()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+            if self._writes % PRUNE_INTERVAL == 0:
+                self.prune()
+
+    def _load(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            self.counters["loads"] += 1
+            row = self._db.execute(
+                "SELECT fields, updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.counters["misses"] += 1
+                return None
+            rows = self._db.execute(
+                "SELECT data FROM session_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return {**json.loads(row[0]), "history": [decode_message(data) for (data,) in rows]}
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._load, session_id)
+
+    async def update(self, session_id: str, **fields):
+        await asyncio.to_thread(self._write, lambda: self._touch(session_id, fields))
+
+    def _insert(self, session_id: str, messages: list[dict]):
+        start = self._db.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM session_messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+        self._db.executemany(
+            "INSERT INTO session_messages (session_id, seq, data) VALUES (?, ?, ?)",
+            [(session_id, start + offset, encode_message(message)) for offset, message in enumerate(messages)],
+        )
+
+    async def append(self, session_id: str, messages: list[dict]):
+        def work():
+            self._touch(session_id)
+            self._insert(session_id, messages)
+
+        await asyncio.to_thread(self._write, work)
+        self.counters["appended"] += len(messages)
+
+    async def replace(self, session_id: str, messages: list[dict]):
+        def work():
+            self._touch(session_id)
+            self._db.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._insert(session_id, messages)
+
+        await asyncio.to_thread(self._write, work)
+        self.counters["rewrites"] += 1
+
+    async def delete(self, session_id: str):
+        def work():
+            self._db.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+        await asyncio.to_thread(self._write, work)
+
+    def prune(self):
+        """Delete sessions idle for longer than the TTL (call with the lock held)."""
+        cutoff = time.time() - self.ttl
+        self._db.execute(
+            "DELETE FROM session_messages WHERE session_id IN (SELECT id FROM sessions WHERE updated_at < ?)",
+            (cutoff,),
+        )
+        self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": self.kind, "sessions": sessions, **self.counters}
+
+    def _close(self):
+        with self._lock:
+            self._db.close()
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+
+class RespClient:
+    """
+    Minimal asyncio client for the Redis protocol (RESP2).
+
+    Enough for the session store: pipelined commands over one connection,
+    AUTH and SELECT on connect, reconnecting after a failure. Any server
+    that speaks the protocol (Redis, Valkey, KeyDB, a local stand-in) works.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(args: tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif isinstance(arg, (int, float)):
+                arg = str(arg).encode("ascii")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            return SessionStoreError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise SessionStoreError(f"Unexpected reply: {line[:40]!r}")
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await self._roundtrip(setup)
+
+    async def _roundtrip(self, commands: list[tuple]) -> list:
+        self._writer.write(b"".join(self._encode(command) for command in commands))
+        await self._writer.drain()
+        replies = [await asyncio.wait_for(self._read_reply(), self.timeout) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, SessionStoreError):
+                raise reply
+        return replies
+
+    async def pipeline(self, *commands: tuple) -> list:
+        """Send commands in one write and return their replies in order."""
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._roundtrip(list(commands))
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                await self.close()
+                raise SessionStoreError(f"Session store at {self.host}:{self.port} unavailable: {e}") from e
+
+    async def close(self):
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Store on a Redis-protocol server, reachable from workers on any host.
+
+    Fields live in a hash and history in a list (RPUSH per turn), both
+    expiring after ttl seconds of inactivity.
+    """
+
+    kind = "redis"
+
+    def __init__(self, client: RespClient, ttl: float = DEFAULT_TTL, prefix: str = "sefaria:session:"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.counters = {"loads": 0, "misses": 0, "appended": 0, "rewrites": 0}
+
+    def _keys(self, session_id: str) -> tuple[str, str]:
+        return f"{self.prefix}{session_id}", f"{self.prefix}{session_id}:history"
+
+    def _expire(self, session_id: str) -> list[tuple]:
+        return [("EXPIRE", key, self.ttl) for key in self._keys(session_id)]
+
+    async def load(self, session_id: str) -> Optional[dict]:
+        self.counters["loads"] += 1
+        fields_key, history_key = self._keys(session_id)
+        flat, entries = await self.client.pipeline(("HGETALL", fields_key), ("LRANGE", history_key, 0, -1))
+        if not flat and not entries:
+            self.counters["misses"] += 1
+            return None
+        fields = {flat[i].decode("utf-8"): json.loads(flat[i + 1]) for i in range(0, len(flat), 2)}
+        return {**fields, "history": [decode_message(entry) for entry in entries]}
+
+    async def update(self, session_id: str, **fields):
+        pairs = []
+        for name, value in fields.items():
+            pairs += [name, json.dumps(value, ensure_ascii=False)]
+        await self.client.pipeline(("HSET", self._keys(session_id)[0], *pairs), *self._expire(session_id))
+
+    async def append(self, session_id: str, messages: list[dict]):
+        if not messages:
+            return
+        history_key = self._keys(session_id)[1]
+        await self.client.pipeline(
+            ("RPUSH", history_key, *(encode_message(message) for message in messages)),
+            *self._expire(session_id),
+        )
+        self.counters["appended"] += len(messages)
+
+    async def replace(self, session_id: str, messages: list[dict]):
+        history_key = self._keys(session_id)[1]
+        commands = [("MULTI",), ("DEL", history_key)]
+        if messages:
+            commands.append(("RPUSH", history_key, *(encode_message(message) for message in messages)))
+        commands += self._expire(session_id) + [("EXEC",)]
+        await self.client.pipeline(*commands)
+        self.counters["rewrites"] += 1
+
+    async def delete(self, session_id: str):
+        await self.client.pipeline(("DEL", *self._keys(session_id)))
+
+    def stats(self) -> dict:
+        return {"backend": self.kind, "server": f"{self.client.host}:{self.client.port}", **self.counters}
+
+    async def close(self):
+        await self.client.close()
+
+
+def open_session_store(url: str, ttl: float = DEFAULT_TTL) -> SessionStore:
+    """
+    Open a store from a URL: 'memory', 'sqlite:///path/to/sessions.sqlite3'
+    (or a bare path) or 'redis://[:password@]host[:port][/db]'.
+    """
+    if not url or url == "memory":
+        return MemorySessionStore(ttl=ttl)
+    if url.startswith(("redis://", "resp://")):
+        parts = urlsplit(url)
+        db = parts.path.strip("/")
+        client = RespClient(
+            parts.hostname or "127.0.0.1", parts.port or 6379, int(db) if db else 0,
+            unquote(parts.password) if parts.password else None,
+        )
+        return RedisSessionStore(client, ttl=ttl)
+    if url.startswith("sqlite://"):
+        url = url[len("sqlite://"):]
+    return SQLiteSessionStore(Path(url), ttl=ttl)
@@ -0,0 +1,49 @@
+"""
+Single-Flight Request Coalescing
+Concurrent identical lookups share one upstream call
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Deduplicates in-flight async calls by key.
+
+    The first caller for a key starts the upstream call in its own task.
+    Callers that arrive while it is running await the same task and receive
+    the same result, or the same exception. Cancelling one waiter (e.g. on a
+    per-call timeout) does not cancel the shared call for the others.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.upstream_calls = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable]):
+        """Run factory() once per key at a time and share its outcome."""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        """Drop a finished call and mark its exception retrieved if every waiter left."""
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Return call counters, including how many upstream calls were saved."""
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.upstream_calls,
+            "saved_calls": self.calls - self.upstream_calls,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,254 @@
+"""
+Telemetry
+Lightweight spans, Prometheus-format metrics and optional OTLP trace export
+
+Each span records its duration into a latency histogram labelled by span
+name and a few low-cardinality attributes, and adds its numeric
+attributes (tokens, bytes) to counters. When OpenTelemetry and its OTLP
+exporter are installed and an endpoint is configured, spans are also
+exported as traces. A disabled Telemetry hands out one shared no-op span,
+so instrumented code costs a method call.
+"""
+
+import contextvars
+import threading
+import time
+from typing import Callable, Iterable
+
+# Latency buckets in seconds, from local lookups up to long agent turns
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Span attributes that become metric labels (all must have few distinct values)
+LABEL_ATTRIBUTES = ("persona", "tool", "source", "model", "stream", "status", "error")
+
+# Numeric span attributes that are summed into counters
+COUNTER_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "cached_tokens", "response_bytes")
+
+
+def _escape(value) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: tuple) -> str:
+    """Render a sorted label tuple as {name="value",...}."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label set."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple = ()):
+        """Record one observation."""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        """Render in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by label set."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._series: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, labels: tuple = ()):
+        """Add to the counter."""
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        """Render in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._series.items())
+        lines += [f"{self.name}{_labels(labels)} {value}" for labels, value in snapshot]
+        return lines
+
+
+class Span:
+    """A timed operation with attributes; use as a context manager."""
+
+    __slots__ = ("telemetry", "name", "attributes", "started", "duration", "_token", "_otel", "_otel_scope")
+
+    def __init__(self, telemetry: "Telemetry", name: str, attributes: dict):
+        self.telemetry = telemetry
+        self.name = name
+        self.attributes = attributes
+        self.started = 0.0
+        self.duration = 0.0
+        self._token = None
+        self._otel = None
+        self._otel_scope = None
+
+    def set(self, **attributes):
+        """Add or replace attributes."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._token = _current_span.set(self)
+        if self.telemetry.tracer is not None:
+            from opentelemetry import trace
+
+            self._otel = self.telemetry.tracer.start_span(self.name)
+            self._otel_scope = trace.use_span(self._otel, end_on_exit=False)
+            self._otel_scope.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        _current_span.reset(self._token)
+        if exc_type is not None and "error" not in self.attributes:
+            self.attributes["error"] = exc_type.__name__
+        self.telemetry.record(self)
+        if self._otel is not None:
+            self._otel_scope.__exit__(exc_type, exc, tb)
+            for key, value in self.attributes.items():
+                if isinstance(value, (str, bool, int, float)):
+                    self._otel.set_attribute(key, value)
+            if exc is not None:
+                self._otel.record_exception(exc)
+            self._otel.end()
+        return False
+
+
+class _NoopSpan:
+    """Span stand-in used when telemetry is off."""
+
+    __slots__ = ()
+    attributes: dict = {}
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("telemetry_span", default=NOOP_SPAN)
+
+
+class Telemetry:
+    """
+    Span factory and metrics registry.
+
+    Collectors registered with add_collector() contribute extra metric
+    lines (e.g. cache counters) when the registry is rendered.
+    """
+
+    def __init__(self, enabled: bool = True, prefix: str = "sefaria",
+                 otlp_endpoint: str = "", service_name: str = "sefaria-explorer"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.durations = Histogram(f"{prefix}_span_duration_seconds", "Duration of instrumented operations")
+        self.errors = Counter(f"{prefix}_span_errors_total", "Instrumented operations that raised or failed")
+        self.counters = {
+            name: Counter(f"{prefix}_{name}_total", f"Sum of the {name.replace('_', ' ')} span attribute")
+            for name in COUNTER_ATTRIBUTES
+        }
+        self._collectors: list[Callable[[], Iterable[str]]] = []
+        self.tracer = self._start_tracer(otlp_endpoint, service_name) if enabled and otlp_endpoint else None
+
+    @staticmethod
+    def _start_tracer(endpoint: str, service_name: str):
+        """Set up OTLP/HTTP trace export, or return None if OpenTelemetry is not installed."""
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError as e:
+            print(f"OTLP trace export disabled, missing dependency: {e}")
+            return None
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+        return provider.get_tracer("explorer.telemetry")
+
+    def span(self, name: str, **attributes):
+        """Start a span (a no-op when telemetry is disabled)."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    @staticmethod
+    def current():
+        """Return the innermost active span (the no-op span outside any span)."""
+        return _current_span.get()
+
+    def record(self, span: Span):
+        """Fold a finished span into the metrics."""
+        attributes = span.attributes
+        labels = tuple(sorted(
+            (key, attributes[key]) for key in LABEL_ATTRIBUTES if attributes.get(key) is not None
+        ))
+        self.durations.observe(span.duration, (("span", span.name),) + labels)
+        if "error" in attributes:
+            self.errors.inc(1, (("error", attributes["error"]), ("span", span.name)))
+        for name in COUNTER_ATTRIBUTES:
+            value = attributes.get(name)
+            if value:
+                self.counters[name].inc(value, (("span", span.name),) + labels)
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """Register a callable returning extra Prometheus text lines."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = self.durations.render() + self.errors.render()
+        for counter in self.counters.values():
+            lines += counter.render()
+        for collector in self._collectors:
+            try:
+                lines += list(collector())
+            except Exception as e:
+                lines.append(f"# collector failed: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, help_text: str, series: Iterable[tuple[dict, float]], kind: str = "gauge") -> list[str]:
+    """Render one metric family from (labels, value) pairs, for collectors."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in series:
+        lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+    return lines
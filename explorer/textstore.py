@@ -0,0 +1,340 @@
+"""
+Local Text Store
+Compact, memory-mapped store of Sefaria texts built from the Sefaria-Export dump
+
+Layout of a store directory:
+    manifest.json  books, their versions and addressing
+    segments.bin   UTF-8 text of every segment, concatenated
+    index.bin      fixed-width records sorted by (book, version, sections)
+
+Usage:
+    python -m explorer.textstore build <Sefaria-Export dir> <store dir> [--languages he en]
+    python -m explorer.textstore get <store dir> "Genesis 1:1-3" [--version both]
+"""
+
+import argparse
+import json
+import mmap
+import struct
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .refs import split_ref, parse_range, format_address, format_hebrew_address
+
+# book, version, three section numbers (0 when unused), offset, length
+RECORD = struct.Struct("<IH2xIIIQI")
+KEY = struct.Struct("<IH2xIII")
+MAX_DEPTH = 3
+MAX_SECTION = 0xFFFFFFFF
+
+LANGUAGE_DIRS = {"Hebrew": "he", "English": "en"}
+VERSION_LANGUAGES = {"source": ("he",), "english": ("en",), "both": ("he", "en")}
+
+
+def _iter_segments(text, prefix: tuple = ()) -> Iterator[tuple[tuple, str]]:
+    """Yield (1-based sections, segment text) for a nested Sefaria text array."""
+    for index, item in enumerate(text, start=1):
+        if isinstance(item, list):
+            yield from _iter_segments(item, prefix + (index,))
+        elif isinstance(item, str) and item:
+            yield prefix + (index,), item
+
+
+def _text_depth(text) -> int:
+    """Return the nesting depth of a text array."""
+    depth = 0
+    while isinstance(text, list):
+        depth += 1
+        text = next((item for item in text if item), None)
+    return depth
+
+
+def _load_schema(export_dir: Path, title: str) -> dict:
+    """Load a book's schema from the export, or an empty dict."""
+    path = export_dir / "schemas" / f"{title.replace(' ', '_')}.json"
+    if not path.exists():
+        path = export_dir / "schemas" / f"{title}.json"
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+
+
+def build_store(export_dir: Path, store_dir: Path, languages: tuple = ("he", "en"),
+                all_versions: bool = False, titles: Optional[set] = None) -> dict:
+    """
+    Build a text store from a Sefaria-Export checkout.
+
+    Reads json/<categories>/<title>/<Language>/merged.json (and every version
+    file when all_versions is set). Texts with a complex (non-array) schema
+    are skipped. Returns build statistics.
+    """
+    export_dir, store_dir = Path(export_dir), Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    books: list[dict] = []
+    book_ids: dict[str, int] = {}
+    chunks: list[tuple[int, int, bytes]] = []
+    stats = {"files": 0, "segments": 0, "skipped_complex": 0}
+
+    pattern = "*.json" if all_versions else "merged.json"
+    with open(store_dir / "segments.bin", "wb") as segments_file:
+        offset = 0
+        for path in sorted((export_dir / "json").rglob(pattern)):
+            language = LANGUAGE_DIRS.get(path.parent.name)
+            if language not in languages:
+                continue
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                continue
+            title = data.get("title") or path.parent.parent.name
+            if titles and title not in titles:
+                continue
+            text = data.get("text")
+            if not isinstance(text, list):
+                stats["skipped_complex"] += 1
+                continue
+
+            # Register the book the first time any of its versions is seen
+            if title not in book_ids:
+                schema = _load_schema(export_dir, title)
+                node = schema.get("schema", {})
+                categories = schema.get("categories") or list(path.relative_to(export_dir / "json").parts[:-3])
+                depth = min(_text_depth(text), MAX_DEPTH)
+                address_types = node.get("addressTypes") or (
+                    ["Talmud"] + ["Integer"] * (depth - 1) if "Bavli" in categories else ["Integer"] * depth
+                )
+                book_ids[title] = len(books)
+                books.append({
+                    "title": title,
+                    "heTitle": schema.get("heTitle") or node.get("heTitle", ""),
+                    "categories": categories,
+                    "sectionNames": node.get("sectionNames") or [],
+                    "addressTypes": address_types,
+                    "depth": depth,
+                    "titleVariants": [t["text"] for t in node.get("titles", []) if t.get("text") and t["text"] != title],
+                    "versions": [],
+                })
+            book_id = book_ids[title]
+            book = books[book_id]
+            version_id = len(book["versions"])
+            book["versions"].append({
+                "language": language,
+                "versionTitle": data.get("versionTitle") or path.stem,
+            })
+
+            # Segments of one version come out in address order, so each chunk is sorted
+            records = bytearray()
+            for sections, segment in _iter_segments(text):
+                if len(sections) > MAX_DEPTH:
+                    continue
+                encoded = segment.encode("utf-8")
+                padded = sections + (0,) * (MAX_DEPTH - len(sections))
+                records += RECORD.pack(book_id, version_id, *padded, offset, len(encoded))
+                segments_file.write(encoded)
+                offset += len(encoded)
+                stats["segments"] += 1
+            chunks.append((book_id, version_id, bytes(records)))
+            stats["files"] += 1
+
+    with open(store_dir / "index.bin", "wb") as index_file:
+        for _, _, records in sorted(chunks, key=lambda chunk: (chunk[0], chunk[1])):
+            index_file.write(records)
+
+    manifest = {"format": 1, "books": books, "segments": stats["segments"]}
+    (store_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    stats["books"] = len(books)
+    return stats
+
+
+class TextStore:
+    """
+    Read-only view of a built text store.
+
+    The segment text and the index are memory-mapped, so resident memory
+    stays small and lookups are a binary search over fixed-width records.
+    """
+
+    def __init__(self, store_dir: Path):
+        store_dir = Path(store_dir)
+        manifest = json.loads((store_dir / "manifest.json").read_text(encoding="utf-8"))
+        self.books: list[dict] = manifest["books"]
+        self.titles: dict[str, int] = {}
+        for book_id, book in enumerate(self.books):
+            for title in [book["title"], book.get("heTitle", "")] + book.get("titleVariants", []):
+                if title:
+                    self.titles.setdefault(title.casefold(), book_id)
+
+        self._segments_file = open(store_dir / "segments.bin", "rb")
+        self._index_file = open(store_dir / "index.bin", "rb")
+        self._segments = self._mmap(self._segments_file)
+        self._index = self._mmap(self._index_file)
+        self.record_count = len(self._index) // RECORD.size if self._index else 0
+
+    @staticmethod
+    def _mmap(file) -> Optional[mmap.mmap]:
+        """Memory-map a file read-only (None for an empty file)."""
+        if Path(file.name).stat().st_size == 0:
+            return None
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def find_book(self, title: str) -> Optional[int]:
+        """Return the book id for a title or title variant."""
+        return self.titles.get(title.casefold())
+
+    def _lower_bound(self, key: tuple) -> int:
+        """Index of the first record whose key is >= key."""
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self._index, middle * RECORD.size) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def segments(self, book_id: int, version_id: int, start: list[int], end: list[int]) -> list[tuple[tuple, str]]:
+        """Return (sections, text) for every segment of a version between start and end."""
+        if self._index is None:
+            return []
+        low_key = (book_id, version_id, *(start + [0] * (MAX_DEPTH - len(start))))
+        high_key = (book_id, version_id, *(end + [MAX_SECTION] * (MAX_DEPTH - len(end))))
+        results = []
+        index = self._lower_bound(low_key)
+        while index < self.record_count:
+            record = RECORD.unpack_from(self._index, index * RECORD.size)
+            if record[:5] > high_key:
+                break
+            offset, length = record[5], record[6]
+            results.append((record[2:5], self._segments[offset:offset + length].decode("utf-8")))
+            index += 1
+        return results
+
+    def first_section(self, book_id: int) -> list[int]:
+        """Return the address of a book's first section in any version ([] for a single-section book)."""
+        depth = self.books[book_id]["depth"]
+        first = None
+        for version_id in range(len(self.books[book_id]["versions"])):
+            index = self._lower_bound((book_id, version_id, 0, 0, 0))
+            if self._index is None or index >= self.record_count:
+                continue
+            key = KEY.unpack_from(self._index, index * RECORD.size)
+            if key[:2] == (book_id, version_id):
+                sections = list(key[2:1 + depth])
+                first = sections if first is None else min(first, sections)
+        return first or []
+
+    def resolve(self, reference: str) -> Optional[tuple[int, list[int], list[int]]]:
+        """Resolve a ref to (book id, start sections, end sections)."""
+        title, start, end = split_ref(reference)
+        book_id = self.find_book(title)
+        if book_id is None:
+            return None
+        if start is None:
+            # Like the Sefaria API, a bare title means the book's first section
+            first = self.first_section(book_id)
+            return book_id, first, list(first)
+        address_types = self.books[book_id]["addressTypes"]
+        try:
+            start_sections, end_sections = parse_range(start, end, address_types)
+        except ValueError:
+            return None
+        # A bare daf ("Berakhot 2") covers both amudim
+        if address_types[:1] == ["Talmud"] and start.isdigit() and (end is None or end.isdigit()):
+            end_sections[0] += 1
+        return book_id, start_sections, end_sections
+
+    def get_text(self, reference: str, version_language: Optional[str] = None) -> Optional[dict]:
+        """
+        Return a v3-texts-shaped response for a ref, or None if it is not in the store.
+
+        version_language is 'source', 'english', 'both' or None for all versions.
+        """
+        resolved = self.resolve(reference)
+        if resolved is None:
+            return None
+        book_id, start, end = resolved
+        book = self.books[book_id]
+        if len(start) > book["depth"]:
+            return None
+
+        wanted = VERSION_LANGUAGES.get(version_language)
+        versions = []
+        seen_languages = set()
+        for version_id, version in enumerate(book["versions"]):
+            language = version["language"]
+            if wanted is not None and (language not in wanted or language in seen_languages):
+                continue
+            segments = self.segments(book_id, version_id, start, end)
+            if not segments:
+                continue
+            seen_languages.add(language)
+            texts = [text for _, text in segments]
+            versions.append({
+                "language": language,
+                "versionTitle": version["versionTitle"],
+                "direction": "rtl" if language == "he" else "ltr",
+                "text": texts[0] if len(texts) == 1 and start and len(start) == book["depth"] and start == end else texts,
+            })
+        if not versions:
+            return None
+
+        address_types = book["addressTypes"]
+        ref = book["title"]
+        he_ref = book.get("heTitle") or ""
+        if start:
+            ref += " " + format_address(start, address_types)
+            he_ref += " " + format_hebrew_address(start, address_types)
+            if end != start:
+                ref += "-" + format_address(end, address_types)
+                he_ref += "-" + format_hebrew_address(end, address_types)
+        return {
+            "ref": ref,
+            "heRef": he_ref.strip(),
+            "indexTitle": book["title"],
+            "categories": book["categories"],
+            "versions": versions,
+            "source": "local",
+        }
+
+    def close(self):
+        """Release the memory maps and files."""
+        for mapped in (self._segments, self._index):
+            if mapped is not None:
+                mapped.close()
+        self._segments_file.close()
+        self._index_file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local Sefaria text store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Ingest a Sefaria-Export checkout")
+    build.add_argument("export_dir", type=Path)
+    build.add_argument("store_dir", type=Path)
+    build.add_argument("--languages", nargs="+", default=["he", "en"])
+    build.add_argument("--all-versions", action="store_true", help="Ingest every version, not just merged.json")
+    build.add_argument("--titles", nargs="+", help="Only ingest these book titles")
+
+    get = subparsers.add_parser("get", help="Look up a ref")
+    get.add_argument("store_dir", type=Path)
+    get.add_argument("reference")
+    get.add_argument("--version", choices=list(VERSION_LANGUAGES))
+
+    args = parser.parse_args()
+    if args.command == "build":
+        stats = build_store(args.export_dir, args.store_dir, tuple(args.languages),
+                            args.all_versions, set(args.titles) if args.titles else None)
+        print(json.dumps(stats, indent=2))
+    else:
+        store = TextStore(args.store_dir)
+        print(json.dumps(store.get_text(args.reference, args.version), ensure_ascii=False, indent=2))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Built-in Book Titles
+Canonical Sefaria titles, Hebrew titles and common aliases for Tanakh and the Babylonian Talmud
+"""
+
+# (canonical title, Hebrew title, aliases)
+TANAKH_BOOKS = [
+    ("Genesis", "בראשית", ["Bereishit", "Bereshit", "Beresheet", "Bereishis", "Gen", "Gn"]),
+    ("Exodus", "שמות", ["Shemot", "Shemos", "Exod", "Ex"]),
+    ("Leviticus", "ויקרא", ["Vayikra", "Lev", "Lv"]),
+    ("Numbers", "במדבר", ["Bamidbar", "Bemidbar", "Num", "Nm"]),
+    ("Deuteronomy", "דברים", ["Devarim", "Deut", "Dt"]),
+    ("Joshua", "יהושע", ["Yehoshua", "Josh"]),
+    ("Judges", "שופטים", ["Shoftim", "Judg"]),
+    ("I Samuel", "שמואל א", ["1 Samuel", "Samuel I", "Shmuel I", "Shmuel Alef", "1 Sam", "I Sam"]),
+    ("II Samuel", "שמואל ב", ["2 Samuel", "Samuel II", "Shmuel II", "Shmuel Bet", "2 Sam", "II Sam"]),
+    ("I Kings", "מלכים א", ["1 Kings", "Kings I", "Melachim I", "Melakhim I", "1 Kgs"]),
+    ("II Kings", "מלכים ב", ["2 Kings", "Kings II", "Melachim II", "Melakhim II", "2 Kgs"]),
+    ("Isaiah", "ישעיהו", ["Yeshayahu", "Yeshaya", "Isa"]),
+    ("Jeremiah", "ירמיהו", ["Yirmiyahu", "Yirmiya", "Jer"]),
+    ("Ezekiel", "יחזקאל", ["Yechezkel", "Ezek"]),
+    ("Hosea", "הושע", ["Hoshea", "Hos"]),
+    ("Joel", "יואל", ["Yoel"]),
+    ("Amos", "עמוס", []),
+    ("Obadiah", "עובדיה", ["Ovadia", "Ovadiah", "Obad"]),
+    ("Jonah", "יונה", ["Yonah", "Jon"]),
+    ("Micah", "מיכה", ["Michah", "Mic"]),
+    ("Nahum", "נחום", ["Nachum", "Nah"]),
+    ("Habakkuk", "חבקוק", ["Chavakuk", "Hab"]),
+    ("Zephaniah", "צפניה", ["Tzefaniah", "Zeph"]),
+    ("Haggai", "חגי", ["Chaggai", "Hag"]),
+    ("Zechariah", "זכריה", ["Zecharia", "Zech"]),
+    ("Malachi", "מלאכי", ["Mal"]),
+    ("Psalms", "תהלים", ["Tehillim", "Tehilim", "Psalm", "Ps", "Psa"]),
+    ("Proverbs", "משלי", ["Mishlei", "Mishle", "Prov"]),
+    ("Job", "איוב", ["Iyov", "Iyyov"]),
+    ("Song of Songs", "שיר השירים", ["Shir HaShirim", "Song of Solomon", "Canticles", "Song"]),
+    ("Ruth", "רות", ["Rut"]),
+    ("Lamentations", "איכה", ["Eichah", "Eicha", "Eikhah", "Lam"]),
+    ("Ecclesiastes", "קהלת", ["Kohelet", "Koheles", "Qohelet", "Eccl", "Eccles"]),
+    ("Esther", "אסתר", ["Ester", "Est"]),
+    ("Daniel", "דניאל", ["Dan"]),
+    ("Ezra", "עזרא", []),
+    ("Nehemiah", "נחמיה", ["Nechemiah", "Neh"]),
+    ("I Chronicles", "דברי הימים א", ["1 Chronicles", "Chronicles I", "Divrei HaYamim I", "1 Chr"]),
+    ("II Chronicles", "דברי הימים ב", ["2 Chronicles", "Chronicles II", "Divrei HaYamim II", "2 Chr"]),
+]
+
+BAVLI_TRACTATES = [
+    ("Berakhot", "ברכות", ["Brachot", "Berachot", "Brachos", "Berachos", "Brakhot"]),
+    ("Shabbat", "שבת", ["Shabbos", "Shabbath"]),
+    ("Eruvin", "עירובין", ["Eiruvin"]),
+    ("Pesachim", "פסחים", ["Pesahim"]),
+    ("Yoma", "יומא", []),
+    ("Sukkah", "סוכה", ["Succah", "Sukka"]),
+    ("Beitzah", "ביצה", ["Beitza", "Beitsah", "Betzah"]),
+    ("Rosh Hashanah", "ראש השנה", ["Rosh HaShanah", "Rosh Hashana"]),
+    ("Taanit", "תענית", ["Ta'anit", "Taanis"]),
+    ("Megillah", "מגילה", ["Megilla"]),
+    ("Moed Katan", "מועד קטן", ["Mo'ed Katan"]),
+    ("Chagigah", "חגיגה", ["Hagigah", "Chagiga"]),
+    ("Yevamot", "יבמות", ["Yevamos", "Yebamot"]),
+    ("Ketubot", "כתובות", ["Ketubos", "Kesubos", "Kethuboth"]),
+    ("Nedarim", "נדרים", []),
+    ("Nazir", "נזיר", []),
+    ("Sotah", "סוטה", ["Sota"]),
+    ("Gittin", "גיטין", []),
+    ("Kiddushin", "קידושין", ["Qiddushin"]),
+    ("Bava Kamma", "בבא קמא", ["Baba Kamma", "Bava Kama", "Baba Qamma"]),
+    ("Bava Metzia", "בבא מציעא", ["Baba Metzia", "Bava Metsia", "Baba Mezia"]),
+    ("Bava Batra", "בבא בתרא", ["Baba Batra", "Bava Basra", "Baba Bathra"]),
+    ("Sanhedrin", "סנהדרין", []),
+    ("Makkot", "מכות", ["Makkos", "Makot"]),
+    ("Shevuot", "שבועות", ["Shevuos", "Shevuoth"]),
+    ("Avodah Zarah", "עבודה זרה", ["Avoda Zara", "Avodah Zara"]),
+    ("Horayot", "הוריות", ["Horayos"]),
+    ("Zevachim", "זבחים", ["Zevahim"]),
+    ("Menachot", "מנחות", ["Menachos", "Menahot"]),
+    ("Chullin", "חולין", ["Hullin", "Chulin"]),
+    ("Bekhorot", "בכורות", ["Bechorot", "Bechoros", "Bekhoroth"]),
+    ("Arakhin", "ערכין", ["Arachin"]),
+    ("Temurah", "תמורה", []),
+    ("Keritot", "כריתות", ["Kerisos", "Kritot"]),
+    ("Meilah", "מעילה", ["Me'ilah"]),
+    ("Tamid", "תמיד", []),
+    ("Niddah", "נדה", ["Nidah", "Nida"]),
+]
+
+
+def builtin_books() -> list[dict]:
+    """Return the built-in books in the same shape as text store manifest entries."""
+    books = []
+    for title, he_title, aliases in TANAKH_BOOKS:
+        books.append({
+            "title": title,
+            "heTitle": he_title,
+            "titleVariants": aliases,
+            "categories": ["Tanakh"],
+            "addressTypes": ["Integer", "Integer"],
+        })
+    for title, he_title, aliases in BAVLI_TRACTATES:
+        books.append({
+            "title": title,
+            "heTitle": he_title,
+            "titleVariants": aliases,
+            "categories": ["Talmud", "Bavli"],
+            "addressTypes": ["Talmud", "Integer"],
+        })
+    return books
@@ -0,0 +1,270 @@
+"""
+Local Topic Store
+SQLite store of Sefaria topics with precomputed, ranked topic→ref and topic→topic indexes
+
+The store is built from topic payloads in the shape of
+/api/topics/{slug}?with_links=1&with_refs=1, either a JSON-lines file or a
+directory of .json files. `download` fetches them from the live API.
+
+Usage:
+    python -m explorer.topics download data/topics.jsonl [--slugs sabbath moses]
+    python -m explorer.topics build data/topics.jsonl data/topics.sqlite3
+    python -m explorer.topics get data/topics.sqlite3 sabbath --refs --page 2
+"""
+
+import argparse
+import asyncio
+import json
+import sqlite3
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .refs import TitleTrie, normalize_title
+
+SEFARIA_BASE = "https://www.sefaria.org"
+
+# Sefaria's ranking signals for a topic's refs and related topics, strongest first
+RANK_FIELDS = ("curatedPrimacy", "linkScore", "pr", "numDatasource", "tfidf")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+SCHEMA = (
+    "CREATE TABLE topics (slug TEXT PRIMARY KEY, title_en TEXT, title_he TEXT, "
+    "description_en TEXT, description_he TEXT, num_sources INTEGER)",
+    "CREATE TABLE topic_titles (title TEXT NOT NULL, slug TEXT NOT NULL)",
+    "CREATE TABLE topic_refs (slug TEXT NOT NULL, ref_type TEXT NOT NULL, rank INTEGER NOT NULL, "
+    "ref TEXT NOT NULL, PRIMARY KEY (slug, ref_type, rank)) WITHOUT ROWID",
+    "CREATE TABLE topic_links (slug TEXT NOT NULL, link_type TEXT NOT NULL, rank INTEGER NOT NULL, "
+    "topic TEXT NOT NULL, PRIMARY KEY (slug, link_type, rank)) WITHOUT ROWID",
+)
+
+
+def _rank_value(value) -> float:
+    """Turn one ranking signal (a number or a per-language dict) into a number."""
+    if isinstance(value, dict):
+        value = max((v for v in value.values() if isinstance(v, (int, float))), default=0)
+    return float(value) if isinstance(value, (int, float)) else 0.0
+
+
+def rank_items(items: list) -> list[dict]:
+    """Order refs or topic links by Sefaria's ranking signals, keeping the given order for ties."""
+    ranked = [
+        (tuple(-_rank_value((item.get("order") or {}).get(field)) for field in RANK_FIELDS), position, item)
+        for position, item in enumerate(items) if isinstance(item, dict)
+    ]
+    return [item for _, _, item in sorted(ranked, key=lambda entry: entry[:2])]
+
+
+def _iter_payloads(source: Path) -> Iterator[dict]:
+    """Yield topic payloads from a JSON-lines file or a directory of JSON files."""
+    paths = sorted(source.rglob("*.json")) if source.is_dir() else [source]
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            if path.suffix == ".json":
+                data = json.load(file)
+                yield from data if isinstance(data, list) else [data]
+                continue
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def build_topic_store(source: Path, db_path: Path) -> dict:
+    """Build a topic store from downloaded topic payloads. Returns build statistics."""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    if db_path.exists():
+        db_path.unlink()
+    db = sqlite3.connect(str(db_path))
+    for statement in SCHEMA:
+        db.execute(statement)
+    stats = {"topics": 0, "refs": 0, "links": 0}
+
+    for data in _iter_payloads(Path(source)):
+        slug = data.get("slug")
+        if not slug:
+            continue
+        titles = {title.get("lang"): title.get("text") for title in data.get("titles", []) if title.get("primary")}
+        description = data.get("description") if isinstance(data.get("description"), dict) else {}
+        db.execute(
+            "INSERT OR REPLACE INTO topics VALUES (?, ?, ?, ?, ?, ?)",
+            (slug, titles.get("en"), titles.get("he"), description.get("en"), description.get("he"), data.get("numSources")),
+        )
+        db.executemany(
+            "INSERT INTO topic_titles VALUES (?, ?)",
+            [(title["text"], slug) for title in data.get("titles", []) if title.get("text")],
+        )
+
+        for ref_type, group in (data.get("refs") or {}).items():
+            if not isinstance(group, dict):
+                continue
+            refs = [item["ref"] for item in rank_items(group.get("refs", [])) if item.get("ref") and not item.get("is_sheet")]
+            db.executemany("INSERT INTO topic_refs VALUES (?, ?, ?, ?)",
+                           [(slug, ref_type, rank, ref) for rank, ref in enumerate(refs)])
+            stats["refs"] += len(refs)
+
+        for link_type, group in (data.get("links") or {}).items():
+            if not isinstance(group, dict):
+                continue
+            topics = [item["topic"] for item in rank_items(group.get("links", [])) if item.get("topic")]
+            db.executemany("INSERT INTO topic_links VALUES (?, ?, ?, ?)",
+                           [(slug, link_type, rank, topic) for rank, topic in enumerate(topics)])
+            stats["links"] += len(topics)
+        stats["topics"] += 1
+
+    db.commit()
+    db.close()
+    return stats
+
+
+class TopicStore:
+    """
+    Read-only view of a built topic store.
+
+    Refs and related topics are stored pre-ranked, so a page is a primary
+    key range scan. Slugs and titles are loaded into a trie for autocomplete.
+    """
+
+    def __init__(self, db_path: Path):
+        self._db = sqlite3.connect(f"file:{Path(db_path)}?mode=ro", uri=True, check_same_thread=False)
+        self.trie = TitleTrie()
+        for slug, title_en, title_he in self._db.execute("SELECT slug, title_en, title_he FROM topics"):
+            for title in (slug.replace("-", " "), title_en, title_he):
+                if title:
+                    self.trie.insert(normalize_title(title), slug)
+        for title, slug in self._db.execute("SELECT title, slug FROM topic_titles"):
+            self.trie.insert(normalize_title(title), slug)
+
+    def find_slug(self, name: str) -> Optional[str]:
+        """Return the slug for a slug or topic title."""
+        row = self._db.execute("SELECT slug FROM topics WHERE slug = ?", (name,)).fetchone()
+        if row:
+            return row[0]
+        return self.trie.get(normalize_title(name.replace("-", " ")))
+
+    def title(self, slug: str) -> str:
+        """Return a topic's display title, falling back to its slug."""
+        row = self._db.execute("SELECT title_en, title_he FROM topics WHERE slug = ?", (slug,)).fetchone()
+        return row[0] or row[1] or slug if row else slug
+
+    def complete(self, prefix: str, limit: int = 10) -> list[dict]:
+        """Autocomplete topic slugs and titles."""
+        slugs = self.trie.complete(normalize_title(prefix.replace("-", " ")), limit)
+        return [{"slug": slug, "title": self.title(slug)} for slug in slugs]
+
+    def _page(self, table: str, column: str, type_column: str, slug: str, offset: int, size: int) -> tuple[dict, dict]:
+        """Return one page of each group of a ranked index, plus group sizes."""
+        totals = dict(self._db.execute(
+            f"SELECT {type_column}, COUNT(*) FROM {table} WHERE slug = ? GROUP BY {type_column}", (slug,)
+        ).fetchall())
+        page = {}
+        for group in totals:
+            page[group] = [row[0] for row in self._db.execute(
+                f"SELECT {column} FROM {table} WHERE slug = ? AND {type_column} = ? AND rank >= ? AND rank < ? ORDER BY rank",
+                (slug, group, offset, offset + size),
+            )]
+        return page, totals
+
+    def get_topic(self, slug: str, with_links: bool = False, with_refs: bool = False,
+                  page: int = 1, page_size: int = DEFAULT_PAGE_SIZE) -> Optional[dict]:
+        """
+        Return a topic in the projected get_topic_details shape, or None if unknown.
+
+        Refs and related topics are paginated per group in ranked order.
+        """
+        slug = self.find_slug(slug)
+        if slug is None:
+            return None
+        row = self._db.execute("SELECT * FROM topics WHERE slug = ?", (slug,)).fetchone()
+        _, title_en, title_he, description_en, description_he, num_sources = row
+        topic = {"slug": slug}
+        if num_sources:
+            topic["numSources"] = num_sources
+        if title_en:
+            topic["title_en"] = title_en
+        if title_he:
+            topic["title_he"] = title_he
+        description = {key: value for key, value in (("en", description_en), ("he", description_he)) if value}
+        if description:
+            topic["description"] = description
+
+        page = max(1, int(page))
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        offset = (page - 1) * page_size
+        has_more = False
+        if with_links:
+            topic["links"], totals = self._page("topic_links", "topic", "link_type", slug, offset, page_size)
+            has_more |= any(total > offset + page_size for total in totals.values())
+        if with_refs:
+            topic["refs"], totals = self._page("topic_refs", "ref", "ref_type", slug, offset, page_size)
+            topic["ref_counts"] = totals
+            has_more |= any(total > offset + page_size for total in totals.values())
+        if with_links or with_refs:
+            topic["page"] = {"page": page, "page_size": page_size, "has_more": has_more}
+        topic["source"] = "local"
+        return topic
+
+    def close(self):
+        """Close the SQLite connection."""
+        self._db.close()
+
+
+async def download(output: Path, slugs: Optional[list[str]] = None, concurrency: int = 8):
+    """Fetch topic payloads with links and refs from the live API into a JSON-lines file."""
+    import httpx
+
+    async with httpx.AsyncClient(base_url=SEFARIA_BASE, timeout=60.0) as http_client:
+        if not slugs:
+            response = await http_client.get("/api/topics", params={"limit": 0})
+            slugs = [topic["slug"] for topic in response.json() if topic.get("slug")]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(slug: str) -> Optional[dict]:
+            async with semaphore:
+                response = await http_client.get(f"/api/topics/{slug}", params={"with_links": 1, "with_refs": 1})
+                return response.json() if response.status_code == 200 else None
+
+        payloads = await asyncio.gather(*(fetch(slug) for slug in slugs))
+
+    with open(output, "w", encoding="utf-8") as file:
+        for payload in payloads:
+            if payload:
+                file.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    print(f"Downloaded {sum(1 for payload in payloads if payload)} of {len(slugs)} topics to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local Sefaria topic store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch = subparsers.add_parser("download", help="Download topic payloads from the Sefaria API")
+    fetch.add_argument("output", type=Path)
+    fetch.add_argument("--slugs", nargs="+", help="Only these topics (default: all)")
+
+    build = subparsers.add_parser("build", help="Build the store from downloaded payloads")
+    build.add_argument("source", type=Path)
+    build.add_argument("db_path", type=Path)
+
+    get = subparsers.add_parser("get", help="Look up a topic")
+    get.add_argument("db_path", type=Path)
+    get.add_argument("slug")
+    get.add_argument("--links", action="store_true")
+    get.add_argument("--refs", action="store_true")
+    get.add_argument("--page", type=int, default=1)
+    get.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+
+    args = parser.parse_args()
+    if args.command == "download":
+        asyncio.run(download(args.output, args.slugs))
+    elif args.command == "build":
+        print(json.dumps(build_topic_store(args.source, args.db_path), indent=2))
+    else:
+        store = TopicStore(args.db_path)
+        result = store.get_topic(args.slug, args.links, args.refs, args.page, args.page_size)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Multi-Process Launcher
+Runs several Chainlit workers behind one port with sticky sessions
+
+Each worker is a separate `chainlit run app.py` process on a loopback
+port, so turns are spread over several event loops and cores. A small
+proxy on the public port pins each browser to one worker with a cookie,
+which keeps Socket.IO polling and websocket traffic for a session on the
+process that holds it. Workers share the SQLite tool cache and a session
+store, so if a worker dies its clients are moved to another one and
+their conversations resume.
+
+Usage:
+    python launcher.py --workers 4 --port 9101
+    curl http://localhost:9101/launcher/health
+
+SIGINT/SIGTERM drain: the proxy stops accepting connections, workers stop
+starting new turns (SIGUSR1), in-flight turns get up to --drain-timeout
+seconds to finish and then the workers are stopped.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+APP_DIR = Path(__file__).parent
+
+# Cookie that pins a browser to a worker
+STICKY_COOKIE = "sefaria_worker"
+
+# Largest request or response head the proxy will parse
+MAX_HEAD_BYTES = 64 * 1024
+
+# Seconds between health checks, and failed checks before a worker is taken out of rotation
+HEALTH_INTERVAL = 2.0
+UNHEALTHY_AFTER = 3
+
+# Seconds a crashed worker waits before being restarted, doubling up to the cap
+RESTART_BACKOFF = 1.0
+MAX_RESTART_BACKOFF = 30.0
+
+
+class Worker:
+    """One Chainlit process and what the launcher knows about it."""
+
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.failed_checks = 0
+        self.health: dict = {}
+        self.connections = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    @property
+    def healthy(self) -> bool:
+        return self.alive and self.failed_checks < UNHEALTHY_AFTER and self.health.get("status") == "ok"
+
+    def start(self, env: dict):
+        """Start (or restart) the worker process."""
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "chainlit", "run", "app.py",
+             "--host", "127.0.0.1", "--port", str(self.port), "--headless"],
+            cwd=APP_DIR,
+            env={**env, "WORKER_ID": str(self.index)},
+            # Keep terminal Ctrl-C and service-manager signals away from the workers:
+            # only the launcher's drain decides when they get SIGUSR1 and SIGTERM
+            start_new_session=True,
+        )
+        self.started_at = time.time()
+        self.failed_checks = 0
+        self.health = {}
+
+    def describe(self) -> dict:
+        return {
+            "worker": self.index,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "healthy": self.healthy,
+            "connections": self.connections,
+            "restarts": self.restarts,
+            "failed_checks": self.failed_checks,
+            "health": self.health,
+        }
+
+
+def parse_head(head: bytes) -> tuple[str, dict[str, str]]:
+    """Return the request path and lower-cased headers from an HTTP head."""
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    path = parts[1] if len(parts) > 1 else "/"
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return path, headers
+
+
+def sticky_worker(headers: dict[str, str]) -> Optional[int]:
+    """Read the worker index from the sticky cookie, if present."""
+    for cookie in headers.get("cookie", "").split(";"):
+        name, _, value = cookie.strip().partition("=")
+        if name == STICKY_COOKIE and value.isdigit():
+            return int(value)
+    return None
+
+
+async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Copy bytes from reader to writer until either side closes."""
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        try:
+            writer.close()
+        except RuntimeError:
+            pass
+
+
+class Launcher:
+    """
+    Starts the workers, proxies the public port to them and watches their health.
+
+    New browsers are assigned to the healthy worker with the fewest open
+    connections; the choice is remembered in STICKY_COOKIE. A cookie that
+    points at an unhealthy worker is reassigned.
+
+    Routing is per connection: only the first request head is parsed, and
+    later requests on a keep-alive connection go to the same worker. That
+    is the worker the cookie names, since it was set on the first response.
+    """
+
+    def __init__(self, workers: int, host: str, port: int, worker_base_port: int, drain_timeout: float):
+        self.host = host
+        self.port = port
+        self.drain_timeout = drain_timeout
+        self.workers = [Worker(index, worker_base_port + index) for index in range(workers)]
+        self.draining = False
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.env = self.worker_env()
+
+    @staticmethod
+    def worker_env() -> dict:
+        """Environment for the workers: the shared caches default to files under .cache."""
+        env = dict(os.environ)
+        cache_dir = APP_DIR / ".cache"
+        env.setdefault("CACHE_DB_PATH", str(cache_dir / "sefaria_tools.sqlite3"))
+        env.setdefault("SESSION_STORE", f"sqlite://{cache_dir / 'sessions.sqlite3'}")
+        return env
+
+    def pick(self, preferred: Optional[int]) -> Optional[Worker]:
+        """Return the sticky worker if it is healthy, else the least loaded healthy one."""
+        if preferred is not None and 0 <= preferred < len(self.workers) and self.workers[preferred].healthy:
+            return self.workers[preferred]
+        healthy = [worker for worker in self.workers if worker.healthy]
+        return min(healthy, key=lambda worker: worker.connections) if healthy else None
+
+    def health(self) -> dict:
+        """Aggregate health of the launcher and every worker."""
+        return {
+            "status": "draining" if self.draining else ("ok" if any(w.healthy for w in self.workers) else "down"),
+            "workers": [worker.describe() for worker in self.workers],
+            "connections": sum(worker.connections for worker in self.workers),
+            "active_turns": sum(worker.health.get("active_turns", 0) for worker in self.workers),
+        }
+
+    async def respond(self, writer: asyncio.StreamWriter, status: str, body: dict):
+        payload = json.dumps(body, indent=2).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+        writer.close()
+
+    async def handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        """Route one client connection to a worker and relay it in both directions."""
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+        path, headers = parse_head(head)
+        if path.split("?")[0] == "/launcher/health":
+            health = self.health()
+            await self.respond(client_writer, "200 OK" if health["status"] == "ok" else "503 Service Unavailable", health)
+            return
+
+        preferred = sticky_worker(headers)
+        worker = self.pick(preferred)
+        if worker is None:
+            await self.respond(client_writer, "503 Service Unavailable", {"error": "No healthy workers"})
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+        except OSError:
+            worker.failed_checks = UNHEALTHY_AFTER
+            await self.respond(client_writer, "502 Bad Gateway", {"error": f"Worker {worker.index} unreachable"})
+            return
+
+        worker.connections += 1
+        upstream_writer.write(head)
+        # Relay the request body straight away: a POST (e.g. Socket.IO polling
+        # after a failover) is only answered once the worker has read all of it
+        upload = asyncio.create_task(pipe(client_reader, upstream_writer))
+        try:
+            if preferred != worker.index:
+                # Pin the browser to this worker on the first response
+                response_head = await upstream_reader.readuntil(b"\r\n\r\n")
+                cookie = f"Set-Cookie: {STICKY_COOKIE}={worker.index}; Path=/; HttpOnly; SameSite=Lax\r\n"
+                client_writer.write(response_head[:-2] + cookie.encode("latin-1") + b"\r\n")
+            await asyncio.gather(upload, pipe(upstream_reader, client_writer))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            upload.cancel()
+            client_writer.close()
+            upstream_writer.close()
+        finally:
+            worker.connections -= 1
+
+    async def check(self, client: httpx.AsyncClient, worker: Worker):
+        """Poll one worker's /healthz, restarting it if the process has exited."""
+        if not worker.alive:
+            if self.draining or worker.process is None:
+                return
+            backoff = min(MAX_RESTART_BACKOFF, RESTART_BACKOFF * 2 ** worker.restarts)
+            if time.time() - worker.started_at < backoff:
+                return
+            print(f"Worker {worker.index} exited with {worker.process.returncode}, restarting")
+            worker.restarts += 1
+            worker.start(self.env)
+            return
+        try:
+            response = await client.get(f"http://127.0.0.1:{worker.port}/healthz")
+            worker.health = response.json()
+            worker.failed_checks = 0
+        except (httpx.HTTPError, ValueError):
+            # A worker still importing the app is not a failure yet
+            if time.time() - worker.started_at > 30:
+                worker.failed_checks += 1
+
+    async def watch(self):
+        """Check every worker each HEALTH_INTERVAL seconds."""
+        async with httpx.AsyncClient(timeout=HEALTH_INTERVAL) as client:
+            while True:
+                await asyncio.gather(*(self.check(client, worker) for worker in self.workers))
+                await asyncio.sleep(HEALTH_INTERVAL)
+
+    async def drain(self):
+        """Stop accepting connections, let in-flight turns finish, then stop the workers."""
+        self.draining = True
+        print("Draining: no new connections, waiting for in-flight turns")
+        if self.server is not None:
+            self.server.close()
+        for worker in self.workers:
+            if worker.alive:
+                worker.process.send_signal(signal.SIGUSR1)
+
+        deadline = time.monotonic() + self.drain_timeout
+        async with httpx.AsyncClient(timeout=1.0) as client:
+            while time.monotonic() < deadline:
+                await asyncio.gather(*(self.check(client, worker) for worker in self.workers))
+                busy = [w for w in self.workers if w.alive and w.health.get("active_turns", 0)]
+                if not busy:
+                    break
+                await asyncio.sleep(0.5)
+
+        for worker in self.workers:
+            if worker.alive:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            try:
+                await asyncio.to_thread(worker.process.wait, 10)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+
+    async def run(self):
+        for worker in self.workers:
+            worker.start(self.env)
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_HEAD_BYTES)
+        print(f"Sefaria Explorer: {len(self.workers)} workers behind http://{self.host}:{self.port}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        watcher = asyncio.create_task(self.watch())
+        await stop.wait()
+        watcher.cancel()
+        await self.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Sefaria Explorer as several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Number of worker processes")
+    parser.add_argument("--host", default="0.0.0.0", help="Public address to listen on")
+    parser.add_argument("--port", type=int, default=9101, help="Public port")
+    parser.add_argument("--worker-base-port", type=int, default=9201, help="First loopback port for workers")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="Seconds to let in-flight turns finish")
+    args = parser.parse_args()
+
+    launcher = Launcher(args.workers, args.host, args.port, args.worker_base_port, args.drain_timeout)
+    asyncio.run(launcher.run())
+
+
+if __name__ == "__main__":
+    main()
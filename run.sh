@@ -41,7 +41,7 @@ if [ ! -d ".venv" ]; then
     echo "Virtual environment not found. Creating with UV..."
     uv venv .venv
     source .venv/bin/activate
-    uv pip install chainlit openai httpx httpx-sse python-dotenv anthropic mcp
+    uv pip install chainlit openai "httpx[http2]" httpx-sse python-dotenv anthropic mcp
 else
     source .venv/bin/activate
 fi
@@ -72,4 +72,9 @@ echo "DISCLAIMER: This is a prototype/testing environment."
 echo "Do NOT rely on this for halachic or religious decisions."
 echo ""
 
+# WORKERS=N runs N worker processes behind one port (see launcher.py)
+if [ "${WORKERS:-1}" -gt 1 ]; then
+    exec python launcher.py --workers "$WORKERS" --port "$PORT" "${@:2}"
+fi
+
 chainlit run app.py --host 0.0.0.0 --port "$PORT" "${@:2}"
@@ -0,0 +1,77 @@
+"""Shared fixtures: a tiny Sefaria-Export checkout and the stores built from it."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from explorer.textstore import TextStore, build_store
+
+GENESIS_HE = [
+    [
+        "בְּרֵאשִׁית בָּרָא אֱלֹהִים אֵת הַשָּׁמַיִם וְאֵת הָאָרֶץ",
+        "וּמֹשֶׁה וּמֹשֶׁה וּמֹשֶׁה הָלַךְ",
+        "וַיֹּאמֶר מֹשֶׁה אֶל הָעָם",
+        "שִׁשָּׁה יָמִים",
+    ],
+    ["וַיְכֻלּוּ הַשָּׁמַיִם וְהָאָרֶץ"],
+]
+
+GENESIS_EN = [
+    [
+        "In the beginning God created the heavens and the earth",
+        "And Moses, and Moses, and Moses went",
+        "And Moses said to the people",
+        "Six days",
+    ],
+    ["The heavens and the earth were finished"],
+]
+
+# Talmud arrays start at 1a; Berakhot opens on 2a
+BERAKHOT_HE = [[], [], ["מֵאֵימָתַי קוֹרִין אֶת שְׁמַע בְּעַרְבִין", "מִשָּׁעָה שֶׁהַכֹּהֲנִים נִכְנָסִים"], ["תַּנָּא הֵיכָא קָאֵי"]]
+
+
+LINKS_CSV = """Citation 1,Citation 2,Conection Type,Text 1,Text 2,Category 1,Category 2
+Genesis 1:1,Rashi on Genesis 1:1:1,commentary,Genesis,Rashi on Genesis,Tanakh,Commentary
+Genesis 1:1-2,Berakhot 2a:4,reference,Genesis,Berakhot,Tanakh,Talmud
+Berakhot 2a:4,Shabbat 88a:1,reference,Berakhot,Shabbat,Talmud,Talmud
+Shabbat 88a:1,Exodus 19:17,quotation,Shabbat,Exodus,Talmud,Tanakh
+"""
+
+
+def _write(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture(scope="session")
+def export_dir(tmp_path_factory) -> Path:
+    """A Sefaria-Export layout with Genesis (Hebrew and English), Berakhot (Hebrew) and a few links."""
+    root = tmp_path_factory.mktemp("export")
+    (root / "links").mkdir()
+    (root / "links" / "links0.csv").write_text(LINKS_CSV, encoding="utf-8")
+    genesis = root / "json" / "Tanakh" / "Torah" / "Genesis"
+    _write(genesis / "Hebrew" / "merged.json", {"title": "Genesis", "versionTitle": "merged", "text": GENESIS_HE})
+    _write(genesis / "English" / "merged.json", {"title": "Genesis", "versionTitle": "merged", "text": GENESIS_EN})
+    berakhot = root / "json" / "Talmud" / "Bavli" / "Seder Zeraim" / "Berakhot"
+    _write(berakhot / "Hebrew" / "merged.json", {"title": "Berakhot", "versionTitle": "merged", "text": BERAKHOT_HE})
+    _write(root / "schemas" / "Genesis.json", {
+        "title": "Genesis",
+        "heTitle": "בראשית",
+        "categories": ["Tanakh", "Torah"],
+        "schema": {
+            "sectionNames": ["Chapter", "Verse"],
+            "addressTypes": ["Integer", "Integer"],
+            "titles": [{"text": "Bereishit", "lang": "en"}, {"text": "Gen", "lang": "en"}],
+        },
+    })
+    return root
+
+
+@pytest.fixture(scope="session")
+def text_store(export_dir, tmp_path_factory) -> TextStore:
+    store_dir = tmp_path_factory.mktemp("store")
+    build_store(export_dir, store_dir)
+    store = TextStore(store_dir)
+    yield store
+    store.close()
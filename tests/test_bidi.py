@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from explorer.bidi import RTL_CLOSE, RTL_OPEN, BidiFormatter, contains_hebrew, format_bidi
+
+SAMPLES = [
+    "שלום עולם\n\nHello world",
+    "The verse says **בראשית ברא** and continues.\n\nבראשית ברא אלהים\nאת השמים ואת הארץ",
+    "1. **בראשית א׳:א׳** – In the beginning\n2. ...\n\n> ויאמר משה",
+    "Code:\n\n```\nשלום = 1\n```\n\nואחר כך",
+    "```python\nprint('שלום')\n```",
+    "",
+    "\n\n\n",
+    "123 — «שלום»",
+]
+
+
+def stream(text: str, sizes) -> tuple[str, str]:
+    """Feed text in chunks of the given sizes; return (appended output, formatted())."""
+    formatter = BidiFormatter()
+    appended, position = [], 0
+    for size in sizes:
+        appended.append(formatter.feed(text[position:position + size]))
+        position += size
+    appended.append(formatter.feed(text[position:]))
+    return "".join(appended), formatter.formatted()
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_streamed_output_matches_one_shot(text):
+    expected = format_bidi(text)
+    for seed in range(20):
+        rng = random.Random(seed)
+        sizes = [rng.randint(1, 6) for _ in range(len(text))]
+        appended, formatted = stream(text, sizes)
+        assert formatted == expected
+        assert expected.startswith(appended)
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_character_by_character(text):
+    assert stream(text, [1] * len(text))[1] == format_bidi(text)
+
+
+def test_hebrew_paragraph_is_wrapped():
+    assert format_bidi("שלום עולם") == f"{RTL_OPEN}\n\nשלום עולם\n\n{RTL_CLOSE}"
+
+
+def test_first_strong_character_decides_direction():
+    assert format_bidi("Hello שלום") == "Hello שלום"
+    assert format_bidi("1. **שלום** world").startswith(RTL_OPEN)
+
+
+def test_code_fences_are_never_wrapped():
+    text = "```\nשלום\n```"
+    assert format_bidi(text) == text
+
+
+def test_fence_split_across_deltas_is_held_back():
+    formatter = BidiFormatter()
+    assert formatter.feed("``") == ""
+    assert formatter.feed("`\nשלום\n``") == "```\nשלום\n"
+    assert formatter.feed("`") == "```"
+    assert formatter.formatted() == "```\nשלום\n```"
+
+
+def test_raw_text_is_kept():
+    formatter = BidiFormatter()
+    formatter.feed("שלום ")
+    formatter.feed("world")
+    assert formatter.text == "שלום world"
+
+
+def test_contains_hebrew():
+    assert contains_hebrew("a ש b")
+    assert not contains_hebrew("abc 123")
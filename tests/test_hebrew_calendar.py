@@ -0,0 +1,81 @@
+from datetime import date
+
+import pytest
+
+from explorer.hebrew_calendar import (
+    convert_date, daf_yomi, hebrew_year, holidays, is_leap_year, new_year, parsha, to_gregorian, to_hebrew, weekday,
+)
+
+
+# Dates and holidays as listed by Hebcal
+@pytest.mark.parametrize("gregorian, hebrew, holiday", [
+    ("2023-09-16", "1 Tishrei 5784", "Rosh Hashanah I"),
+    ("2024-03-24", "14 Adar II 5784", "Purim"),
+    ("2024-10-03", "1 Tishrei 5785", "Rosh Hashanah I"),
+    ("2024-10-12", "10 Tishrei 5785", "Yom Kippur"),
+    ("2024-12-26", "25 Kislev 5785", "Chanukah I"),
+    ("2025-04-13", "15 Nisan 5785", "Pesach I"),
+])
+def test_known_dates(gregorian, hebrew, holiday):
+    result = convert_date(gregorian)
+    assert result["hebrew_date"] == hebrew
+    assert holiday in [entry["name"] for entry in result["holidays"]]
+
+
+@pytest.mark.parametrize("text", ["15 Nisan 5785", "ט״ו ניסן תשפ״ה", "Nisan 15, 5785"])
+def test_hebrew_to_gregorian(text):
+    assert convert_date(hebrew=text)["date"] == "2025-04-13"
+
+
+def test_adar_in_a_leap_year_means_adar_ii():
+    assert convert_date(hebrew="14 Adar 5784")["date"] == "2024-03-24"
+    assert convert_date(hebrew="14 Adar I 5784")["date"] == "2024-02-23"
+
+
+def test_after_sunset_moves_to_the_next_hebrew_day():
+    result = convert_date("2024-10-02", after_sunset=True)
+    assert result["date"] == "2024-10-02"
+    assert result["hebrew_date"] == "1 Tishrei 5785"
+
+
+def test_round_trip_over_several_years():
+    for fixed in range(date(2019, 1, 1).toordinal(), date(2031, 1, 1).toordinal(), 7):
+        day = date.fromordinal(fixed)
+        assert to_gregorian(*to_hebrew(day)) == day
+
+
+def test_year_rules():
+    assert is_leap_year(5784) and not is_leap_year(5785)
+    for year in range(5700, 5900):
+        # Rosh Hashanah never falls on Sunday, Wednesday or Friday
+        assert weekday(new_year(year)) not in (0, 3, 5)
+        length = hebrew_year(year).end - hebrew_year(year).start
+        assert length in ((383, 384, 385) if is_leap_year(year) else (353, 354, 355))
+
+
+def test_shavuot_second_day_is_diaspora_only():
+    diaspora = [entry["date"] for entry in holidays(year=5785, categories=["major"])["holidays"] if "Shavuot" in entry["name"]]
+    israel = [entry["date"] for entry in holidays(year=5785, israel=True, categories=["major"])["holidays"] if "Shavuot" in entry["name"]]
+    assert diaspora == ["2025-06-02", "2025-06-03"]
+    assert israel == ["2025-06-02"]
+
+
+def test_parsha():
+    assert parsha("2024-10-26")["parsha"] == "Bereshit"
+    # The eighth day of Pesach 5779 fell on Shabbat, outside Israel only
+    assert parsha("2019-04-27")["holiday"] == "Pesach VIII"
+    assert parsha("2019-04-27", israel=True)["parsha"] == "Achrei Mot"
+
+
+def test_parsha_by_name():
+    assert parsha("2024-10-01", name="Parashat Bereshit")["date"] == "2024-10-26"
+    with pytest.raises(ValueError):
+        parsha("2024-10-01", name="Not a parsha")
+
+
+def test_daf_yomi_cycle_boundary():
+    assert daf_yomi("2020-01-04")["daf"] == "Niddah 73"
+    assert daf_yomi("2020-01-05") == {
+        "date": "2020-01-05", "cycle": 14, "daf": "Berakhot 2", "he": "ברכות ב׳", "ref": "Berakhot 2",
+    }
+    assert [entry["daf"] for entry in daf_yomi("2020-01-05", days=3)["days"]] == ["Berakhot 2", "Berakhot 3", "Berakhot 4"]
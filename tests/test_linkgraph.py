@@ -0,0 +1,61 @@
+import pytest
+
+from explorer.linkgraph import LinkGraph, build_graph, expand_ref
+
+
+@pytest.fixture(scope="module")
+def link_graph(export_dir, tmp_path_factory):
+    graph_dir = tmp_path_factory.mktemp("graph")
+    build_graph(export_dir, graph_dir)
+    graph = LinkGraph(graph_dir)
+    yield graph
+    graph.close()
+
+
+def test_expand_ref():
+    assert expand_ref("Genesis 1:1-3") == ["Genesis 1:1", "Genesis 1:2", "Genesis 1:3"]
+    assert expand_ref("Berakhot 2a-2b") == ["Berakhot 2a", "Berakhot 2b"]
+    assert expand_ref("Genesis 1:1-2:3") == ["Genesis 1:1"]
+    assert expand_ref("Genesis") == ["Genesis"]
+
+
+def test_links_are_undirected(link_graph):
+    links = link_graph.links("Genesis 1:1")
+    assert {link["ref"] for link in links} == {"Rashi on Genesis 1:1:1", "Berakhot 2a:4"}
+    assert next(link for link in links if link["type"] == "commentary")["commentator"] == "Rashi"
+    assert [link["ref"] for link in link_graph.links("Rashi on Genesis 1:1:1")] == ["Genesis 1:1"]
+
+
+def test_range_citations_link_every_segment(link_graph):
+    assert [link["ref"] for link in link_graph.links("Genesis 1:2")] == ["Berakhot 2a:4"]
+
+
+def test_section_ref_includes_its_segments(link_graph):
+    links = link_graph.links("Genesis 1")
+    assert sorted(link["ref"] for link in links) == ["Berakhot 2a:4", "Rashi on Genesis 1:1:1"]
+
+
+def test_link_filters(link_graph):
+    assert [link["ref"] for link in link_graph.links("Genesis 1:1", link_types=["Commentary"])] == ["Rashi on Genesis 1:1:1"]
+    assert [link["ref"] for link in link_graph.links("Genesis 1:1", categories=["Talmud"])] == ["Berakhot 2a:4"]
+
+
+def test_unknown_ref_returns_none(link_graph):
+    assert link_graph.links("Leviticus 1:1") is None
+    assert link_graph.find_paths("Leviticus 1:1") is None
+
+
+def test_shortest_path(link_graph):
+    result = link_graph.find_paths("Genesis 1:1", "Exodus 19:17")
+    assert result["paths"] == [{
+        "refs": ["Genesis 1:1", "Berakhot 2a:4", "Shabbat 88a:1", "Exodus 19:17"],
+        "types": ["reference", "reference", "quotation"],
+        "hops": 3,
+    }]
+    assert link_graph.find_paths("Genesis 1:1", "Exodus 19:17", max_hops=2)["paths"] == []
+
+
+def test_reachable_nearest_first(link_graph):
+    reachable = link_graph.find_paths("Genesis 1:1", max_hops=2)["reachable"]
+    assert [node["hops"] for node in reachable] == [1, 1, 2, 2]
+    assert {node["ref"] for node in reachable[2:]} == {"Genesis 1:2", "Shabbat 88a:1"}
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import pytest
+
+from bench.fakes import FakeSefariaMCP, start_server, stop_server
+from explorer.mcp import MCPClient, MCPError, mcp_tool_to_openai
+
+
+async def with_client(test, delay: float = 0.2):
+    """Run test(client, server) against the bench stand-in MCP server."""
+    fake = FakeSefariaMCP({}, delay=delay)
+    server, task, url = await start_server(fake.app)
+    client = MCPClient(f"{url}/sse", request_timeout=5, backoff_min=0.05)
+    client.start()
+    try:
+        assert await client.wait_ready(5)
+        return await test(client, fake)
+    finally:
+        await client.close()
+        await stop_server(server, task)
+
+
+def test_handshake_caches_the_tool_list():
+    async def test(client, fake):
+        return client.tools, client.server_info
+
+    tools, server_info = asyncio.run(with_client(test))
+    assert [tool["name"] for tool in tools] == FakeSefariaMCP.TOOLS
+    assert mcp_tool_to_openai(tools[0])["function"]["parameters"] == {"type": "object", "properties": {}}
+    assert server_info["name"] == "fake-sefaria-mcp"
+
+
+def test_concurrent_calls_share_the_session():
+    async def test(client, fake):
+        started = time.monotonic()
+        results = await asyncio.gather(*(client.call_tool("get_text", {"reference": f"Genesis {i}"}) for i in range(8)))
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(with_client(test))
+    assert results == [("No recorded payload", True)] * 8
+    assert elapsed < 1.0
+
+
+def test_dropped_stream_fails_pending_calls_and_reconnects():
+    async def test(client, fake):
+        pending = asyncio.create_task(client.call_tool("get_text", {"reference": "Genesis 1"}))
+        await asyncio.sleep(0.05)
+        fake.drop_sessions()
+        with pytest.raises(MCPError):
+            await asyncio.wait_for(pending, 1)
+        assert await client.wait_ready(5)
+        return await client.call_tool("get_text", {"reference": "Genesis 1"}), client.stats()
+
+    result, stats = asyncio.run(with_client(test))
+    assert result == ("No recorded payload", True)
+    assert stats["connects"] == 2 and stats["disconnects"] == 1 and stats["pending"] == 0
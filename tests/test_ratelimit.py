@@ -0,0 +1,146 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import pytest
+
+from explorer.ratelimit import (
+    FairLimiter, RetryPolicy, UpstreamStatusError, call_with_retry, error_status, parse_retry_after,
+)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("-1") == 0.0
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_error_status_reads_response_headers():
+    class Response:
+        status_code = 429
+        headers = {"retry-after": "3"}
+
+    class Error(Exception):
+        response = Response()
+
+    assert error_status(Error()) == (429, 3.0)
+    assert error_status(UpstreamStatusError("Sefaria", 503, 1.5)) == (503, 1.5)
+    assert error_status(ValueError()) == (None, None)
+
+
+def test_retry_policy():
+    policy = RetryPolicy(attempts=2, base_delay=0.5, max_delay=5)
+    assert 0 <= policy.delay(0, None) <= 0.5
+    assert 3 <= policy.delay(1, 3) <= 3.5
+    assert policy.delay(0, 60) is None
+    assert policy.delay(2, None) is None
+
+
+def test_sessions_are_served_round_robin():
+    async def main():
+        limiter = FairLimiter("test", max_concurrency=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def request(session: str, label: str):
+            async with limiter.slot(session):
+                order.append(label)
+                await gate.wait()
+
+        # One request holds the only slot while a busy session queues up
+        tasks = [asyncio.create_task(request("busy", "busy-0"))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(request("busy", f"busy-{i}")) for i in range(1, 4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("quiet", "quiet")))
+        await asyncio.sleep(0)
+        assert limiter.stats()["sessions_waiting"] == 2
+        gate.set()
+        await asyncio.gather(*tasks)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(main())
+    assert order == ["busy-0", "busy-1", "quiet", "busy-2", "busy-3"]
+    assert stats["requests"] == 5 and stats["active"] == 0 and stats["queue_depth"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def main():
+        limiter = FairLimiter("test", max_concurrency=1)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        await asyncio.wait_for(limiter.acquire("c"), 1)
+        return limiter.stats()["active"]
+
+    assert asyncio.run(main()) == 1
+
+
+def test_token_bucket_spaces_requests():
+    async def main():
+        limiter = FairLimiter("test", rate=20, burst=1)
+        started = time.monotonic()
+        for _ in range(3):
+            async with limiter.slot():
+                pass
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.09
+
+
+def test_429_is_retried_and_throttles_the_limiter():
+    async def main():
+        limiter = FairLimiter("test")
+        attempts = []
+
+        async def request():
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                raise UpstreamStatusError("test", 429, 0.05)
+            return "ok"
+
+        result = await call_with_retry(limiter, RetryPolicy(attempts=3, base_delay=0.01), "s", request)
+        return result, attempts, limiter.counters
+
+    result, attempts, counters = asyncio.run(main())
+    assert result == "ok"
+    assert len(attempts) == 3
+    assert all(later - earlier >= 0.05 for earlier, later in zip(attempts, attempts[1:]))
+    assert counters["retries"] == 2 and counters["throttled"] == 2
+
+
+def test_gives_up_after_the_last_attempt():
+    async def main():
+        calls = 0
+
+        async def request():
+            nonlocal calls
+            calls += 1
+            raise UpstreamStatusError("test", 503)
+
+        with pytest.raises(UpstreamStatusError):
+            await call_with_retry(FairLimiter("test"), RetryPolicy(attempts=2, base_delay=0.001), "s", request)
+        return calls
+
+    assert asyncio.run(main()) == 3
+
+
+def test_other_errors_are_not_retried():
+    async def main():
+        calls = 0
+
+        async def request():
+            nonlocal calls
+            calls += 1
+            raise UpstreamStatusError("test", 404)
+
+        with pytest.raises(UpstreamStatusError):
+            await call_with_retry(FairLimiter("test"), RetryPolicy(), "s", request)
+        return calls
+
+    assert asyncio.run(main()) == 1
@@ -0,0 +1,98 @@
+import pytest
+
+from explorer.refs import (
+    RefResolver, TitleTrie, format_address, from_hebrew_numeral, normalize_title, parse_range, split_ref,
+    to_hebrew_numeral,
+)
+
+CANONICAL_REFS = [
+    "Genesis 1:1",
+    "Genesis 1:1-5",
+    "Genesis 1:1-2:3",
+    "Exodus 20:1",
+    "Song of Songs 1:2",
+    "Berakhot 2a",
+    "Berakhot 2b:3",
+    "Berakhot 2a:5-2b:3",
+]
+
+# Hebrew Talmud addresses are parsed for a single amud or line, not ranges
+HEBREW_REFS = [ref for ref in CANONICAL_REFS if not ref.startswith("Berakhot") or "-" not in ref]
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return RefResolver()
+
+
+@pytest.mark.parametrize("ref", CANONICAL_REFS)
+def test_canonical_refs_are_stable(resolver, ref):
+    assert resolver.canonical(ref) == ref
+
+
+@pytest.mark.parametrize("ref", HEBREW_REFS)
+def test_hebrew_ref_round_trips(resolver, ref):
+    he_ref = resolver.resolve(ref)["heRef"]
+    assert resolver.canonical(he_ref) == ref
+
+
+@pytest.mark.parametrize("alias, canonical", [
+    ("Gen 1:1", "Genesis 1:1"),
+    ("Genesis_1:1", "Genesis 1:1"),
+    ("Brachot 2a", "Berakhot 2a"),
+    ("Shir HaShirim 1:2", "Song of Songs 1:2"),
+    ("בראשית א:א", "Genesis 1:1"),
+    ("ברכות ב.", "Berakhot 2a"),
+    ("ברכות ב:", "Berakhot 2b"),
+    ('ברכות ב ע"ב', "Berakhot 2b"),
+    ("Rashi on Bereishit 1:1:1", "Rashi on Genesis 1:1:1"),
+])
+def test_aliases_resolve_to_canonical_refs(resolver, alias, canonical):
+    assert resolver.canonical(alias) == canonical
+
+
+def test_bare_daf_covers_both_amudim(resolver):
+    assert resolver.canonical("Berakhot 2") == "Berakhot 2a-2b"
+
+
+def test_unknown_names_do_not_resolve(resolver):
+    assert resolver.resolve("Moses") is None
+    assert resolver.clarify("Moses") is None
+
+
+def test_clarify_marks_bare_titles_as_books(resolver):
+    result = resolver.clarify("Shabbat")
+    assert result["is_book"] and result["ref"] == "Shabbat"
+    result = resolver.clarify("Gen 1:1-3")
+    assert not result["is_book"] and result["is_range"] and result["ref"] == "Genesis 1:1-3"
+
+
+def test_split_ref():
+    assert split_ref("Genesis 1:1-5") == ("Genesis", "1:1", "5")
+    assert split_ref("Song of Songs") == ("Song of Songs", None, None)
+
+
+def test_parse_range_borrows_leading_sections():
+    assert parse_range("1:1", "5", ["Integer", "Integer"]) == ([1, 1], [1, 5])
+    assert parse_range("2a:5", "2b:3", ["Talmud", "Integer"]) == ([3, 5], [4, 3])
+    assert format_address([4, 3], ["Talmud", "Integer"]) == "2b:3"
+
+
+@pytest.mark.parametrize("number, numeral", [(1, "א׳"), (15, "ט״ו"), (16, "ט״ז"), (613, "תרי״ג"), (5785, "ה׳תשפ״ה")])
+def test_hebrew_numerals(number, numeral):
+    assert to_hebrew_numeral(number) == numeral
+
+
+def test_hebrew_numerals_round_trip():
+    for number in range(1, 1000):
+        assert from_hebrew_numeral(to_hebrew_numeral(number)) == number
+
+
+def test_title_trie():
+    trie = TitleTrie()
+    for title in ("Genesis", "Gen", "Gittin"):
+        trie.insert(normalize_title(title), title)
+    assert trie.get("gen") == "Gen"
+    assert trie.get("ge") is None
+    assert trie.longest_prefix("genesis 1:1") == (7, "Genesis")
+    assert set(trie.complete("g")) == {"Genesis", "Gen", "Gittin"}
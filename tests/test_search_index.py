@@ -0,0 +1,62 @@
+import pytest
+
+from explorer.search_index import SearchIndex, build_index, normalize_token, prefix_variants, tokenize
+
+
+@pytest.fixture(scope="module")
+def search_index(text_store, tmp_path_factory):
+    index_dir = tmp_path_factory.mktemp("index")
+    build_index(text_store, index_dir)
+    index = SearchIndex(index_dir, text_store)
+    yield index
+    index.close()
+
+
+def test_normalize_strips_niqqud_and_folds_final_letters():
+    assert normalize_token("הָלַךְ") == "הלכ"
+    assert normalize_token("אֱלֹהִים") == "אלהימ"
+
+
+def test_tokenize_reports_offsets():
+    assert tokenize("וַיֹּאמֶר מֹשֶׁה") == [("ויאמר", 0, 9), ("משה", 10, 16)]
+
+
+def test_prefix_variants_only_add_prefixes():
+    variants = prefix_variants("משה")
+    assert {"ומשה", "המשה", "שמשה", "והמשה"} <= variants
+    assert "שה" not in variants and "ששה" not in variants
+    assert all(variant.endswith("משה") for variant in variants)
+
+
+def test_prefix_variants_skip_short_and_non_hebrew_terms():
+    assert prefix_variants("מ") == set()
+    assert prefix_variants("moses") == set()
+
+
+def test_exact_form_ranks_above_prefixed_forms(search_index):
+    results = search_index.search("משה")["results"]
+    assert [result["ref"] for result in results] == ["Genesis 1:3", "Genesis 1:2"]
+
+
+def test_query_term_is_never_stripped(search_index):
+    refs = [result["ref"] for result in search_index.search("משה")["results"]]
+    assert "Genesis 1:4" not in refs
+
+
+def test_without_prefixes_only_the_typed_form_matches(search_index):
+    search_index.prefixes = False
+    try:
+        assert [result["ref"] for result in search_index.search("משה")["results"]] == ["Genesis 1:3"]
+    finally:
+        search_index.prefixes = True
+
+
+def test_phrase_must_be_consecutive(search_index):
+    assert [result["ref"] for result in search_index.search('"השמים והארץ"')["results"]] == ["Genesis 2:1"]
+    assert search_index.search('"והארץ השמים"')["results"] == []
+
+
+def test_talmud_hits_use_daf_refs_and_snippets(search_index):
+    result = search_index.search("שמע")["results"][0]
+    assert result["ref"] == "Berakhot 2a:1"
+    assert "שְׁמַע" in result["snippet"]
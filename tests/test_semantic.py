@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from explorer.semantic import HashingEmbedder, VectorIndex, build_vectors, load_embedder  # noqa: E402
+
+
+@pytest.fixture(scope="module", params=[("float16", 0), ("int8", 0), ("float16", 2)], ids=["float16", "int8", "ivf"])
+def vector_index(request, text_store, tmp_path_factory):
+    dtype, ivf_lists = request.param
+    vector_dir = tmp_path_factory.mktemp("vectors")
+    build_vectors(text_store, vector_dir, HashingEmbedder(256), dtype=dtype, ivf_lists=ivf_lists)
+    return VectorIndex(vector_dir, text_store, nprobe=2)
+
+
+def test_hashing_embedder_is_normalized_and_deterministic():
+    embedder = HashingEmbedder(64)
+    first, second = embedder.embed(["Moses said to the people", "Moses said to the people"])
+    assert abs(float(first @ first) - 1.0) < 1e-5
+    assert (first == second).all()
+
+
+def test_load_embedder_reads_the_manifest_spec():
+    assert load_embedder("hashing:32").dimension == 32
+    with pytest.raises(ValueError):
+        load_embedder("unknown")
+
+
+def test_closest_segment_ranks_first(vector_index):
+    results = vector_index.search("Moses said to the people", size=3)["results"]
+    assert results[0]["ref"] == "Genesis 1:3"
+    assert results[0]["text"] == "And Moses said to the people"
+    assert [result["score"] for result in results] == sorted((result["score"] for result in results), reverse=True)
+
+
+def test_category_filter(vector_index):
+    assert vector_index.search("heavens and earth", category="torah")["results"]
+    assert vector_index.search("heavens and earth", category="Talmud")["results"] == []
+
+
+def test_index_refuses_a_different_embedder(text_store, tmp_path):
+    build_vectors(text_store, tmp_path, HashingEmbedder(32))
+    with pytest.raises(ValueError):
+        VectorIndex(tmp_path, text_store, embedder=HashingEmbedder(64))
@@ -0,0 +1,33 @@
+def test_get_text_returns_a_segment(text_store):
+    result = text_store.get_text("Genesis 1:3", "english")
+    assert result["ref"] == "Genesis 1:3"
+    assert result["heRef"] == "בראשית א׳:ג׳"
+    assert [version["text"] for version in result["versions"]] == ["And Moses said to the people"]
+
+
+def test_get_text_range_and_languages(text_store):
+    result = text_store.get_text("Genesis 1:2-3", "both")
+    assert {version["language"] for version in result["versions"]} == {"he", "en"}
+    assert all(len(version["text"]) == 2 for version in result["versions"])
+
+
+def test_title_variants_resolve(text_store):
+    assert text_store.get_text("Bereishit 2:1")["ref"] == "Genesis 2:1"
+
+
+def test_bare_title_is_its_first_section(text_store):
+    assert text_store.get_text("Genesis")["ref"] == "Genesis 1"
+    result = text_store.get_text("Berakhot")
+    assert result["ref"] == "Berakhot 2a"
+    assert len(result["versions"][0]["text"]) == 2
+
+
+def test_bare_daf_covers_both_amudim(text_store):
+    result = text_store.get_text("Berakhot 2")
+    assert result["ref"] == "Berakhot 2a-2b"
+    assert len(result["versions"][0]["text"]) == 3
+
+
+def test_unknown_refs_are_not_served(text_store):
+    assert text_store.get_text("Exodus 1:1") is None
+    assert text_store.get_text("Genesis 1:1:1:1") is None